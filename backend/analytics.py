@@ -0,0 +1,391 @@
+"""
+Аналитика заведения на предагрегированных таблицах.
+
+analytics_hourly / analytics_daily / analytics_dish_daily пополняются
+инкрементально: транзакция заказа (создание, оплата, завершение, отмена)
+только добавляет строку в журнал analytics_deltas, а фоновый apply_loop
+пачками сводит журнал и делает по одному upsert на строку агрегата - горячие
+строки часа и дня не блокируются каждым заказом. Отчеты отстают от заказов
+не больше чем на ANALYTICS_APPLY_INTERVAL. Часы и дни считаются по местному
+времени заведения (Restaurant.timezone). Отчет за любой период читает не
+больше нескольких сотен строк агрегатов, сколько бы лет истории ни было у заведения.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from models import (
+    Restaurant, Dish, Order, OrderItem, OrderStatus,
+    AnalyticsHourly, AnalyticsDaily, AnalyticsDishDaily, AnalyticsDelta
+)
+from pricing import to_tiyn, from_tiyn
+
+PERIODS = ("day", "week", "month", "year")
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+MONTHS = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+COUNTERS = ("revenue", "tips", "fees", "orders_count", "paid_count", "completed_count", "cancelled_count")
+
+ANALYTICS_APPLY_INTERVAL = float(os.getenv("ANALYTICS_APPLY_INTERVAL", "5"))  # секунды
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "1000"))
+ANALYTICS_TIMEZONE_TTL = int(os.getenv("ANALYTICS_TIMEZONE_TTL", "300"))  # секунды
+
+logger = logging.getLogger("analytics")
+
+_timezones = {}  # restaurant_id -> (ZoneInfo, время загрузки)
+
+
+# =====================================================
+# Часовой пояс заведения
+# =====================================================
+def restaurant_timezone(db: Session, restaurant_id: int):
+    cached = _timezones.get(restaurant_id)
+    if cached and time.monotonic() - cached[1] < ANALYTICS_TIMEZONE_TTL:
+        return cached[0]
+    name = db.query(Restaurant.timezone).filter(Restaurant.id == restaurant_id).scalar()
+    try:
+        tz = ZoneInfo(name or "Asia/Almaty")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo("UTC")
+    _timezones[restaurant_id] = (tz, time.monotonic())
+    return tz
+
+
+def forget_timezone(restaurant_id: int):
+    """Заведение изменено - часовой пояс перечитать (другие воркеры - по ANALYTICS_TIMEZONE_TTL)"""
+    _timezones.pop(restaurant_id, None)
+
+
+def to_local(moment: datetime, tz) -> datetime:
+    """UTC (naive, как в БД) -> местное время заведения (naive)"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def to_utc(moment: datetime, tz) -> datetime:
+    """Местное время заведения (naive) -> UTC (naive, как в БД)"""
+    return moment.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# =====================================================
+# Журнал изменений (в транзакции заказа)
+# =====================================================
+def _record(db: Session, restaurant_id: int, order_id: int = None, dish_sign: int = 0, **counters):
+    """Записать изменение счетчиков в журнал: INSERT новой строки, без блокировки агрегатов"""
+    db.add(AnalyticsDelta(
+        restaurant_id=restaurant_id,
+        moment=datetime.utcnow(),
+        counters={name: value for name, value in counters.items() if value},
+        order_id=order_id,
+        dish_sign=dish_sign
+    ))
+
+
+def _paid_counters(order: Order, sign: int) -> dict:
+    tips, fees = to_tiyn(order.tips_amount), to_tiyn(order.service_fee)
+    return {
+        "revenue": sign * (to_tiyn(order.total_amount) + tips + fees),
+        "tips": sign * tips,
+        "fees": sign * fees,
+        "paid_count": sign
+    }
+
+
+def record_order_created(db: Session, restaurant_id: int):
+    _record(db, restaurant_id, orders_count=1)
+
+
+def record_order_paid(db: Session, order: Order):
+    _record(db, order.restaurant_id, order.id, 1, **_paid_counters(order, 1))
+
+
+def record_status_change(db: Session, order: Order, old_status: OrderStatus):
+    """Завершение/отмена заказа и возврат из них; отмена оплаченного заказа вычитает выручку"""
+    if old_status == order.status:
+        return
+    counters = defaultdict(int)
+    for status, sign in ((old_status, -1), (order.status, 1)):
+        if status == OrderStatus.COMPLETED:
+            counters["completed_count"] += sign
+        elif status == OrderStatus.CANCELLED:
+            counters["cancelled_count"] += sign
+            if order.is_paid:
+                for name, value in _paid_counters(order, -sign).items():
+                    counters[name] += value
+    if not counters:
+        return
+    dish_sign = 0
+    if order.is_paid and OrderStatus.CANCELLED in (old_status, order.status):
+        dish_sign = 1 if old_status == OrderStatus.CANCELLED else -1
+    _record(db, order.restaurant_id, order.id, dish_sign, **counters)
+
+
+# =====================================================
+# Перенос журнала в агрегаты (фоном, пачками)
+# =====================================================
+def _upsert_add(db: Session, model, keys, rows):
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Analytics rollups are not supported on {dialect}")
+
+    stmt = insert(model).values(rows)
+    columns = model.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: columns[name] + stmt.excluded[name] for name in rows[0] if name not in keys}
+    )
+    db.execute(stmt)
+
+
+def apply_pending(db: Session, limit: int = ANALYTICS_BATCH_SIZE) -> int:
+    """
+    Свести пачку журнала и прибавить к агрегатам; журнал удаляется той же
+    транзакцией (каждая запись учитывается ровно один раз). Строки журнала
+    захватываются с skip_locked - воркеры не берут одну пачку дважды.
+    """
+    deltas = db.query(AnalyticsDelta).order_by(AnalyticsDelta.id).limit(limit).with_for_update(skip_locked=True).all()
+    if not deltas:
+        return 0
+
+    hourly = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    daily = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    dish_orders = []  # (order_id, restaurant_id, day, sign)
+    for delta in deltas:
+        local = to_local(delta.moment, restaurant_timezone(db, delta.restaurant_id))
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        for bucket in (hourly[(delta.restaurant_id, hour)], daily[(delta.restaurant_id, local.date())]):
+            for name, value in (delta.counters or {}).items():
+                bucket[name] += value
+        if delta.dish_sign:
+            dish_orders.append((delta.order_id, delta.restaurant_id, local.date(), delta.dish_sign))
+
+    dishes = defaultdict(lambda: [0, 0])
+    if dish_orders:
+        items = defaultdict(list)
+        for order_id, dish_id, quantity, total in db.query(
+            OrderItem.order_id, OrderItem.dish_id, OrderItem.quantity, OrderItem.total
+        ).filter(OrderItem.order_id.in_({order_id for order_id, *_ in dish_orders})):
+            items[order_id].append((dish_id, quantity or 0, to_tiyn(total)))
+        for order_id, restaurant_id, day, sign in dish_orders:
+            for dish_id, quantity, revenue in items[order_id]:
+                dishes[(restaurant_id, day, dish_id)][0] += sign * quantity
+                dishes[(restaurant_id, day, dish_id)][1] += sign * revenue
+
+    # Ключи по порядку - воркеры блокируют строки агрегатов в одном порядке
+    _upsert_add(db, AnalyticsHourly, ["restaurant_id", "bucket"], [
+        dict(values, restaurant_id=restaurant_id, bucket=bucket)
+        for (restaurant_id, bucket), values in sorted(hourly.items())
+    ])
+    _upsert_add(db, AnalyticsDaily, ["restaurant_id", "day"], [
+        dict(values, restaurant_id=restaurant_id, day=day)
+        for (restaurant_id, day), values in sorted(daily.items())
+    ])
+    _upsert_add(db, AnalyticsDishDaily, ["restaurant_id", "day", "dish_id"], [
+        {"restaurant_id": restaurant_id, "day": day, "dish_id": dish_id, "quantity": quantity, "revenue": revenue}
+        for (restaurant_id, day, dish_id), (quantity, revenue) in sorted(dishes.items())
+    ])
+    db.query(AnalyticsDelta).filter(AnalyticsDelta.id.in_([delta.id for delta in deltas])).delete(
+        synchronize_session=False
+    )
+    db.commit()
+    return len(deltas)
+
+
+async def apply_loop():
+    while True:
+        try:
+            # Полная пачка - сразу следующая
+            while await run_in_session(apply_pending) >= ANALYTICS_BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Analytics apply failed")
+        await asyncio.sleep(ANALYTICS_APPLY_INTERVAL)
+
+
+def rebuild(db: Session, restaurant_id: int):
+    """Пересчитать агрегаты заведения из orders (первичное заполнение/сверка)"""
+    # Неперенесенный журнал уже учтен в заказах - иначе applier прибавит его второй раз
+    db.query(AnalyticsDelta).filter(AnalyticsDelta.restaurant_id == restaurant_id).delete(synchronize_session=False)
+    tz = restaurant_timezone(db, restaurant_id)
+    hourly = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    daily = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    dishes = defaultdict(lambda: [0, 0])
+    paid_days = {}
+
+    def add(moment, counters):
+        local = to_local(moment, tz)
+        for bucket in (hourly[local.replace(minute=0, second=0, microsecond=0)], daily[local.date()]):
+            for name, value in counters.items():
+                bucket[name] += value
+        return local.date()
+
+    orders = db.query(Order).filter(Order.restaurant_id == restaurant_id).yield_per(5000)
+    for order in orders:
+        add(order.created_at, {"orders_count": 1})
+        closed_at = order.updated_at or order.created_at
+        if order.is_paid and order.status != OrderStatus.CANCELLED:
+            paid_days[order.id] = add(order.paid_at or closed_at, _paid_counters(order, 1))
+        if order.status == OrderStatus.COMPLETED:
+            add(closed_at, {"completed_count": 1})
+        elif order.status == OrderStatus.CANCELLED:
+            add(closed_at, {"cancelled_count": 1})
+
+    items = db.query(OrderItem.order_id, OrderItem.dish_id, OrderItem.quantity, OrderItem.total).join(
+        Order, Order.id == OrderItem.order_id
+    ).filter(Order.restaurant_id == restaurant_id, Order.is_paid == True).yield_per(5000)
+    for order_id, dish_id, quantity, total in items:
+        if order_id in paid_days:
+            dishes[(paid_days[order_id], dish_id)][0] += quantity or 0
+            dishes[(paid_days[order_id], dish_id)][1] += to_tiyn(total)
+
+    for model in (AnalyticsHourly, AnalyticsDaily, AnalyticsDishDaily):
+        db.query(model).filter(model.restaurant_id == restaurant_id).delete(synchronize_session=False)
+    db.bulk_insert_mappings(AnalyticsHourly, [
+        dict(values, restaurant_id=restaurant_id, bucket=bucket) for bucket, values in hourly.items()
+    ])
+    db.bulk_insert_mappings(AnalyticsDaily, [
+        dict(values, restaurant_id=restaurant_id, day=day) for day, values in daily.items()
+    ])
+    db.bulk_insert_mappings(AnalyticsDishDaily, [
+        {"restaurant_id": restaurant_id, "day": day, "dish_id": dish_id, "quantity": quantity, "revenue": revenue}
+        for (day, dish_id), (quantity, revenue) in dishes.items()
+    ])
+    db.commit()
+    return len(daily)
+
+
+# =====================================================
+# Отчеты
+# =====================================================
+def period_range(period: str, today: date, date_from: str = None, date_to: str = None):
+    """Границы периода [start, end] в местных датах"""
+    if date_from or date_to:
+        try:
+            start = date.fromisoformat(date_from) if date_from else today
+            end = date.fromisoformat(date_to) if date_to else today
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date")
+        if start > end:
+            raise HTTPException(status_code=400, detail="date_from is after date_to")
+        return start, end
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Invalid period. Must be one of: {', '.join(PERIODS)}")
+    if period == "day":
+        return today, today
+    if period == "week":
+        return today - timedelta(days=6), today
+    if period == "month":
+        return today - timedelta(days=29), today
+    # Год - 12 календарных месяцев, включая текущий
+    year, month = divmod(today.year * 12 + today.month - 1 - 11, 12)
+    return date(year, month + 1, 1), today
+
+
+def _series(db: Session, restaurant_id: int, period: str, start: date, end: date):
+    """Ряд выручки для графика (часы за день, дни, месяцы за длинный период)"""
+    if start == end:
+        rows = dict(db.query(AnalyticsHourly.bucket, AnalyticsHourly.revenue).filter(
+            AnalyticsHourly.restaurant_id == restaurant_id,
+            AnalyticsHourly.bucket >= datetime.combine(start, datetime.min.time()),
+            AnalyticsHourly.bucket < datetime.combine(start + timedelta(days=1), datetime.min.time())
+        ).all())
+        hours = [datetime.combine(start, datetime.min.time()) + timedelta(hours=h) for h in range(24)]
+        return [
+            {"day": f"{hour:%H}:00", "date": hour.isoformat(), "revenue": from_tiyn(rows.get(hour, 0))}
+            for hour in hours
+        ]
+
+    rows = dict(db.query(AnalyticsDaily.day, AnalyticsDaily.revenue).filter(
+        AnalyticsDaily.restaurant_id == restaurant_id,
+        AnalyticsDaily.day.between(start, end)
+    ).all())
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    if len(days) > 92:
+        months = defaultdict(int)
+        for day in days:
+            months[(day.year, day.month)] += rows.get(day, 0)
+        return [
+            {"day": MONTHS[month - 1], "date": date(year, month, 1).isoformat(), "revenue": from_tiyn(revenue)}
+            for (year, month), revenue in months.items()
+        ]
+    return [
+        {
+            "day": WEEKDAYS[day.weekday()] if period == "week" else f"{day:%d.%m}",
+            "date": day.isoformat(),
+            "revenue": from_tiyn(rows.get(day, 0))
+        }
+        for day in days
+    ]
+
+
+def summary(db: Session, restaurant_id: int, start: date = None, end: date = None, top: int = 5) -> dict:
+    """Итоги и топ блюд по дневным агрегатам (без границ - за все время)"""
+    query = db.query(*[func.coalesce(func.sum(getattr(AnalyticsDaily, name)), 0) for name in COUNTERS]).filter(
+        AnalyticsDaily.restaurant_id == restaurant_id
+    )
+    dishes = db.query(
+        AnalyticsDishDaily.dish_id,
+        Dish.name,
+        func.sum(AnalyticsDishDaily.quantity),
+        func.sum(AnalyticsDishDaily.revenue)
+    ).join(Dish, Dish.id == AnalyticsDishDaily.dish_id).filter(AnalyticsDishDaily.restaurant_id == restaurant_id)
+    if start is not None:
+        query = query.filter(AnalyticsDaily.day.between(start, end))
+        dishes = dishes.filter(AnalyticsDishDaily.day.between(start, end))
+
+    totals = dict(zip(COUNTERS, (int(value) for value in query.one())))
+    popular = dishes.group_by(AnalyticsDishDaily.dish_id, Dish.name).having(
+        func.sum(AnalyticsDishDaily.quantity) > 0
+    ).order_by(func.sum(AnalyticsDishDaily.quantity).desc()).limit(top).all()
+
+    paid = totals["paid_count"]
+    return {
+        "total_revenue": from_tiyn(totals["revenue"]),
+        "total_tips": from_tiyn(totals["tips"]),
+        "total_fees": from_tiyn(totals["fees"]),
+        "total_orders": totals["orders_count"],
+        "paid_orders": paid,
+        "avg_check": from_tiyn(round(totals["revenue"] / paid)) if paid else 0,
+        "popular_dishes": [
+            {"dish_id": dish_id, "dish_name": name, "quantity": int(quantity), "revenue": from_tiyn(int(revenue))}
+            for dish_id, name, quantity, revenue in popular
+        ],
+        "orders_by_status": {
+            "completed": totals["completed_count"],
+            "cancelled": totals["cancelled_count"],
+            "pending": max(totals["orders_count"] - totals["completed_count"] - totals["cancelled_count"], 0)
+        }
+    }
+
+
+def report(db: Session, restaurant_id: int, period: str = "week", date_from: str = None, date_to: str = None) -> dict:
+    """Отчет для /restaurants/{id}/analytics"""
+    tz = restaurant_timezone(db, restaurant_id)
+    today = datetime.now(tz).date()
+    start, end = period_range(period, today, date_from, date_to)
+    result = summary(db, restaurant_id, start, end)
+    result.update({
+        "period": period if not (date_from or date_to) else "custom",
+        "date_from": start.isoformat(),
+        "date_to": end.isoformat(),
+        "timezone": tz.key,
+        "revenue_by_day": _series(db, restaurant_id, period, start, end)
+    })
+    return result
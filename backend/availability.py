@@ -0,0 +1,320 @@
+"""
+Свободные столы и слоты бронирования.
+
+Для заведения и дня в памяти держится интервальный индекс занятости:
+по каждому столу - отсортированные непересекающиеся интервалы [начало, конец)
+в минутах от полуночи, уже с буферами (booking_buffer_before/after). Проверка
+"свободен ли стол" - один bisect, поиск столов под компанию - проход по
+столам, отсортированным по вместимости (лучший подходящий стол первым).
+В индекс дня попадают и брони соседних дней: бронь до полуночи может
+задевать следующий день и наоборот.
+
+Создание брони не доверяет кешу: под блокировкой дня (advisory lock в Postgres)
+индекс строится заново из БД, проверяется и только потом вставляется бронь.
+Кеш на чтение живет не дольше AVAILABILITY_TTL - страховка для нескольких воркеров.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import Reservation, ReservationStatus, Restaurant, Table, TableStatus, Zone
+
+AVAILABILITY_TTL = int(os.getenv("AVAILABILITY_TTL", "30"))
+BOOKING_SLOT_STEP = int(os.getenv("BOOKING_SLOT_STEP", "15"))  # минуты
+DEFAULT_DURATION = 120
+
+# Брони, которые занимают стол
+ACTIVE_RESERVATION_STATUSES = [
+    ReservationStatus.PENDING, ReservationStatus.CONFIRMED, ReservationStatus.AWAITING,
+    ReservationStatus.CHECKED_IN, ReservationStatus.SEATED
+]
+
+DAY_MINUTES = 24 * 60
+WEEKDAY_KEYS = [
+    ("mon", "monday"), ("tue", "tuesday"), ("wed", "wednesday"), ("thu", "thursday"),
+    ("fri", "friday"), ("sat", "saturday"), ("sun", "sunday")
+]
+
+
+@dataclass
+class BookingRules:
+    buffer_before: int
+    buffer_after: int
+    max_duration: int
+    max_party_size: int
+    horizon_days: int
+    working_hours: dict
+
+    @classmethod
+    def of(cls, restaurant: Restaurant) -> "BookingRules":
+        return cls(
+            buffer_before=restaurant.booking_buffer_before or 0,
+            buffer_after=restaurant.booking_buffer_after or 0,
+            max_duration=restaurant.booking_max_duration or DEFAULT_DURATION,
+            max_party_size=restaurant.booking_max_party_size or 0,
+            horizon_days=restaurant.booking_horizon_days or 0,
+            working_hours=restaurant.working_hours or {}
+        )
+
+    def occupancy(self, start: int, duration: int):
+        """Интервал занятости стола (минуты) для брони с началом start"""
+        return start - self.buffer_before, start + duration + self.buffer_after
+
+
+class TableInfo(NamedTuple):
+    table_id: int
+    table_number: str
+    hall_id: int
+    zone_id: Optional[int]
+    zone_type: Optional[str]
+    capacity: int
+    is_vip: bool
+
+
+def parse_minute(value: str) -> int:
+    hours, minutes = str(value).strip().split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def opening_window(working_hours: dict, day: date):
+    """
+    (открытие, закрытие) в минутах от полуночи по Restaurant.working_hours:
+    {"mon": "10:00-23:00"} или {"monday": {"open": "10:00", "close": "02:00"}}.
+    Закрытие после полуночи - больше 1440. Без расписания - весь день.
+    """
+    short, full = WEEKDAY_KEYS[day.weekday()]
+    value = working_hours.get(short, working_hours.get(full, working_hours.get(str(day.weekday()))))
+    if not value:
+        return (0, DAY_MINUTES) if not working_hours else None
+    try:
+        if isinstance(value, dict):
+            if value.get("closed"):
+                return None
+            opens, closes = value.get("open", value.get("from")), value.get("close", value.get("to"))
+        else:
+            opens, closes = str(value).split("-")
+        opens, closes = parse_minute(opens), parse_minute(closes)
+    except (ValueError, AttributeError):
+        return 0, DAY_MINUTES
+    if closes <= opens:
+        closes += DAY_MINUTES
+    return opens, closes
+
+
+# =====================================================
+# Интервальный индекс
+# =====================================================
+class DayIndex:
+    """Занятость столов заведения за день: по столу - starts/ends (минуты, с буферами)"""
+
+    def __init__(self, day: date, tables, rules: BookingRules):
+        self.day = day
+        self.rules = rules
+        # Лучший подходящий стол - самый маленький, поэтому порядок по вместимости
+        self.tables = sorted(tables, key=lambda table: (table.capacity, table.table_id))
+        self.by_id = {table.table_id: table for table in self.tables}
+        self._starts = {table.table_id: [] for table in self.tables}
+        self._ends = {table.table_id: [] for table in self.tables}
+
+    def add(self, table_id: int, start: int, end: int):
+        """Добавить занятость [start, end); пересекающиеся интервалы сливаются"""
+        starts, ends = self._starts.get(table_id), self._ends.get(table_id)
+        if starts is None:
+            return
+        left = bisect_left(ends, start)
+        right = bisect_right(starts, end)
+        if left < right:
+            start = min(start, starts[left])
+            end = max(end, ends[right - 1])
+        starts[left:right] = [start]
+        ends[left:right] = [end]
+
+    def is_free(self, table_id: int, start: int, end: int) -> bool:
+        ends = self._ends[table_id]
+        i = bisect_right(ends, start)
+        return i == len(ends) or self._starts[table_id][i] >= end
+
+    def candidates(self, party_size: int, zone_id: int = None, zone_type: str = None):
+        return [
+            table for table in self.tables
+            if table.capacity >= party_size
+            and (zone_id is None or table.zone_id == zone_id)
+            and (zone_type is None or table.zone_type == zone_type)
+        ]
+
+    def free_tables(self, start: int, duration: int, party_size: int, zone_id: int = None, zone_type: str = None):
+        """Свободные столы под компанию на время start (минуты от полуночи)"""
+        begin, end = self.rules.occupancy(start, duration)
+        return [
+            table for table in self.candidates(party_size, zone_id, zone_type)
+            if self.is_free(table.table_id, begin, end)
+        ]
+
+    def slots(self, party_size: int, duration: int, zone_id: int = None, zone_type: str = None,
+              step: int = BOOKING_SLOT_STEP, not_before: int = None):
+        """[(минута начала, [table_id, ...])] - слоты дня, в которые есть хотя бы один стол"""
+        window = opening_window(self.rules.working_hours, self.day)
+        if window is None:
+            return []
+        opens, closes = window
+        if not_before is not None:
+            opens = max(opens, -(-not_before // step) * step)
+        tables = self.candidates(party_size, zone_id, zone_type)
+        result = []
+        for start in range(opens, closes - duration + 1, step):
+            begin, end = self.rules.occupancy(start, duration)
+            free = [table.table_id for table in tables if self.is_free(table.table_id, begin, end)]
+            if free:
+                result.append((start, free))
+        return result
+
+
+# =====================================================
+# Загрузка и кеш
+# =====================================================
+_lock = threading.Lock()
+_cache = {}  # (restaurant_id, day) -> (время сборки, DayIndex)
+_day_locks = {}  # (restaurant_id, day) -> threading.Lock (не Postgres)
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def load_tables(db: Session, restaurant_id: int):
+    rows = db.query(
+        Table.id, Table.table_number, Table.hall_id, Table.zone_id, Zone.zone_type, Table.capacity, Table.is_vip
+    ).outerjoin(Zone, Zone.id == Table.zone_id).filter(
+        Table.restaurant_id == restaurant_id,
+        Table.is_active == True,
+        Table.status != TableStatus.OUT_OF_SERVICE
+    ).all()
+    return [TableInfo(*row[:5], row[5] or 0, bool(row[6])) for row in rows]
+
+
+def build_index(db: Session, restaurant: Restaurant, day: date) -> DayIndex:
+    """Индекс дня: столы заведения + брони с соседними днями (два запроса)"""
+    rules = BookingRules.of(restaurant)
+    index = DayIndex(day, load_tables(db, restaurant.id), rules)
+    midnight = day_start(day)
+    rows = db.query(Reservation.table_id, Reservation.reservation_time, Reservation.duration_minutes).filter(
+        Reservation.restaurant_id == restaurant.id,
+        Reservation.table_id.isnot(None),
+        Reservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+        # reservation_date = reservation_time при создании; диапазон - по индексу
+        Reservation.reservation_date >= midnight - timedelta(days=1),
+        Reservation.reservation_date < midnight + timedelta(days=2)
+    ).all()
+    for table_id, starts_at, duration in rows:
+        start = int((starts_at - midnight).total_seconds() // 60)
+        index.add(table_id, *rules.occupancy(start, duration or DEFAULT_DURATION))
+    return index
+
+
+def get_index(db: Session, restaurant: Restaurant, day: date) -> DayIndex:
+    key = (restaurant.id, day)
+    cached = _cache.get(key)
+    if cached and time.monotonic() - cached[0] < AVAILABILITY_TTL:
+        return cached[1]
+    index = build_index(db, restaurant, day)
+    with _lock:
+        _cache[key] = (time.monotonic(), index)
+    return index
+
+
+def forget(restaurant_id: int, moment: datetime = None):
+    """Сбросить индексы заведения (дня брони и соседних) после изменения брони"""
+    with _lock:
+        if moment is None:
+            for key in [key for key in _cache if key[0] == restaurant_id]:
+                _cache.pop(key, None)
+            return
+        for offset in (-1, 0, 1):
+            _cache.pop((restaurant_id, moment.date() + timedelta(days=offset)), None)
+
+
+@contextmanager
+def booking_lock(db: Session, restaurant_id: int, days):
+    """
+    Сериализация бронирований заведения на дни days. В Postgres -
+    pg_advisory_xact_lock (снимается при commit/rollback), иначе - блокировка процесса.
+    """
+    days = sorted(set(days))
+    if db.get_bind().dialect.name == "postgresql":
+        for day in days:
+            db.execute(text("SELECT pg_advisory_xact_lock(:restaurant_id, :day)"),
+                       {"restaurant_id": restaurant_id, "day": day.toordinal()})
+        yield
+        return
+
+    with _lock:
+        locks = [_day_locks.setdefault((restaurant_id, day), threading.Lock()) for day in days]
+    for lock in locks:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+# =====================================================
+# Проверки и бронирование
+# =====================================================
+def validate_request(rules: BookingRules, party_size: int, duration: int, starts_at: datetime = None, now: datetime = None):
+    if party_size < 1:
+        raise HTTPException(status_code=400, detail="guest_count must be positive")
+    if rules.max_party_size and party_size > rules.max_party_size:
+        raise HTTPException(status_code=400, detail=f"Maximum party size is {rules.max_party_size}")
+    if duration < 1 or duration > rules.max_duration:
+        raise HTTPException(status_code=400, detail=f"Maximum duration is {rules.max_duration} minutes")
+    if starts_at is not None and now is not None:
+        if starts_at < now:
+            raise HTTPException(status_code=400, detail="Reservation time is in the past")
+        if rules.horizon_days and starts_at > now + timedelta(days=rules.horizon_days):
+            raise HTTPException(status_code=400, detail=f"Bookings are accepted {rules.horizon_days} days ahead")
+
+
+def touched_days(rules: BookingRules, starts_at: datetime, duration: int):
+    """Дни, которые задевает занятость брони (для блокировок)"""
+    begin = starts_at - timedelta(minutes=rules.buffer_before)
+    end = starts_at + timedelta(minutes=duration + rules.buffer_after)
+    days = [begin.date()]
+    while days[-1] < end.date():
+        days.append(days[-1] + timedelta(days=1))
+    return days
+
+
+def reserve_table(db: Session, restaurant: Restaurant, starts_at: datetime, duration: int, party_size: int,
+                  table_id: int = None, zone_id: int = None) -> TableInfo:
+    """
+    Выбрать стол (заданный или лучший подходящий) по свежему индексу из БД.
+    Вызывать под booking_lock; 409, если свободного стола нет.
+    """
+    index = build_index(db, restaurant, starts_at.date())
+    start = int((starts_at - day_start(starts_at.date())).total_seconds() // 60)
+    begin, end = index.rules.occupancy(start, duration)
+
+    if table_id is not None:
+        table = index.by_id.get(table_id)
+        if table is None:
+            raise HTTPException(status_code=404, detail="Table not found")
+        if table.capacity < party_size:
+            raise HTTPException(status_code=400, detail=f"Table capacity is {table.capacity}")
+        if not index.is_free(table.table_id, begin, end):
+            raise HTTPException(status_code=409, detail="Table is already booked for this time")
+        return table
+
+    free = index.free_tables(start, duration, party_size, zone_id)
+    if not free:
+        raise HTTPException(status_code=409, detail="No free tables for this time")
+    return free[0]
@@ -0,0 +1,270 @@
+"""
+Снимок плана заведения: залы, зоны, столы с живым статусом одним ответом.
+
+Снимок собирается фиксированным числом запросов (залы, зоны, столы,
+активные заказы, ближайшие брони) и хранится в памяти процесса, как меню
+в menu_cache. Commit транзакции, меняющей столы, залы, зоны, заказы или
+брони заведения, сбрасывает кеш этого процесса (слушатели сессии ниже);
+изменения из других воркеров и от времени (истекший hold, прошедшая бронь)
+подхватываются пересборкой по FLOOR_PLAN_TTL.
+
+Версия плана - хеш содержимого, поэтому одинакова во всех воркерах и
+меняется при любом изменении, кто бы его ни сделал. Для последних версий
+запоминаются отпечатки структуры и живого состояния каждого стола: клиент
+с ?since=<версия> получает столы, чье состояние отличается от его версии.
+Незнакомая версия или изменившаяся структура - полный снимок.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import analytics
+from availability import ACTIVE_RESERVATION_STATUSES
+from models import Hall, Order, Reservation, Table, Zone
+from order_feed import ACTIVE_ORDER_STATUSES
+
+# Страховка для нескольких воркеров и для времени (истекший hold, прошедшая бронь)
+FLOOR_PLAN_TTL = int(os.getenv("FLOOR_PLAN_TTL", "30"))
+FLOOR_PLAN_DELTA_LOG = int(os.getenv("FLOOR_PLAN_DELTA_LOG", "64"))  # версий на заведение для дельт
+FLOOR_PLAN_RESERVATION_HOURS = int(os.getenv("FLOOR_PLAN_RESERVATION_HOURS", "24"))
+
+_lock = threading.Lock()
+_generations = {}  # restaurant_id -> счетчик сбросов кеша в этом процессе
+_cache = {}  # restaurant_id -> (поколение, время сборки, версия, snapshot, body)
+_history = {}  # restaurant_id -> OrderedDict[версия -> (отпечаток структуры, {table_id: отпечаток состояния})]
+
+
+class FloorPlanStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.deltas = 0
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"cached": len(_cache), "hits": self.hits, "builds": self.builds, "deltas": self.deltas}
+
+
+stats = FloorPlanStats()
+
+
+def touch(restaurant_id: int):
+    """План заведения изменился - следующий запрос пересоберет снимок"""
+    with _lock:
+        _generations[restaurant_id] = _generations.get(restaurant_id, 0) + 1
+        _cache.pop(restaurant_id, None)
+
+
+# =====================================================
+# Инвалидация по изменениям в сессии
+# =====================================================
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Table, Hall, Zone)) or (isinstance(obj, (Order, Reservation)) and obj.table_id is not None):
+            if obj.restaurant_id is not None:
+                session.info.setdefault("floor_plan_changes", set()).add(obj.restaurant_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    for restaurant_id in session.info.pop("floor_plan_changes", ()):
+        touch(restaurant_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session):
+    session.info.pop("floor_plan_changes", None)
+
+
+# =====================================================
+# Сборка снимка
+# =====================================================
+def _iso(moment: datetime):
+    return moment.isoformat() if moment else None
+
+
+def build_snapshot(db: Session, restaurant_id: int) -> dict:
+    """План заведения пятью запросами: залы, зоны, столы, активные заказы, ближайшие брони"""
+    halls = db.query(Hall).filter(Hall.restaurant_id == restaurant_id, Hall.is_active == True).order_by(Hall.id).all()
+    zones = db.query(Zone).filter(Zone.restaurant_id == restaurant_id, Zone.is_active == True).order_by(Zone.id).all()
+    tables = db.query(Table).filter(
+        Table.restaurant_id == restaurant_id, Table.is_active == True
+    ).order_by(Table.hall_id, Table.id).all()
+
+    # Последний активный заказ стола
+    active_orders = {}
+    for order_id, table_id in db.query(Order.id, Order.table_id).filter(
+        Order.restaurant_id == restaurant_id,
+        Order.status.in_(ACTIVE_ORDER_STATUSES),
+        Order.table_id.isnot(None)
+    ).order_by(Order.created_at, Order.id):
+        active_orders[table_id] = order_id
+
+    # Ближайшая (или идущая сейчас) бронь стола; время броней - местное
+    now = analytics.to_local(datetime.utcnow(), analytics.restaurant_timezone(db, restaurant_id))
+    next_reservations = {}
+    for reservation in db.query(
+        Reservation.id, Reservation.table_id, Reservation.reservation_time, Reservation.duration_minutes,
+        Reservation.guest_name, Reservation.guest_count, Reservation.status, Reservation.booking_code
+    ).filter(
+        Reservation.restaurant_id == restaurant_id,
+        Reservation.table_id.isnot(None),
+        Reservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+        Reservation.reservation_date >= now - timedelta(days=1),
+        Reservation.reservation_date < now + timedelta(hours=FLOOR_PLAN_RESERVATION_HOURS)
+    ).order_by(Reservation.reservation_date, Reservation.id):
+        ends_at = reservation.reservation_time + timedelta(minutes=reservation.duration_minutes or 0)
+        if ends_at > now and reservation.table_id not in next_reservations:
+            next_reservations[reservation.table_id] = {
+                "id": reservation.id,
+                "time": _iso(reservation.reservation_time),
+                "duration_minutes": reservation.duration_minutes,
+                "guest_name": reservation.guest_name,
+                "guest_count": reservation.guest_count,
+                "status": reservation.status.value,
+                "booking_code": reservation.booking_code
+            }
+
+    zones_by_hall = {}
+    for zone in zones:
+        zones_by_hall.setdefault(zone.hall_id, []).append({
+            "id": zone.id, "name": zone.name, "zone_type": zone.zone_type,
+            "color": zone.color, "is_vip": zone.is_vip
+        })
+    tables_by_hall = {}
+    for table in tables:
+        tables_by_hall.setdefault(table.hall_id, []).append(dict({
+            "id": table.id,
+            "table_number": table.table_number,
+            "capacity": table.capacity,
+            "zone_id": table.zone_id,
+            "is_vip": table.is_vip,
+            "position_x": table.position_x,
+            "position_y": table.position_y,
+            "short_code": table.short_code
+        }, **live_state(table, active_orders, next_reservations)))
+
+    return {
+        "restaurant_id": restaurant_id,
+        "halls": [
+            {
+                "id": hall.id,
+                "name": hall.name,
+                "description": hall.description,
+                "layout_data": hall.layout_data or {},
+                "zones": zones_by_hall.get(hall.id, []),
+                "tables": tables_by_hall.get(hall.id, [])
+            }
+            for hall in halls
+        ]
+    }
+
+
+def live_state(table: Table, active_orders: dict, next_reservations: dict) -> dict:
+    """Изменчивая часть стола - она же элемент дельты"""
+    return {
+        "status": table.status.value if table.status else None,
+        "held_by_user_id": table.held_by_user_id,
+        "held_until": _iso(table.held_until),
+        "active_order_id": active_orders.get(table.id),
+        "next_reservation": next_reservations.get(table.id)
+    }
+
+
+LIVE_FIELDS = ("status", "held_by_user_id", "held_until", "active_order_id", "next_reservation")
+
+
+def _digest(data) -> str:
+    return hashlib.sha1(
+        json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def fingerprint(snapshot: dict):
+    """(версия, отпечаток структуры, {table_id: отпечаток живого состояния}) снимка без поля version"""
+    live = {}
+    halls = []
+    for hall in snapshot["halls"]:
+        tables = []
+        for table in hall["tables"]:
+            live[table["id"]] = _digest([table[key] for key in LIVE_FIELDS])
+            tables.append({key: value for key, value in table.items() if key not in LIVE_FIELDS})
+        halls.append(dict(hall, tables=tables))
+    structure = _digest(halls)
+    return _digest([structure, sorted(live.items())]), structure, live
+
+
+def get_cached(restaurant_id: int):
+    """(версия, snapshot, body) из кеша без обращения к БД или None"""
+    cached = _cache.get(restaurant_id)
+    if cached and cached[0] == _generations.get(restaurant_id, 0) and time.monotonic() - cached[1] < FLOOR_PLAN_TTL:
+        stats.count("hits")
+        return cached[2:]
+    return None
+
+
+def get_snapshot(db: Session, restaurant_id: int):
+    """(версия, snapshot, body) из кеша, при необходимости пересобрав снимок"""
+    cached = get_cached(restaurant_id)
+    if cached:
+        return cached
+
+    generation = _generations.get(restaurant_id, 0)
+    snapshot = build_snapshot(db, restaurant_id)
+    version, structure, live = fingerprint(snapshot)
+    snapshot["version"] = version
+    body = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    stats.count("builds")
+    with _lock:
+        history = _history.setdefault(restaurant_id, OrderedDict())
+        history.pop(version, None)
+        history[version] = (structure, live)
+        while len(history) > FLOOR_PLAN_DELTA_LOG:
+            history.popitem(last=False)
+        # План изменили во время сборки - в кеш не кладем
+        if _generations.get(restaurant_id, 0) == generation:
+            _cache[restaurant_id] = (generation, time.monotonic(), version, snapshot, body)
+    return version, snapshot, body
+
+
+def changed_tables(restaurant_id: int, since: str, version: str):
+    """
+    Столы, чье живое состояние в версии version отличается от версии since,
+    или None, если дельту не собрать (версия неизвестна этому процессу, менялась структура).
+    """
+    with _lock:
+        history = _history.get(restaurant_id, {})
+        known, current = history.get(since), history.get(version)
+    if known is None or current is None or known[0] != current[0]:
+        return None
+    return {table_id for table_id, state in current[1].items() if known[1].get(table_id) != state}
+
+
+def get_delta(db: Session, restaurant_id: int, since: str):
+    """Дельта {version, delta: True, tables} или None - тогда нужен полный снимок"""
+    if since not in _history.get(restaurant_id, {}):
+        return None
+    version, snapshot, _ = get_snapshot(db, restaurant_id)
+    table_ids = changed_tables(restaurant_id, since, version)
+    if table_ids is None:
+        return None
+
+    tables = [
+        dict({"id": table["id"], "hall_id": hall["id"]}, **{key: table[key] for key in LIVE_FIELDS})
+        for hall in snapshot["halls"] for table in hall["tables"] if table["id"] in table_ids
+    ]
+    stats.count("deltas")
+    return {"version": version, "delta": True, "tables": tables}
@@ -0,0 +1,130 @@
+"""
+Хеширование паролей (bcrypt) в отдельном пуле процессов.
+
+bcrypt занимает 200-300 мс CPU на вызов, поэтому /auth/login и /auth/register
+не считают его в потоках веб-воркера: задачи уходят в пул процессов по числу
+ядер. Очередь ограничена - при переполнении HashingBusy (-> 429 Retry-After).
+passlib загружается при первом хешировании, а не при импорте.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(HASH_WORKERS * 4)))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))  # секунды
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования переполнена"""
+
+
+@functools.lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+
+    # Смена BCRYPT_ROUNDS -> needs_update для старых хешей -> перехеширование при входе
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def get_password_hash(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """(верен ли пароль, новый хеш или None если обновлять не нужно)"""
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class HashingStats:
+    """Латентность вызовов по операциям (hash / verify) и отказы по очереди"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}  # операция -> [count, total_seconds, max_seconds]
+        self.rejected = 0
+        self.in_flight = 0
+
+    def observe(self, operation: str, seconds: float):
+        with self._lock:
+            item = self.calls.setdefault(operation, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += seconds
+            item[2] = max(item[2], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "calls": {
+                    op: {
+                        "count": count,
+                        "avg_ms": round(total / count * 1000, 1) if count else 0.0,
+                        "max_ms": round(maximum * 1000, 1)
+                    }
+                    for op, (count, total, maximum) in self.calls.items()
+                }
+            }
+
+
+stats = HashingStats()
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # forkserver: fork из многопоточного веб-воркера небезопасен
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=context)
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def _submit(operation: str, fn, *args):
+    if not _slots.acquire(blocking=False):
+        with stats._lock:
+            stats.rejected += 1
+        raise HashingBusy()
+
+    with stats._lock:
+        stats.in_flight += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), fn, *args)
+    finally:
+        stats.observe(operation, time.perf_counter() - started)
+        with stats._lock:
+            stats.in_flight -= 1
+        _slots.release()
+
+
+async def hash_async(password: str) -> str:
+    return await _submit("hash", get_password_hash, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    return await _submit("verify", verify_and_update, plain_password, hashed_password)
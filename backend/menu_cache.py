@@ -0,0 +1,114 @@
+"""
+Сборка меню заведения и кеш готового (сериализованного) меню.
+
+Меню собирается фиксированным числом запросов (категории, блюда, модификаторы),
+сериализуется один раз и хранится в памяти процесса по ключу
+(restaurant_id, версия меню). Версия увеличивается при каждом изменении меню,
+ETag считается от содержимого, поэтому одинаков во всех воркерах.
+Меню, собранное на реплике вскоре после изменения, в кеш не попадает:
+реплика могла еще не получить изменение.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session, selectinload
+
+from models import Category, Dish
+
+# Страховка для нескольких воркеров: версия живет в памяти процесса,
+# поэтому запись в кеше считается устаревшей не позже чем через TTL
+MENU_CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "60"))
+# Сколько после изменения меню не доверять сборке с реплики (см. replicas.py)
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+
+_lock = threading.Lock()
+_versions = {}  # restaurant_id -> версия меню
+_cache = {}  # restaurant_id -> (версия, время сборки, body, etag)
+_bumped_at = {}  # restaurant_id -> время последнего изменения
+
+
+def get_menu_version(restaurant_id: int) -> int:
+    return _versions.get(restaurant_id, 0)
+
+
+def bump_menu_version(restaurant_id: int) -> int:
+    """Инвалидация меню заведения (вызывать после изменения категорий/блюд)"""
+    with _lock:
+        version = _versions.get(restaurant_id, 0) + 1
+        _versions[restaurant_id] = version
+        _bumped_at[restaurant_id] = time.monotonic()
+        _cache.pop(restaurant_id, None)
+    return version
+
+
+def build_menu(db: Session, restaurant_id: int, dish_schema) -> list:
+    """Собрать меню тремя запросами: категории, блюда, модификаторы"""
+    categories = db.query(Category).filter(
+        Category.restaurant_id == restaurant_id,
+        Category.is_active == True
+    ).order_by(Category.sort_order).all()
+    if not categories:
+        return []
+
+    dishes = db.query(Dish).options(selectinload(Dish.modifiers)).filter(
+        Dish.category_id.in_([c.id for c in categories]),
+        Dish.is_available == True,
+        Dish.is_stop_list == False
+    ).order_by(Dish.sort_order).all()
+
+    dishes_by_category = {}
+    for dish in dishes:
+        dishes_by_category.setdefault(dish.category_id, []).append(
+            dish_schema.model_validate(dish).model_dump(mode="json")
+        )
+
+    return [
+        {
+            "id": category.id,
+            "name": category.name,
+            "name_kz": category.name_kz,
+            "dishes": dishes_by_category.get(category.id, [])
+        }
+        for category in categories
+    ]
+
+
+def get_cached_menu(restaurant_id: int):
+    """(body, etag) из кеша без обращения к БД или None"""
+    cached = _cache.get(restaurant_id)
+    if cached and cached[0] == get_menu_version(restaurant_id) and time.monotonic() - cached[1] < MENU_CACHE_TTL:
+        return cached[2], cached[3]
+    return None
+
+
+def get_menu(db: Session, restaurant_id: int, dish_schema):
+    """Вернуть (body, etag) меню из кеша, при необходимости пересобрав его"""
+    cached = get_cached_menu(restaurant_id)
+    if cached:
+        return cached
+
+    version = get_menu_version(restaurant_id)
+    menu = build_menu(db, restaurant_id, dish_schema)
+    body = json.dumps(menu, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+    from_replica = db.info.get("replica") is not None
+    with _lock:
+        # Если меню изменили во время сборки, результат в кеш не кладем
+        fresh = not from_replica or time.monotonic() - _bumped_at.get(restaurant_id, float("-inf")) > REPLICA_MAX_LAG
+        if get_menu_version(restaurant_id) == version and fresh:
+            _cache[restaurant_id] = (version, time.monotonic(), body, etag)
+    return body, etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (в т.ч. списка и слабых ETag)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
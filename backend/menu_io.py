@@ -0,0 +1,436 @@
+"""
+Импорт и экспорт меню заведения: CSV, JSON, NDJSON, XLSX.
+
+Импорт читает файл построчно, проверяет каждую строку схемой (DishCreate +
+категория по названию) и считает разницу с текущим меню тремя запросами
+(категории, блюда, модификаторы). Применение - многострочные INSERT и
+UPDATE по первичному ключу пачками в одной транзакции. У существующих
+блюд и категорий меняются только колонки, которые есть в файле (пустая
+ячейка - как отсутствующая колонка); модификаторы блюда из файла заменяют
+прежние. dry_run возвращает только разницу.
+Экспорт отдается потоком в порядке меню (модификаторы - одним запросом на
+пачку блюд); файл экспорта одного заведения - готовый файл импорта другого.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import Category, Dish, Modifier
+
+MENU_IMPORT_MAX_ROWS = int(os.getenv("MENU_IMPORT_MAX_ROWS", "20000"))
+MENU_IO_BATCH = int(os.getenv("MENU_IO_BATCH", "500"))
+MAX_REPORTED_ERRORS = 50
+MAX_DIFF_NAMES = 100
+
+FORMATS = ("csv", "json", "ndjson", "xlsx")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+}
+
+# Колонки плоского формата (CSV, XLSX, NDJSON); modifiers - JSON-список
+COLUMNS = [
+    "category", "category_name_kz", "category_description", "name", "name_kz", "description",
+    "price", "cooking_time", "image_url", "sort_order", "is_available", "modifiers"
+]
+DISH_FIELDS = ["name_kz", "description", "price", "cooking_time", "image_url", "sort_order", "is_available"]
+# Поле категории <- поле строки импорта
+CATEGORY_FIELDS = {"name_kz": "category_name_kz", "description": "category_description"}
+MODIFIER_FIELDS = ["name_kz", "price", "is_required"]
+
+
+def placeholder_image(name: str) -> str:
+    return f"https://placehold.co/400x300/4F46E5/white/png?text={name[:20]}"
+
+
+def detect_format(fmt: str = None, filename: str = None) -> str:
+    fmt = (fmt or os.path.splitext(filename or "")[1].lstrip(".")).lower()
+    if fmt == "jsonl":
+        fmt = "ndjson"
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, allowed: {', '.join(FORMATS)}")
+    if fmt == "xlsx":
+        _openpyxl()  # 400 до чтения файла и до начала потока экспорта
+    return fmt
+
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise HTTPException(status_code=400, detail="XLSX support requires openpyxl")
+    return openpyxl
+
+
+# =====================================================
+# Чтение: поток сырых строк (dict) из файла
+# =====================================================
+def _clean(row: dict) -> dict:
+    """Пустые ячейки - как отсутствующие; modifiers из JSON-строки"""
+    row = {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+    modifiers = row.get("modifiers")
+    if isinstance(modifiers, str):
+        try:
+            row["modifiers"] = json.loads(modifiers)
+        except ValueError:
+            pass  # Ошибку покажет проверка схемой
+    return row
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        for row in csv.DictReader(text):
+            yield _clean(row)
+    finally:
+        text.detach()
+
+
+def _ndjson_rows(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield _clean(json.loads(line))
+
+
+def _json_rows(file):
+    """Документ в формате меню: [{name, dishes: [...]}] или {"categories": [...]}"""
+    data = json.load(file)
+    if isinstance(data, dict):
+        data = data.get("categories", [])
+    for category in data:
+        dishes = category.get("dishes", []) if isinstance(category, dict) else []
+        for dish in dishes:
+            yield _clean(dict(
+                dish,
+                category=category.get("name"),
+                category_name_kz=category.get("name_kz"),
+                category_description=category.get("description")
+            ))
+
+
+def _xlsx_rows(file):
+    workbook = _openpyxl().load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else None for cell in next(rows, [])]
+        for values in rows:
+            yield _clean(dict(zip(header, values)))
+    finally:
+        workbook.close()
+
+
+READERS = {"csv": _csv_rows, "json": _json_rows, "ndjson": _ndjson_rows, "xlsx": _xlsx_rows}
+
+
+def parse(file, fmt: str, row_schema):
+    """
+    Проверенные строки (row_schema) в порядке файла; повтор (категория, блюдо) -
+    побеждает последняя. Ошибки проверки собираются и отдаются одним 400.
+    """
+    rows = OrderedDict()
+    errors = []
+    try:
+        for number, raw in enumerate(READERS[fmt](file), 1):
+            if number > MENU_IMPORT_MAX_ROWS:
+                raise HTTPException(status_code=400, detail=f"Too many rows, max {MENU_IMPORT_MAX_ROWS}")
+            try:
+                row = row_schema.model_validate(raw)
+            except ValidationError as error:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({
+                        "row": number,
+                        "errors": [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()]
+                    })
+                continue
+            rows.pop((row.category, row.name), None)
+            rows[(row.category, row.name)] = row
+    except (ValueError, csv.Error, zipfile.BadZipFile) as error:
+        raise HTTPException(status_code=400, detail=f"Cannot parse {fmt}: {error}")
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Menu validation failed", "errors": errors})
+    return list(rows.values())
+
+
+# =====================================================
+# Разница с текущим меню и применение
+# =====================================================
+def _changed(current: dict, wanted: dict) -> dict:
+    return {key: value for key, value in wanted.items() if current.get(key) != value}
+
+
+def _chunks(items, size: int = MENU_IO_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class MenuDiff:
+    """Что изменит импорт: списки строк для INSERT/UPDATE/DELETE по таблицам"""
+
+    def __init__(self):
+        self.categories = {"create": [], "update": [], "unchanged": 0}
+        self.dishes = {"create": [], "update": [], "unchanged": 0}
+        self.modifiers = {"create": [], "update": [], "delete": [], "unchanged": 0}
+        self.category_ids = {}  # Название -> id существующих категорий
+
+    def summary(self, names: bool = False) -> dict:
+        def section(data):
+            result = {key: (len(value) if isinstance(value, list) else value) for key, value in data.items()}
+            if names:
+                for key in ("create", "update"):
+                    result[f"{key}_names"] = [item["name"] for item in data[key][:MAX_DIFF_NAMES]]
+            return result
+
+        return {
+            "categories": section(self.categories),
+            "dishes": section(self.dishes),
+            "modifiers": section(self.modifiers)
+        }
+
+
+def diff(db: Session, restaurant_id: int, rows) -> MenuDiff:
+    """Сравнить строки импорта с меню заведения (три запроса)"""
+    result = MenuDiff()
+
+    categories = {}
+    for category in db.execute(select(
+        Category.id, Category.name, Category.name_kz, Category.description, Category.sort_order, Category.is_active
+    ).where(Category.restaurant_id == restaurant_id)).mappings():
+        categories.setdefault(category["name"], dict(category))
+
+    dishes = {}
+    if categories:
+        for dish in db.execute(select(
+            Dish.id, Dish.category_id, Dish.name, *[getattr(Dish, field) for field in DISH_FIELDS]
+        ).where(Dish.category_id.in_([category["id"] for category in categories.values()]))).mappings():
+            dishes.setdefault((dish["category_id"], dish["name"]), dict(dish))
+
+    modifiers = {}
+    if dishes:
+        for dish_ids in _chunks([dish["id"] for dish in dishes.values()]):
+            for modifier in db.execute(select(
+                Modifier.id, Modifier.dish_id, Modifier.name, *[getattr(Modifier, field) for field in MODIFIER_FIELDS]
+            ).where(Modifier.dish_id.in_(dish_ids))).mappings():
+                modifiers.setdefault(modifier["dish_id"], {}).setdefault(modifier["name"], dict(modifier))
+
+    # Категории - в порядке первого появления в файле; новые встают после существующих.
+    # Поля категории - только заданные в файле (первое непустое значение)
+    wanted_categories = OrderedDict()
+    for row in rows:
+        wanted = wanted_categories.setdefault(row.category, {})
+        for field, row_field in CATEGORY_FIELDS.items():
+            if row_field in row.model_fields_set and field not in wanted:
+                wanted[field] = getattr(row, row_field)
+    sort_order = max((category["sort_order"] or 0 for category in categories.values()), default=-1)
+    for name, wanted in wanted_categories.items():
+        current = categories.get(name)
+        if current is None:
+            sort_order += 1
+            result.categories["create"].append(dict(
+                {field: None for field in CATEGORY_FIELDS}, **wanted,
+                name=name, is_active=True, restaurant_id=restaurant_id, sort_order=sort_order
+            ))
+        elif _changed(current, wanted):
+            result.categories["update"].append(dict(_changed(current, wanted), id=current["id"], name=name))
+        else:
+            result.categories["unchanged"] += 1
+
+    for row in rows:
+        category = categories.get(row.category)
+        current = dishes.get((category["id"], row.name)) if category else None
+        if current is None:
+            # Новое блюдо - со значениями схемы по умолчанию для отсутствующих колонок
+            wanted = {field: getattr(row, field) for field in DISH_FIELDS}
+            wanted["image_url"] = wanted["image_url"] or placeholder_image(row.name)
+            result.dishes["create"].append(dict(wanted, category=row.category, name=row.name, modifiers=row.modifiers))
+            continue
+        # Существующее - только колонки из файла, иначе умолчания схемы затрут данные
+        wanted = {field: getattr(row, field) for field in DISH_FIELDS if field in row.model_fields_set}
+        if _changed(current, wanted):
+            result.dishes["update"].append(dict(_changed(current, wanted), id=current["id"], name=row.name))
+        else:
+            result.dishes["unchanged"] += 1
+
+        # Модификаторы существующего блюда: файл - источник правды (если колонка есть)
+        if "modifiers" not in row.model_fields_set:
+            continue
+        existing = modifiers.get(current["id"], {})
+        for modifier in row.modifiers:
+            wanted_modifier = {field: getattr(modifier, field) for field in MODIFIER_FIELDS}
+            current_modifier = existing.pop(modifier.name, None)
+            if current_modifier is None:
+                result.modifiers["create"].append(dict(wanted_modifier, dish_id=current["id"], name=modifier.name))
+            elif _changed(current_modifier, wanted_modifier):
+                result.modifiers["update"].append(
+                    dict(_changed(current_modifier, wanted_modifier), id=current_modifier["id"], name=modifier.name)
+                )
+            else:
+                result.modifiers["unchanged"] += 1
+        result.modifiers["delete"].extend(
+            {"id": modifier["id"], "name": modifier["name"]} for modifier in existing.values()
+        )
+
+    # id новых категорий появятся только при применении
+    result.category_ids = {name: category["id"] for name, category in categories.items()}
+    return result
+
+
+def apply(db: Session, result: MenuDiff):
+    """Записать разницу пачками многострочных INSERT/UPDATE (без commit)"""
+    category_ids = dict(result.category_ids)
+    for batch in _chunks(result.categories["create"]):
+        ids = db.scalars(insert(Category).returning(Category.id, sort_by_parameter_order=True), batch).all()
+        category_ids.update(zip([row["name"] for row in batch], ids))
+    for batch in _chunks(result.categories["update"]):
+        db.execute(update(Category), batch)
+
+    new_modifiers = []
+    for batch in _chunks(result.dishes["create"]):
+        rows = [
+            dict({key: value for key, value in row.items() if key not in ("category", "modifiers")},
+                 category_id=category_ids[row["category"]])
+            for row in batch
+        ]
+        ids = db.scalars(insert(Dish).returning(Dish.id, sort_by_parameter_order=True), rows).all()
+        for dish_id, row in zip(ids, batch):
+            new_modifiers.extend(dict(modifier.model_dump(), dish_id=dish_id) for modifier in row["modifiers"])
+    for batch in _chunks(result.dishes["update"]):
+        db.execute(update(Dish), batch)
+
+    for batch in _chunks(result.modifiers["create"] + new_modifiers):
+        db.execute(insert(Modifier), batch)
+    for batch in _chunks(result.modifiers["update"]):
+        db.execute(update(Modifier), batch)
+    for batch in _chunks([row["id"] for row in result.modifiers["delete"]]):
+        db.execute(delete(Modifier).where(Modifier.id.in_(batch)))
+    result.modifiers["create"].extend(new_modifiers)
+
+
+def import_menu(db: Session, restaurant_id: int, file, fmt: str, row_schema, dry_run: bool = False) -> dict:
+    """Импорт файла меню: разница (dry_run) или применение одной транзакцией"""
+    rows = parse(file, fmt, row_schema)
+    result = diff(db, restaurant_id, rows)
+    if dry_run:
+        return dict(result.summary(names=True), dry_run=True, rows=len(rows))
+    apply(db, result)
+    db.commit()
+    return dict(result.summary(), dry_run=False, rows=len(rows))
+
+
+# =====================================================
+# Экспорт
+# =====================================================
+def iter_rows(db: Session, restaurant_id: int):
+    """Плоские строки меню в порядке категорий и блюд; модификаторы - запрос на пачку"""
+    result = db.execute(
+        select(
+            Category.name.label("category"), Category.name_kz.label("category_name_kz"),
+            Category.description.label("category_description"),
+            Dish.id, Dish.name, Dish.name_kz, Dish.description, Dish.price, Dish.cooking_time,
+            Dish.image_url, Dish.sort_order, Dish.is_available
+        ).join(Dish, Dish.category_id == Category.id).where(
+            Category.restaurant_id == restaurant_id, Category.is_active == True
+        ).order_by(Category.sort_order, Category.id, Dish.sort_order, Dish.id).execution_options(yield_per=MENU_IO_BATCH)
+    )
+    for batch in result.partitions():
+        modifiers = {}
+        for dish_id, name, name_kz, price, is_required in db.execute(
+            select(Modifier.dish_id, Modifier.name, Modifier.name_kz, Modifier.price, Modifier.is_required).where(
+                Modifier.dish_id.in_([row.id for row in batch])
+            ).order_by(Modifier.id)
+        ):
+            modifiers.setdefault(dish_id, []).append(
+                {"name": name, "name_kz": name_kz, "price": price, "is_required": is_required}
+            )
+        for row in batch:
+            yield {
+                "category": row.category, "category_name_kz": row.category_name_kz,
+                "category_description": row.category_description,
+                "name": row.name, "name_kz": row.name_kz, "description": row.description, "price": row.price,
+                "cooking_time": row.cooking_time, "image_url": row.image_url, "sort_order": row.sort_order,
+                "is_available": row.is_available, "modifiers": modifiers.get(row.id, [])
+            }
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for number, row in enumerate(rows, 1):
+        writer.writerow([
+            json.dumps(row[column], ensure_ascii=False) if column == "modifiers" else row[column]
+            for column in COLUMNS
+        ])
+        if number % MENU_IO_BATCH == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_chunks(rows):
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _json_chunks(rows):
+    """Документ в формате меню; категории собираются из идущих подряд строк"""
+    yield b"["
+    category = None
+    dishes = []
+
+    def flush():
+        body = {"name": category[0], "name_kz": category[1], "description": category[2], "dishes": dishes}
+        return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    first = True
+    for row in rows:
+        key = (row["category"], row["category_name_kz"], row["category_description"])
+        if key != category:
+            if category is not None:
+                yield (b"" if first else b",") + flush()
+                first = False
+            category, dishes = key, []
+        dishes.append({column: row[column] for column in COLUMNS[3:]})
+    if category is not None:
+        yield (b"" if first else b",") + flush()
+    yield b"]"
+
+
+def _xlsx_chunks(rows):
+    workbook = _openpyxl().Workbook(write_only=True)
+    sheet = workbook.create_sheet("menu")
+    sheet.append(COLUMNS)
+    for row in rows:
+        sheet.append([
+            json.dumps(row[column], ensure_ascii=False) if column == "modifiers" else row[column]
+            for column in COLUMNS
+        ])
+    # XLSX - zip-архив: собираем во временный файл и отдаем кусками
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while True:
+            chunk = file.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+WRITERS = {"csv": _csv_chunks, "json": _json_chunks, "ndjson": _ndjson_chunks, "xlsx": _xlsx_chunks}
+
+
+def export_menu(db: Session, restaurant_id: int, fmt: str):
+    """Генератор байтов файла меню в формате fmt"""
+    return WRITERS[fmt](iter_rows(db, restaurant_id))
@@ -0,0 +1,224 @@
+"""
+Метрики в формате Prometheus (GET /metrics).
+
+HTTP: гистограмма задержек по шаблону маршрута, счетчик ответов по классу
+статуса, запросы в работе, число SQL на запрос (из query_stats). Пулы:
+threadpool anyio (занято/ожидают), пул соединений SQLAlchemy (выдано,
+ожидание соединения, таймауты). Socket.IO: подключенные клиенты, участники
+комнат по типу (restaurant/hall/table/user - без id, чтобы не плодить ряды),
+задержка emit по событию.
+
+Все значения - счетчики и гистограммы prometheus_client с заранее заданными
+корзинами; ничего не считается на каждый запрос сверх пары инкрементов.
+С несколькими воркерами uvicorn задайте PROMETHEUS_MULTIPROC_DIR (пустой
+каталог, очищается перед стартом): каждый процесс пишет свои значения в
+файлы, /metrics любого воркера отдает сумму. Снимки stats модулей
+(hashing, sio_bus, ...) - только воркера, ответившего на запрос.
+"""
+import os
+import time
+
+import anyio.to_thread
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+import query_stats
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Если задан - /metrics только с Authorization: Bearer <token>
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+EMIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# =====================================================
+# HTTP
+# =====================================================
+http_requests = Counter(
+    "http_requests_total", "HTTP responses", ["method", "route", "status"]
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+http_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method"], multiprocess_mode="livesum"
+)
+http_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements per HTTP request", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+
+# =====================================================
+# Пулы
+# =====================================================
+threadpool_tokens = Gauge("threadpool_tokens", "anyio threadpool size", multiprocess_mode="livesum")
+threadpool_borrowed = Gauge("threadpool_borrowed", "anyio threads in use", multiprocess_mode="livesum")
+threadpool_waiting = Gauge("threadpool_waiting", "Tasks waiting for a thread", multiprocess_mode="livesum")
+
+db_pool_size = Gauge("db_pool_size", "Connection pool size", ["engine"], multiprocess_mode="livesum")
+db_pool_max_overflow = Gauge("db_pool_max_overflow", "Connection pool max overflow", ["engine"], multiprocess_mode="livesum")
+db_pool_checked_out = Gauge("db_pool_checked_out", "Connections checked out", ["engine"], multiprocess_mode="livesum")
+db_pool_wait = Histogram("db_pool_wait_seconds", "Time to get a connection from the pool", ["engine"], buckets=POOL_WAIT_BUCKETS)
+db_pool_timeouts = Counter("db_pool_timeouts_total", "Pool checkouts that timed out", ["engine"])
+
+# =====================================================
+# Socket.IO
+# =====================================================
+sio_clients = Gauge("socketio_connected_clients", "Connected Socket.IO clients", multiprocess_mode="livesum")
+sio_room_members = Gauge(
+    "socketio_room_members", "Socket.IO room memberships by room kind", ["kind"], multiprocess_mode="livesum"
+)
+sio_emit_latency = Histogram("socketio_emit_seconds", "Socket.IO emit latency", ["event"], buckets=EMIT_BUCKETS)
+
+
+def room_kind(room: str) -> str:
+    return room.partition(":")[0] or "other"
+
+
+def room_joined(room: str):
+    sio_room_members.labels(room_kind(room)).inc()
+
+
+def room_left(room: str):
+    sio_room_members.labels(room_kind(room)).dec()
+
+
+# =====================================================
+# Пул соединений
+# =====================================================
+_timed_pools = {}
+
+
+def _timed_pool_class(pool_class, name: str):
+    """Подкласс пула, замеряющий ожидание соединения (переживает engine.dispose())"""
+    if (pool_class, name) not in _timed_pools:
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return pool_class._do_get(self)
+            except PoolTimeoutError:
+                db_pool_timeouts.labels(self._metrics_engine).inc()
+                raise
+            finally:
+                db_pool_wait.labels(self._metrics_engine).observe(time.perf_counter() - started)
+
+        _timed_pools[pool_class, name] = type(
+            f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get, "_metrics_engine": name}
+        )
+    return _timed_pools[pool_class, name]
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Метрики пула движка (sync Engine или AsyncEngine.sync_engine)"""
+    pool = engine.pool
+    pool.__class__ = _timed_pool_class(type(pool), name)
+    if callable(getattr(pool, "size", None)):  # У SingletonThreadPool size - число, не метод
+        db_pool_size.labels(name).set(pool.size())
+    db_pool_max_overflow.labels(name).set(getattr(pool, "_max_overflow", 0))
+    checked_out = db_pool_checked_out.labels(name)
+    event.listen(pool, "checkout", lambda *args: checked_out.inc())
+    event.listen(pool, "checkin", lambda *args: checked_out.dec())
+
+
+def observe_threadpool():
+    """Состояние threadpool anyio - только из event loop"""
+    statistics = anyio.to_thread.current_default_thread_limiter().statistics()
+    threadpool_tokens.set(statistics.total_tokens)
+    threadpool_borrowed.set(statistics.borrowed_tokens)
+    threadpool_waiting.set(statistics.tasks_waiting)
+
+
+# =====================================================
+# Снимки stats модулей
+# =====================================================
+class StatsCollector:
+    """component_stat{component, stat} из числовых полей snapshot() (вложенные - через точку)"""
+
+    def __init__(self, components: dict):
+        self.components = components
+
+    def collect(self):
+        family = GaugeMetricFamily("component_stat", "Module stats snapshots", labels=["component", "stat"])
+        for component, source in self.components.items():
+            for stat, value in _flatten(source.snapshot()):
+                family.add_metric([component, stat], value)
+        yield family
+
+
+def _flatten(data: dict, prefix: str = ""):
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+_registry = None
+
+
+def setup(components: dict):
+    """Реестр для /metrics: в multiprocess-режиме - сумма файлов всех воркеров"""
+    global _registry
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        _registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(_registry)
+    else:
+        _registry = REGISTRY
+    _registry.register(StatsCollector(components))
+
+
+def render() -> bytes:
+    observe_threadpool()
+    return generate_latest(_registry)
+
+
+def shutdown():
+    """Файлы живых gauge завершенного воркера больше не учитываются"""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# =====================================================
+# Middleware
+# =====================================================
+class MetricsMiddleware:
+    """Чистый ASGI; маршрут - шаблон пути, известен после роутинга"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_flight = http_in_flight.labels(method)
+        in_flight.inc()
+        observe_threadpool()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_latency.labels(method, route).observe(time.perf_counter() - started)
+            http_requests.labels(method, route, f"{status[0] // 100}xx").inc()
+            queries = query_stats.current()
+            if queries is not None:
+                http_db_queries.labels(route).observe(queries.count)
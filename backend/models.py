@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, JSON, Enum, Table as SQLTable
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, Float, Text, ForeignKey, JSON, Enum, Index, Table as SQLTable
+from sqlalchemy import event, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -229,6 +230,7 @@ class Table(Base):
     id = Column(Integer, primary_key=True, index=True)
     hall_id = Column(Integer, ForeignKey("halls.id"), nullable=False)
     zone_id = Column(Integer, ForeignKey("zones.id"), nullable=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True, index=True)  # = hall.restaurant_id
 
     table_number = Column(String, nullable=False)
     capacity = Column(Integer, default=2)
@@ -271,6 +273,7 @@ class Order(Base):
     id = Column(Integer, primary_key=True, index=True)
     table_id = Column(Integer, ForeignKey("tables.id"))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True)  # = table.restaurant_id
 
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
 
@@ -292,11 +295,18 @@ class Order(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index("idx_orders_restaurant_status_created", "restaurant_id", "status", "created_at"),
+        Index("idx_orders_restaurant_paid_created", "restaurant_id", "is_paid", "created_at"),
+        # Курсор дельта-ленты заказов (order_feed.py)
+        Index("idx_orders_restaurant_updated", "restaurant_id", "updated_at", "id"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     dish_id = Column(Integer, ForeignKey("dishes.id"))
 
     quantity = Column(Integer, default=1)
@@ -313,6 +323,7 @@ class WaiterCall(Base):
     id = Column(Integer, primary_key=True, index=True)
     table_id = Column(Integer, ForeignKey("tables.id"))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True)  # = table.restaurant_id
 
     status = Column(String, default="pending")  # pending, in_progress, resolved
     message = Column(Text, nullable=True)
@@ -323,6 +334,10 @@ class WaiterCall(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     resolved_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("idx_waiter_calls_restaurant_status_created", "restaurant_id", "status", "created_at"),
+    )
+
 class ReservationStatus(str, enum.Enum):
     DRAFT = "draft"
     PENDING = "pending"
@@ -377,6 +392,12 @@ class Reservation(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Список броней заведения (reservation_feed.py) и занятость дня (availability.py)
+        Index("idx_reservations_restaurant_date_status", "restaurant_id", "reservation_date", "status"),
+        Index("idx_reservations_table_date", "table_id", "reservation_date"),
+    )
+
 class ChatMessage(Base):
     """Сообщения между пользователем и официантом"""
     __tablename__ = "chat_messages"
@@ -484,3 +505,116 @@ class FeatureFlag(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OutboxEvent(Base):
+    """Real-time события, записанные в одной транзакции с изменением (transactional outbox)"""
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Номер для догрузки после переподключения: выдает диспетчер в порядке фиксации (outbox.py)
+    seq = Column(BigInteger, nullable=True, unique=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # Гость-адресат
+
+    event = Column(String, nullable=False)  # order_created, order_updated, call_received, ...
+    rooms = Column(JSON, default=[])  # Комнаты Socket.IO
+    payload = Column(JSON, default={})
+
+    # Доставка: захват диспетчером (lease) и отметка об отправке
+    claimed_until = Column(DateTime, nullable=True)
+    dispatched_at = Column(DateTime, nullable=True, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AnalyticsHourly(Base):
+    """Почасовые агрегаты заказов заведения (час - по местному времени Restaurant.timezone)"""
+    __tablename__ = "analytics_hourly"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Начало часа, местное время
+
+    # Суммы в тиынах
+    revenue = Column(BigInteger, default=0)  # total_amount + tips + service_fee оплаченных
+    tips = Column(BigInteger, default=0)
+    fees = Column(BigInteger, default=0)
+
+    orders_count = Column(Integer, default=0)
+    paid_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    cancelled_count = Column(Integer, default=0)
+
+class AnalyticsDaily(Base):
+    """Дневные агрегаты заказов заведения (день - по местному времени)"""
+    __tablename__ = "analytics_daily"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    revenue = Column(BigInteger, default=0)
+    tips = Column(BigInteger, default=0)
+    fees = Column(BigInteger, default=0)
+
+    orders_count = Column(Integer, default=0)
+    paid_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    cancelled_count = Column(Integer, default=0)
+
+class AnalyticsDishDaily(Base):
+    """Продажи блюд по дням (оплаченные заказы)"""
+    __tablename__ = "analytics_dish_daily"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    dish_id = Column(Integer, ForeignKey("dishes.id"), primary_key=True)
+
+    quantity = Column(Integer, default=0)
+    revenue = Column(BigInteger, default=0)  # тиыны
+
+class AnalyticsDelta(Base):
+    """Журнал изменений счетчиков аналитики из транзакций заказов (в агрегаты переносит analytics.apply_loop)"""
+    __tablename__ = "analytics_deltas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False, index=True)
+    moment = Column(DateTime, nullable=False)  # UTC, по нему час и день в агрегатах
+    counters = Column(JSON, default={})  # {"revenue": 12000, "paid_count": 1, ...}
+    order_id = Column(Integer, nullable=True)  # Позиции заказа идут в analytics_dish_daily со знаком dish_sign
+    dish_sign = Column(Integer, default=0)
+
+class CodeSequence(Base):
+    """Счетчики: короткие коды блоками (short_codes.py), seq событий outbox (outbox.py)"""
+    __tablename__ = "code_sequences"
+
+    name = Column(String, primary_key=True)  # tables, outbox_events, ...
+    next_value = Column(BigInteger, nullable=False, default=0)  # Первый еще не выданный номер
+
+class ScheduledJob(Base):
+    """Отложенные задачи (scheduler.py): снятие hold со стола, NO_SHOW и напоминание по брони"""
+    __tablename__ = "scheduled_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True)
+    kind = Column(String, nullable=False)  # hold_release, no_show, reminder
+    target_id = Column(Integer, nullable=False)  # Table.id или Reservation.id
+    due_at = Column(DateTime, nullable=False)  # UTC
+    done_at = Column(DateTime, nullable=True)  # Выполнена (или отменена)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Ближайшие невыполненные задачи (done_at IS NULL ... ORDER BY due_at)
+        Index("idx_scheduled_jobs_pending", "done_at", "due_at"),
+        Index("idx_scheduled_jobs_restaurant_pending", "restaurant_id", "done_at", "due_at"),
+    )
+
+# Денормализованный restaurant_id (заказы/вызовы/столы фильтруются по заведению без join).
+# Эндпоинты проставляют его сами; здесь - подстраховка для остальных мест вставки.
+@event.listens_for(Table, "before_insert")
+def _table_restaurant_id(mapper, connection, target):
+    if target.restaurant_id is None and target.hall_id is not None:
+        target.restaurant_id = connection.scalar(select(Hall.restaurant_id).where(Hall.id == target.hall_id))
+
+@event.listens_for(Order, "before_insert")
+@event.listens_for(WaiterCall, "before_insert")
+def _restaurant_id_from_table(mapper, connection, target):
+    if target.restaurant_id is None and target.table_id is not None:
+        target.restaurant_id = connection.scalar(select(Table.restaurant_id).where(Table.id == target.table_id))
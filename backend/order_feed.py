@@ -0,0 +1,131 @@
+"""
+Дельта-лента заказов для досок официантов (GET /waiter/orders?since=...).
+
+Курсор - пара (updated_at, id) последнего отданного заказа: keyset-пагинация
+по индексу idx_orders_restaurant_updated. Изменение позиций заказа обновляет
+Order.updated_at (before_flush ниже), поэтому одного курсора хватает и для
+самих заказов, и для их позиций. Заказы, которые ушли из активного набора
+(отменены, поданы или не проходят фильтр статусов), отдаются как tombstones.
+"""
+import base64
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+from models import Order, OrderItem, OrderStatus
+
+ACTIVE_ORDER_STATUSES = [
+    OrderStatus.PENDING, OrderStatus.ACCEPTED, OrderStatus.COOKING,
+    OrderStatus.READY, OrderStatus.SERVING
+]
+ORDER_FEED_PAGE_SIZE = int(os.getenv("ORDER_FEED_PAGE_SIZE", "200"))
+# Перекрытие курсора: транзакции, закоммиченные позже, но с более ранним
+# updated_at, попадут в следующий запрос (клиент применяет заказы по id)
+ORDER_FEED_OVERLAP_SECONDS = float(os.getenv("ORDER_FEED_OVERLAP_SECONDS", "2"))
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_orders_on_item_change(session, flush_context, instances):
+    order_ids = {
+        obj.order_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, OrderItem) and obj.order_id
+    }
+    if not order_ids:
+        return
+    now = datetime.utcnow()
+    pending = {obj.id: obj for obj in list(session.new) + list(session.dirty) if isinstance(obj, Order)}
+    for order_id in order_ids:
+        if order_id in pending:
+            pending[order_id].updated_at = now
+        else:
+            session.query(Order).filter(Order.id == order_id).update(
+                {Order.updated_at: now}, synchronize_session=False
+            )
+
+
+def encode_cursor(updated_at: datetime, order_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, order_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_statuses(status: str = None):
+    """Фильтр статусов из query-параметра (через запятую), по умолчанию - активные"""
+    if not status:
+        return list(ACTIVE_ORDER_STATUSES)
+    try:
+        return [OrderStatus(value.strip().lower()) for value in status.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+
+def attach_items(db: Session, orders):
+    """Позиции всех заказов одним запросом (вместо запроса на каждый заказ)"""
+    items = defaultdict(list)
+    if orders:
+        for item in db.query(OrderItem).filter(
+            OrderItem.order_id.in_([order.id for order in orders])
+        ).order_by(OrderItem.id):
+            items[item.order_id].append(item)
+    for order in orders:
+        order.items = items[order.id]
+    return orders
+
+
+def restaurant_orders(db: Session, restaurant_id: int):
+    """Заказы заведения (денормализованный Order.restaurant_id)"""
+    return db.query(Order).filter(Order.restaurant_id == restaurant_id)
+
+
+def get_feed(db: Session, restaurant_id: int, since: str = None, statuses=None, limit: int = ORDER_FEED_PAGE_SIZE):
+    """
+    Страница ленты. Без since - снимок активных заказов, с since - изменения
+    после курсора. Возвращает (orders, tombstones, cursor, has_more).
+    """
+    statuses = statuses or list(ACTIVE_ORDER_STATUSES)
+    query = restaurant_orders(db, restaurant_id)
+
+    if since:
+        since_at, since_id = decode_cursor(since)
+        query = query.filter(tuple_(Order.updated_at, Order.id) > tuple_(since_at, since_id))
+    else:
+        # Снимок: только то, что сейчас на доске
+        since_at, since_id = datetime.min, 0
+        query = query.filter(Order.status.in_(statuses))
+
+    rows = query.order_by(Order.updated_at, Order.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    orders = [order for order in rows if order.status in statuses]
+    tombstones = [
+        {"id": order.id, "status": order.status.value if order.status else None}
+        for order in rows if order.status not in statuses
+    ]
+    attach_items(db, orders)
+
+    if rows:
+        cursor_at, cursor_id = rows[-1].updated_at, rows[-1].id
+    else:
+        cursor_at, cursor_id = since_at, since_id
+    if not has_more:
+        # Лента догнана - курсор отступает на окно перекрытия
+        horizon = datetime.utcnow() - timedelta(seconds=ORDER_FEED_OVERLAP_SECONDS)
+        if cursor_at > horizon:
+            cursor_at, cursor_id = horizon, 0
+    if cursor_at == datetime.min:
+        cursor_at, cursor_id = datetime.utcnow() - timedelta(seconds=ORDER_FEED_OVERLAP_SECONDS), 0
+
+    return orders, tombstones, encode_cursor(cursor_at, cursor_id), has_more
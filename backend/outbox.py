@@ -0,0 +1,185 @@
+"""
+Transactional outbox для real-time событий.
+
+HTTP-эндпоинты пишут событие в outbox_events той же транзакцией, что и заказ
+или вызов официанта. Фоновый диспетчер пачками забирает неотправленные события
+(с lease, чтобы несколько воркеров не слали одно и то же), отправляет их в
+комнаты Socket.IO и только потом отмечает отправленными - доставка
+at-least-once. Клиент после переподключения запрашивает
+GET /events?since=<seq> вместо полной перезагрузки.
+
+seq - не id: id выдается при вставке, а транзакции фиксируются в другом
+порядке, и клиент, уже получивший событие 11, пропустил бы 10, которое
+зафиксировали позже. seq выдает диспетчер уже зафиксированным событиям под
+блокировкой счетчика в code_sequences, поэтому номера становятся видимыми
+строго по возрастанию. /events отдает только пронумерованные события.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event, update
+from sqlalchemy.orm import Session
+
+import short_codes
+from database import run_in_session
+from models import CodeSequence, OutboxEvent
+from rooms import staff_rooms, guest_rooms
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))  # секунды
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+OUTBOX_SEQUENCE = "outbox_events"  # Счетчик seq в code_sequences
+
+logger = logging.getLogger("outbox")
+
+_wakeup = None  # asyncio.Event диспетчера
+_loop = None
+
+
+def add_event(db: Session, event: str, payload: dict, guests: bool = False):
+    """
+    Записать событие в outbox (без commit - фиксируется вместе с изменением).
+    Персоналу событие уходит всегда, guests=True - еще столу и гостю.
+    """
+    rooms = staff_rooms(payload) + (guest_rooms(payload) if guests else [])
+    db.add(OutboxEvent(
+        restaurant_id=payload.get("restaurant_id"),
+        user_id=payload.get("user_id") if guests else None,
+        event=event,
+        rooms=rooms,
+        payload=payload
+    ))
+    db.info["outbox_pending"] = True
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    # Будим диспетчер сразу после фиксации, не дожидаясь интервала опроса
+    if session.info.pop("outbox_pending", False):
+        wake()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop("outbox_pending", None)
+
+
+def wake():
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _assign_seq(db: Session, limit: int):
+    """
+    Пронумеровать зафиксированные события без seq. Строка счетчика
+    заблокирована до commit: другой диспетчер ждет и берет номера после
+    фиксации этих, так что меньший seq никогда не становится видимым позже большего.
+    """
+    if db.query(OutboxEvent.id).filter(OutboxEvent.seq == None).first() is None:
+        return
+
+    stmt = short_codes.sequence_insert()(CodeSequence).values(name=OUTBOX_SEQUENCE, next_value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"], set_={"next_value": CodeSequence.next_value}
+    ).returning(CodeSequence.next_value)
+    next_seq = db.execute(stmt).scalar()
+
+    ids = [row.id for row in db.query(OutboxEvent.id).filter(
+        OutboxEvent.seq == None
+    ).order_by(OutboxEvent.id).limit(limit)]
+    if not ids:
+        return
+    db.execute(update(OutboxEvent), [{"id": event_id, "seq": next_seq + number} for number, event_id in enumerate(ids)])
+    db.query(CodeSequence).filter(CodeSequence.name == OUTBOX_SEQUENCE).update(
+        {CodeSequence.next_value: next_seq + len(ids)}, synchronize_session=False
+    )
+
+
+def _claim_batch(db: Session, limit: int):
+    _assign_seq(db, limit)
+
+    now = datetime.utcnow()
+    events = db.query(OutboxEvent).filter(
+        OutboxEvent.seq != None,
+        OutboxEvent.dispatched_at == None,
+        (OutboxEvent.claimed_until == None) | (OutboxEvent.claimed_until < now)
+    ).order_by(OutboxEvent.seq).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    for item in events:
+        item.claimed_until = claimed_until
+    batch = [(item.id, item.seq, item.event, item.rooms, item.payload) for item in events]
+    db.commit()
+    return batch
+
+
+def _mark_dispatched(db: Session, ids):
+    db.query(OutboxEvent).filter(OutboxEvent.id.in_(ids)).update(
+        {OutboxEvent.dispatched_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _purge(db: Session):
+    threshold = datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+    db.query(OutboxEvent).filter(OutboxEvent.dispatched_at < threshold).delete(synchronize_session=False)
+    db.commit()
+
+
+async def dispatch_once(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Отправить одну пачку событий; возвращает число отправленных"""
+    from websocket import emit_to_rooms  # socketio - к первой отправке, а не к импорту main
+    batch = await run_in_session(_claim_batch, limit)
+    sent = []
+    try:
+        for event_id, seq, event, rooms, payload in batch:
+            await emit_to_rooms(event, dict(payload, seq=seq), rooms)
+            sent.append(event_id)
+    finally:
+        # Неотправленные из пачки заберем повторно после истечения lease
+        if sent:
+            await run_in_session(_mark_dispatched, sent)
+    return len(sent)
+
+
+async def dispatch_loop():
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    last_purge = datetime.utcnow()
+
+    while True:
+        try:
+            # Полная пачка - сразу следующая, иначе ждем wake() или интервал
+            if await dispatch_once() >= OUTBOX_BATCH_SIZE:
+                continue
+            if datetime.utcnow() - last_purge > timedelta(hours=1):
+                await run_in_session(_purge)
+                last_purge = datetime.utcnow()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Outbox dispatch failed")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def events_since(db: Session, since: int, limit: int, restaurant_id=None, user_id=None):
+    """События после seq для догрузки клиентом (персонал - по заведению, гость - свои)"""
+    query = db.query(OutboxEvent).filter(OutboxEvent.seq > since)
+    if restaurant_id is not None:
+        query = query.filter(OutboxEvent.restaurant_id == restaurant_id)
+    else:
+        query = query.filter(OutboxEvent.user_id == user_id)
+    events = query.order_by(OutboxEvent.seq).limit(limit).all()
+    return [
+        {"seq": item.seq, "event": item.event, "data": item.payload, "created_at": item.created_at}
+        for item in events
+    ]
@@ -0,0 +1,146 @@
+"""
+Расчет стоимости заказа на сервере.
+
+Все суммы считаются в целых тиынах (1/100 тенге), во float переводятся только
+при записи в существующие колонки Order/OrderItem. Блюда и модификаторы
+корзины загружаются одним запросом, независимо от размера корзины.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import Category, Dish, Modifier
+
+
+def to_tiyn(amount) -> int:
+    """Тенге (float/str/Decimal) -> тиыны, с округлением половины вверх"""
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_tiyn(amount: int) -> float:
+    return float(Decimal(amount) / 100)
+
+
+def percent_of(amount: int, percent) -> int:
+    return int((Decimal(amount) * Decimal(str(percent or 0)) / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+@dataclass
+class PricedLine:
+    dish_id: int
+    quantity: int
+    unit_price: int  # блюдо + модификаторы, тиыны
+    total: int
+    modifiers: list = field(default_factory=list)
+    special_instructions: str = None
+
+    def as_row(self, order_id: int) -> dict:
+        """Строка для bulk insert в order_items"""
+        return {
+            "order_id": order_id,
+            "dish_id": self.dish_id,
+            "quantity": self.quantity,
+            "price": from_tiyn(self.unit_price),
+            "modifiers": self.modifiers,
+            "total": from_tiyn(self.total),
+            "special_instructions": self.special_instructions
+        }
+
+
+@dataclass
+class PricedOrder:
+    lines: List[PricedLine]
+    subtotal: int
+    service_fee: int
+    tips: int
+
+    @property
+    def total(self) -> int:
+        return self.subtotal + self.service_fee + self.tips
+
+
+def load_dishes(db: Session, dish_ids):
+    """Блюда корзины со всеми модификаторами и заведением - один запрос"""
+    rows = db.query(
+        Dish.id, Dish.price, Dish.is_available, Dish.is_stop_list, Category.restaurant_id,
+        Modifier.id, Modifier.name, Modifier.price, Modifier.is_required
+    ).join(
+        Category, Category.id == Dish.category_id
+    ).outerjoin(
+        Modifier, Modifier.dish_id == Dish.id
+    ).filter(Dish.id.in_(dish_ids)).all()
+
+    dishes = {}
+    for dish_id, price, is_available, is_stop_list, restaurant_id, mod_id, mod_name, mod_price, mod_required in rows:
+        dish = dishes.setdefault(dish_id, {
+            "price": to_tiyn(price),
+            "is_available": is_available,
+            "is_stop_list": is_stop_list,
+            "restaurant_id": restaurant_id,
+            "modifiers": OrderedDict()
+        })
+        if mod_id is not None:
+            dish["modifiers"][mod_id] = {"name": mod_name, "price": to_tiyn(mod_price), "is_required": mod_required}
+    return dishes
+
+
+def price_order(db: Session, restaurant_id: int, items, service_fee_percent=0, min_order_amount=0, tips_amount=0) -> PricedOrder:
+    """
+    Посчитать корзину: items - позиции с dish_id, quantity, modifiers (id
+    модификаторов) и special_instructions. Недоступные, стоп-лист и блюда
+    другого заведения отклоняются с 400.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="Order is empty")
+
+    dishes = load_dishes(db, {item.dish_id for item in items})
+    lines = []
+    for item in items:
+        dish = dishes.get(item.dish_id)
+        if dish is None or dish["restaurant_id"] != restaurant_id:
+            raise HTTPException(status_code=400, detail=f"Dish {item.dish_id} not found")
+        if dish["is_stop_list"] or not dish["is_available"]:
+            raise HTTPException(status_code=400, detail=f"Dish {item.dish_id} is not available")
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
+
+        selected = list(OrderedDict.fromkeys(item.modifiers or []))
+        unknown = [mod_id for mod_id in selected if mod_id not in dish["modifiers"]]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Modifier {unknown[0]} does not belong to dish {item.dish_id}")
+        missing = [mod_id for mod_id, mod in dish["modifiers"].items() if mod["is_required"] and mod_id not in selected]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Modifier {missing[0]} is required for dish {item.dish_id}")
+
+        modifiers = [
+            {"id": mod_id, "name": dish["modifiers"][mod_id]["name"], "price": from_tiyn(dish["modifiers"][mod_id]["price"])}
+            for mod_id in selected
+        ]
+        unit_price = dish["price"] + sum(dish["modifiers"][mod_id]["price"] for mod_id in selected)
+        lines.append(PricedLine(
+            dish_id=item.dish_id,
+            quantity=item.quantity,
+            unit_price=unit_price,
+            total=unit_price * item.quantity,
+            modifiers=modifiers,
+            special_instructions=item.special_instructions
+        ))
+
+    subtotal = sum(line.total for line in lines)
+    if subtotal < to_tiyn(min_order_amount):
+        raise HTTPException(status_code=400, detail=f"Minimum order amount is {from_tiyn(to_tiyn(min_order_amount))}")
+
+    tips = to_tiyn(tips_amount)
+    if tips < 0:
+        raise HTTPException(status_code=400, detail="Tips cannot be negative")
+
+    return PricedOrder(
+        lines=lines,
+        subtotal=subtotal,
+        service_fee=percent_of(subtotal, service_fee_percent),
+        tips=tips
+    )
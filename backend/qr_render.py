@@ -0,0 +1,264 @@
+"""
+Пакетная отрисовка QR-кодов столов (PNG/SVG) и выдача архивом ZIP или PDF для печати.
+
+Картинки рисуются в пуле процессов (qrcode + Pillow занимают CPU) и кладутся
+на диск по хешу содержимого: ссылка, номер стола, формат, размер и версия
+макета. Повторная выгрузка неизменного зала берет все файлы из кеша без
+отрисовки. Модуль не импортирует БД - воркеры пула поднимаются быстро.
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "thanks_qr"))
+QR_RENDER_WORKERS = int(os.getenv("QR_RENDER_WORKERS", str(os.cpu_count() or 1)))
+QR_DEFAULT_SIZE = int(os.getenv("QR_DEFAULT_SIZE", "600"))
+QR_FONT_PATH = os.getenv("QR_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+
+LAYOUT_VERSION = 2  # Менять при изменении макета наклейки - старый кеш перестанет совпадать
+
+# PDF: A4 при 150 dpi, сетка наклеек 2 x 3
+PDF_PAGE = (1240, 1754)
+PDF_GRID = (2, 3)
+PDF_DPI = 150
+
+
+class QRJob(NamedTuple):
+    data: str  # Содержимое QR (ссылка на стол)
+    label: str  # Подпись под кодом
+    fmt: str
+    size: int
+
+    @property
+    def key(self) -> str:
+        raw = f"{LAYOUT_VERSION}|{self.fmt}|{self.size}|{self.label}|{self.data}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def path(self) -> str:
+        key = self.key
+        return os.path.join(QR_CACHE_DIR, key[:2], f"{key}.{self.fmt}")
+
+
+class QRStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.rendered = 0
+
+    def count(self, hits: int, rendered: int):
+        with self._lock:
+            self.cache_hits += hits
+            self.rendered += rendered
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"cache_hits": self.cache_hits, "rendered": self.rendered}
+
+
+stats = QRStats()
+
+
+# =====================================================
+# Отрисовка (выполняется в процессах пула)
+# =====================================================
+def _font(size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(QR_FONT_PATH, size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1
+            return ImageFont.load_default()
+
+
+def _render_png(job: QRJob) -> bytes:
+    import io
+
+    import qrcode
+    from PIL import Image, ImageDraw
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
+    qr.add_data(job.data)
+    qr.make(fit=True)
+    code = qr.make_image(fill_color="black", back_color="white").get_image().convert("L")
+    code = code.resize((job.size, job.size), Image.NEAREST)
+
+    label_height = job.size // 6
+    image = Image.new("L", (job.size, job.size + label_height), 255)
+    image.paste(code, (0, 0))
+    draw = ImageDraw.Draw(image)
+    font = _font(label_height // 2)
+    draw.text((job.size // 2, job.size + label_height // 2), job.label, fill=0, font=font, anchor="mm")
+
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _render_svg(job: QRJob) -> bytes:
+    import io
+    from xml.sax.saxutils import escape
+
+    import qrcode
+    from qrcode.image.svg import SvgPathImage
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2, image_factory=SvgPathImage)
+    qr.add_data(job.data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer)
+    svg = buffer.getvalue().decode("utf-8")
+
+    # Подпись - отдельным текстом под кодом: холст и viewBox выше на 6 модулей,
+    # координаты текста - в единицах viewBox (1 модуль = 1mm)
+    modules = qr.modules_count + 2 * qr.border
+    label = (
+        f'<text x="{modules / 2}" y="{modules + 4}" font-family="sans-serif" font-size="4" '
+        f'font-weight="bold" text-anchor="middle">{escape(job.label)}</text>'
+    )
+    svg = svg.replace(f'height="{modules}mm"', f'height="{modules + 6}mm"', 1)
+    svg = svg.replace(f'viewBox="0 0 {modules} {modules}"', f'viewBox="0 0 {modules} {modules + 6}"', 1)
+    return svg.replace("</svg>", label + "</svg>").encode("utf-8")
+
+
+def render_to_cache(job: QRJob) -> str:
+    """Отрисовать job в файл кеша (атомарно) и вернуть путь"""
+    path = job.path
+    if os.path.exists(path):
+        return path
+    data = _render_png(job) if job.fmt == "png" else _render_svg(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+# =====================================================
+# Пул процессов
+# =====================================================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # forkserver: fork из многопоточного веб-воркера небезопасен
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            _executor = ProcessPoolExecutor(max_workers=QR_RENDER_WORKERS, mp_context=context)
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def render_all(jobs) -> list:
+    """Пути файлов для jobs (в том же порядке); в пул уходят только промахи кеша"""
+    paths = [job.path for job in jobs]
+    missing = [job for job, path in zip(jobs, paths) if not os.path.exists(path)]
+    if missing:
+        chunksize = max(1, len(missing) // (QR_RENDER_WORKERS * 4))
+        list(get_executor().map(render_to_cache, missing, chunksize=chunksize))
+    stats.count(len(jobs) - len(missing), len(missing))
+    return paths
+
+
+# =====================================================
+# Выдача: ZIP потоком, PDF
+# =====================================================
+class _ChunkBuffer:
+    """Файлоподобный приемник для zipfile: накопленное забирается генератором"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(entries):
+    """
+    ZIP потоком: entries - (имя в архиве, путь к файлу). PNG уже сжат,
+    поэтому ZIP_STORED; архив пишется в неперематываемый поток.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, path in entries:
+            with open(path, "rb") as source, archive.open(name, "w") as target:
+                target.write(source.read())
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def pdf_path(jobs, paths) -> str:
+    """
+    Многостраничный PDF (A4, сетка наклеек) из PNG. Кешируется по ключам
+    всех наклеек: неизменный зал отдается готовым файлом.
+    """
+    from PIL import Image
+
+    key = hashlib.sha256(f"{LAYOUT_VERSION}|pdf|{PDF_GRID}|".encode() + "|".join(job.key for job in jobs).encode()).hexdigest()
+    path = os.path.join(QR_CACHE_DIR, key[:2], f"{key}.pdf")
+    if os.path.exists(path):
+        return path
+
+    columns, rows = PDF_GRID
+    cell_width, cell_height = PDF_PAGE[0] // columns, PDF_PAGE[1] // rows
+    margin = 40
+    pages = []
+    for start in range(0, len(paths), columns * rows):
+        page = Image.new("L", PDF_PAGE, 255)
+        for index, label_path in enumerate(paths[start:start + columns * rows]):
+            with Image.open(label_path) as label:
+                label.thumbnail((cell_width - 2 * margin, cell_height - 2 * margin))
+                column, row = index % columns, index // columns
+                x = column * cell_width + (cell_width - label.width) // 2
+                y = row * cell_height + (cell_height - label.height) // 2
+                page.paste(label, (x, y))
+        pages.append(page)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        pages[0].save(file, "PDF", resolution=PDF_DPI, save_all=True, append_images=pages[1:])
+    os.replace(tmp_path, path)
+    return path
+
+
+def file_chunks(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
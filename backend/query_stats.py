@@ -0,0 +1,253 @@
+"""
+Учет SQL-запросов по HTTP-запросам: число, время в БД, самый медленный
+запрос и повторы одного и того же запроса (признак N+1).
+
+Слушатели событий движка (Engine - и sync, и async через sync_engine) пишут
+в объект текущего запроса из ContextVar; его ставит QueryStatsMiddleware.
+Контекст копируется в threadpool (def-эндпоинты, run_db) и в greenlet
+AsyncSession.run_sync, а объект общий - запросы из них попадают в тот же
+учет. Итог уходит в заголовок Server-Timing и в статистику по маршрутам
+(GET /debug/queries, /health).
+
+Бюджет запросов на маршрут (ROUTE_QUERY_BUDGETS, QUERY_BUDGETS из env):
+превышение и повторы пишутся в лог, а при QUERY_BUDGET_MODE=raise
+запрос падает с QueryBudgetExceeded - так регрессии ловятся в тестах.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "1").lower() in ("1", "true", "yes")
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()  # log | raise
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "30"))  # 0 - без бюджета
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+SERVER_TIMING = os.getenv("QUERY_SERVER_TIMING", "1").lower() in ("1", "true", "yes")
+
+# Горячие маршруты: ключ "МЕТОД шаблон пути", значение - максимум запросов
+ROUTE_QUERY_BUDGETS = {
+    "GET /restaurants/{restaurant_id}/menu": 4,
+    "GET /qr/{short_code}": 4,
+    "GET /my-orders": 3,
+    "GET /waiter/orders": 4,
+    "GET /tables/{table_id}/current-order": 3,
+    "GET /restaurants/{restaurant_id}/floor-plan": 7,
+    "GET /restaurants/{restaurant_id}/reservations": 6
+}
+
+logger = logging.getLogger("query_stats")
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|%s|:\w+)\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def parse_budgets(value: str) -> dict:
+    """QUERY_BUDGETS="GET /my-orders=3;GET /qr/{short_code}=4" -> {маршрут: бюджет}"""
+    budgets = {}
+    for item in (value or "").split(";"):
+        route, _, limit = item.rpartition("=")
+        if route.strip() and limit.strip().isdigit():
+            budgets[route.strip()] = int(limit)
+    return budgets
+
+
+ROUTE_QUERY_BUDGETS.update(parse_budgets(os.getenv("QUERY_BUDGETS", "")))
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def fingerprint(statement: str) -> str:
+    """Запрос без литералов и длины IN-списков - одинаков для всех итераций N+1"""
+    statement = _LITERALS.sub("?", statement)
+    statement = _PARAM_LISTS.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class RequestQueries:
+    """Запросы одного HTTP-запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.fingerprints = Counter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+        if seconds >= self.slowest:
+            self.slowest = seconds
+            self.slowest_statement = statement
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD):
+        """[(fingerprint, раз)] для запросов, повторенных threshold раз и больше"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total * 1000:.1f};desc="{self.count} queries"'
+
+
+def current():
+    """Учет текущего HTTP-запроса или None (фоновые задачи, Socket.IO)"""
+    return _current.get()
+
+
+# =====================================================
+# События движка
+# =====================================================
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    started = conn.info.get("query_stats_started")
+    if queries is not None and started:
+        queries.add(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(exception_context):
+    started = exception_context.connection.info.get("query_stats_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+# =====================================================
+# Статистика по маршрутам
+# =====================================================
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}  # маршрут -> счетчики
+
+    def record(self, route: str, queries: RequestQueries, repeated, over_budget: bool):
+        with self._lock:
+            entry = self.routes.setdefault(route, {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "max_db_ms": 0.0,
+                "slowest_ms": 0.0, "slowest_statement": None, "n_plus_one": 0, "over_budget": 0,
+                "repeated": None
+            })
+            entry["requests"] += 1
+            entry["queries"] += queries.count
+            entry["max_queries"] = max(entry["max_queries"], queries.count)
+            entry["db_ms"] += queries.total * 1000
+            entry["max_db_ms"] = max(entry["max_db_ms"], queries.total * 1000)
+            if queries.slowest * 1000 >= entry["slowest_ms"]:
+                entry["slowest_ms"] = queries.slowest * 1000
+                entry["slowest_statement"] = queries.slowest_statement
+            if repeated:
+                entry["n_plus_one"] += 1
+                entry["repeated"] = {"statement": repeated[0][0], "count": repeated[0][1]}
+            if over_budget:
+                entry["over_budget"] += 1
+
+    def routes_snapshot(self) -> dict:
+        with self._lock:
+            return {
+                route: dict(
+                    entry,
+                    avg_queries=round(entry["queries"] / entry["requests"], 2),
+                    avg_db_ms=round(entry["db_ms"] / entry["requests"], 2),
+                    db_ms=round(entry["db_ms"], 2),
+                    max_db_ms=round(entry["max_db_ms"], 2),
+                    slowest_ms=round(entry["slowest_ms"], 2),
+                    budget=budget_for(route)
+                )
+                for route, entry in self.routes.items()
+            }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "routes": len(self.routes),
+                "requests": sum(entry["requests"] for entry in self.routes.values()),
+                "queries": sum(entry["queries"] for entry in self.routes.values()),
+                "n_plus_one": sum(entry["n_plus_one"] for entry in self.routes.values()),
+                "over_budget": sum(entry["over_budget"] for entry in self.routes.values())
+            }
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+
+stats = QueryStats()
+
+
+def budget_for(route: str) -> int:
+    return ROUTE_QUERY_BUDGETS.get(route, QUERY_BUDGET_DEFAULT)
+
+
+def route_name(scope) -> str:
+    """Шаблон пути маршрута (а не сам путь) - иначе каждая ссылка станет своим маршрутом"""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope['method']} {path}"
+
+
+def check(route: str, queries: RequestQueries):
+    """Записать итог запроса; превышение бюджета - в лог или исключение (QUERY_BUDGET_MODE)"""
+    repeated = queries.repeated()
+    budget = budget_for(route)
+    over_budget = bool(budget) and queries.count > budget
+    stats.record(route, queries, repeated, over_budget)
+    if not (repeated or over_budget):
+        return
+
+    problems = []
+    if over_budget:
+        problems.append(f"{queries.count} queries, budget {budget}")
+    for statement, count in repeated:
+        problems.append(f"repeated {count}x: {statement[:200]}")
+    message = f"{route}: " + "; ".join(problems)
+    if QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+# =====================================================
+# Middleware
+# =====================================================
+class QueryStatsMiddleware:
+    """Чистый ASGI: не буферизует ответы (потоковые экспорты идут как есть)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current.set(queries)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and SERVER_TIMING:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", queries.server_timing().encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+        check(route_name(scope), queries)
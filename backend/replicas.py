@@ -0,0 +1,292 @@
+"""
+Чтение с реплик: get_read_db / get_async_read_db для эндпоинтов только на чтение.
+
+DATABASE_REPLICA_URLS - адреса реплик через запятую (Postgres или, для
+локальной проверки, файлы SQLite). Без них зависимости отдают сессию
+основной БД, как get_db. Реплика выбирается по кругу из исправных;
+исправность и отставание (pg_last_xact_replay_timestamp) проверяет фоновый
+поток раз в REPLICA_CHECK_INTERVAL, а ошибка соединения снимает реплику
+сразу. Отстающая больше REPLICA_MAX_LAG реплика не используется, без
+исправных реплик чтение идет в основную БД.
+
+Read-your-writes: если запрос что-то записал в основную БД, его автор
+READ_YOUR_WRITES_SECONDS читает из основной. Отметка - cookie (для любого
+воркера) и память процесса по заголовку Authorization (клиенты без cookie).
+
+Снимает реплику только ошибка соединения: statement_timeout класса маршрута
+(57014) и прочие ошибки запроса - не повод. Чтение, попавшее на реплику в
+момент ее падения, не повторяется и завершается ошибкой; повтор клиента
+уходит на другую реплику или в основную БД.
+"""
+import contextvars
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+import database
+
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))  # секунды
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+STICKY_COOKIE = "db_primary_until"
+STICKY_MEMORY_MAX = 10000
+
+# sqlstate ошибок соединения: класс 08 и остановка/запуск сервера
+CONNECTION_SQLSTATES = ("57P01", "57P02", "57P03")
+
+# 0, если реплика догнала полученный WAL, иначе возраст последней примененной транзакции
+POSTGRES_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+logger = logging.getLogger("replicas")
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.engine = create_engine(url, **database.engine_options(url))
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = None
+        self.AsyncSession = None
+        if database.DB_ASYNC:
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+            async_url = database.to_async_url(url)
+            self.async_engine = create_async_engine(async_url, **database.engine_options(async_url, is_async=True))
+            self.AsyncSession = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True  # До первой проверки считаем исправной
+        self.lag = 0.0
+        self.checked_at = None
+        self.error = None
+        for engine in filter(None, (self.engine, self.async_engine and self.async_engine.sync_engine)):
+            event.listen(engine, "handle_error", self._on_error)
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.lag <= REPLICA_MAX_LAG
+
+    def check(self):
+        """Проверить соединение и отставание"""
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(text(POSTGRES_LAG_QUERY)).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            if not self.healthy:
+                logger.warning("Replica %s is back", self.name)
+            self.healthy, self.error = True, None
+        except Exception as error:
+            self.mark_down(error)
+        self.checked_at = time.time()
+
+    def mark_down(self, error):
+        if self.healthy:
+            logger.warning("Replica %s is down: %s", self.name, error)
+        self.healthy, self.error = False, str(getattr(error, "orig", None) or error)[:200]
+
+    def _on_error(self, context):
+        if context.is_disconnect or is_connection_error(context.sqlalchemy_exception):
+            self.mark_down(context.original_exception)
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag": round(self.lag, 3),
+            "usable": self.usable,
+            "checked_at": self.checked_at,
+            "error": self.error
+        }
+
+
+def is_connection_error(error) -> bool:
+    """OperationalError соединения (без sqlstate или 08xxx), а не отмена запроса по timeout и т.п."""
+    if not isinstance(error, OperationalError):
+        return False
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    return code is None or code.startswith("08") or code in CONNECTION_SQLSTATES
+
+
+replicas = [Replica(f"replica{number}", url) for number, url in enumerate(REPLICA_URLS)]
+
+_round_robin = itertools.count()
+_checker = None
+_stop = threading.Event()
+
+
+def pick():
+    """Следующая пригодная реплика по кругу или None (читать из основной БД)"""
+    usable = [replica for replica in replicas if replica.usable]
+    if not usable:
+        return None
+    return usable[next(_round_robin) % len(usable)]
+
+
+def _check_loop():
+    while not _stop.is_set():
+        for replica in replicas:
+            replica.check()
+        _stop.wait(REPLICA_CHECK_INTERVAL)
+
+
+def start():
+    """Фоновая проверка реплик (поток: проверка не должна ждать в event loop)"""
+    global _checker
+    if replicas and _checker is None:
+        _stop.clear()
+        _checker = threading.Thread(target=_check_loop, name="replica-check", daemon=True)
+        _checker.start()
+
+
+def shutdown():
+    global _checker
+    _stop.set()
+    _checker = None
+    for replica in replicas:
+        replica.engine.dispose()
+
+
+def status() -> list:
+    return [replica.snapshot() for replica in replicas]
+
+
+# =====================================================
+# Read-your-writes
+# =====================================================
+_sticky = {}  # sha1(Authorization) -> время, до которого читать из основной БД
+_sticky_lock = threading.Lock()
+_writes = contextvars.ContextVar("replica_writes", default=None)  # [записал ли текущий запрос]
+
+
+def _client_key(request_headers) -> str:
+    authorization = request_headers.get("authorization")
+    return hashlib.sha1(authorization.encode()).hexdigest() if authorization else None
+
+
+def stick(client_key: str, until: float):
+    with _sticky_lock:
+        if len(_sticky) >= STICKY_MEMORY_MAX:
+            now = time.time()
+            for key in [key for key, value in _sticky.items() if value <= now]:
+                del _sticky[key]
+        _sticky[client_key] = until
+
+
+def is_sticky(request: Request) -> bool:
+    """Автор недавней записи - читать из основной БД"""
+    now = time.time()
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+            return True
+    except ValueError:
+        pass
+    key = _client_key(request.headers)
+    return key is not None and _sticky.get(key, 0) > now
+
+
+@event.listens_for(database.engine, "before_cursor_execute")
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        writes = _writes.get()
+        if writes is not None:
+            writes[0] = True
+
+
+if database.async_engine is not None:
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", _note_write)
+
+
+class ReadYourWritesMiddleware:
+    """После записи в основную БД - cookie и отметка в памяти на READ_YOUR_WRITES_SECONDS"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas:
+            await self.app(scope, receive, send)
+            return
+
+        wrote = [False]
+        token = _writes.set(wrote)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and wrote[0]:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                headers = dict((key.decode("latin-1").lower(), value.decode("latin-1")) for key, value in scope["headers"])
+                key = _client_key(headers)
+                if key is not None:
+                    stick(key, until)
+                cookie = (f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _writes.reset(token)
+
+
+# =====================================================
+# Зависимости
+# =====================================================
+@event.listens_for(Session, "before_flush")
+def _forbid_replica_writes(session, flush_context, instances):
+    if session.info.get("replica") and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("Write attempted in a read-replica session")
+
+
+def _read_target(request: Request):
+    return None if not replicas or is_sticky(request) else pick()
+
+
+def get_read_db(request: Request):
+    """Сессия только для чтения: реплика, а недавнему автору записи и без реплик - основная БД"""
+    replica = _read_target(request)
+    db = replica.Session() if replica else database.SessionLocal()
+    db.info["statement_timeout"] = database._statement_timeout(request)
+    if replica:
+        db.info["replica"] = replica.name
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    """Вариант get_read_db для async-эндпоинтов (AsyncSession при DB_ASYNC)"""
+    replica = _read_target(request)
+    if replica is None:
+        async for db in database.get_async_db(request):
+            yield db
+        return
+    if replica.AsyncSession is None:
+        db = replica.Session()
+        db.info.update(replica=replica.name, statement_timeout=database._statement_timeout(request))
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+    else:
+        async with replica.AsyncSession() as db:
+            db.sync_session.info.update(replica=replica.name, statement_timeout=database._statement_timeout(request))
+            yield db
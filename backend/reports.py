@@ -0,0 +1,366 @@
+"""
+Отчеты владельца на колоночных снимках заказов (NumPy).
+
+Факты заказов и позиций заведения выгружаются из БД в .npy-файлы
+(REPORTS_DIR/<restaurant_id>/) и читаются через memory map. Отчеты -
+векторные группировки (bincount/unique) без циклов по строкам:
+  heatmap     - заказы и выручка по часам недели (местное время)
+  basket      - какие блюда заказывают вместе (пары, support/confidence/lift)
+  tips        - распределение чаевых в % от суммы заказа
+  retention   - удержание гостей по месячным когортам (Order.user_id)
+
+Снимок пересоздается, если старше REPORTS_SNAPSHOT_TTL. Каждая выгрузка -
+новый каталог версии, REPORTS_DIR/<restaurant_id> - symlink на текущую,
+переключается атомарно (os.replace): два воркера, выгружающие одновременно,
+не мешают друг другу, а читатель всегда видит целый снимок.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from analytics import restaurant_timezone, WEEKDAYS
+from models import Dish, Order, OrderItem, OrderStatus
+from pricing import to_tiyn, from_tiyn
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(tempfile.gettempdir(), "thanks_reports"))
+REPORTS_SNAPSHOT_TTL = int(os.getenv("REPORTS_SNAPSHOT_TTL", "3600"))  # секунды
+# Сколько хранить замененные версии: их еще могут дочитывать другие воркеры
+REPORTS_VERSION_GRACE = int(os.getenv("REPORTS_VERSION_GRACE", "300"))  # секунды
+EXPORT_CHUNK = 50000
+
+STATUS_CODES = {status: code for code, status in enumerate(OrderStatus)}
+ORDER_COLUMNS = {
+    "order_id": np.int64,
+    "user_id": np.int64,      # -1 - гость без аккаунта
+    "local_ts": np.int64,     # местное время заведения, секунды от 1970-01-01
+    "status": np.int8,        # STATUS_CODES
+    "is_paid": np.bool_,
+    "subtotal": np.int64,     # тиыны
+    "tips": np.int64,
+}
+ITEM_COLUMNS = {
+    "order_pos": np.int64,    # индекс заказа в колонках orders (позиции отсортированы по нему)
+    "dish_id": np.int32,
+    "quantity": np.int32,
+}
+TIPS_BINS = [0, 0.01, 2.5, 5, 7.5, 10, 12.5, 15, 20, 25, np.inf]
+
+
+class Snapshot:
+    """Колонки заказов и позиций одного заведения (np.ndarray, обычно memmap)"""
+
+    def __init__(self, orders: dict, items: dict, meta: dict):
+        self.orders = orders
+        self.items = items
+        self.meta = meta
+
+    @property
+    def paid(self):
+        return self.orders["is_paid"] & (self.orders["status"] != STATUS_CODES[OrderStatus.CANCELLED])
+
+
+# =====================================================
+# Снимки
+# =====================================================
+def snapshot_path(restaurant_id: int) -> str:
+    return os.path.join(REPORTS_DIR, str(restaurant_id))
+
+
+def save_snapshot(path: str, orders: dict, items: dict, meta: dict):
+    """Записать колонки в новый каталог версии и атомарно переключить на него symlink path"""
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    # Пока пишется - .tmp-каталог, его очистка версий не трогает
+    tmp = tempfile.mkdtemp(dir=directory, prefix=f".{name}.tmp-")
+    for prefix, columns in (("orders", orders), ("items", items)):
+        for column, values in columns.items():
+            np.save(os.path.join(tmp, f"{prefix}.{column}.npy"), values)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    version = os.path.join(directory, f".{name}-{os.path.basename(tmp)[len(name) + 6:]}")
+    os.rename(tmp, version)
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Снимок старого формата - обычный каталог, symlink поверх него не встанет
+        try:
+            os.rename(path, os.path.join(directory, f".{name}-old-{time.time_ns()}"))
+        except OSError:
+            pass  # Уже убрал другой воркер
+    link = os.path.join(directory, f".{name}.link-{os.getpid()}-{time.time_ns()}")
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+    _purge_versions(path)
+
+
+def _purge_versions(path: str):
+    """
+    Удалить замененные версии старше REPORTS_VERSION_GRACE (свежие еще могут
+    читать другие воркеры) и брошенные упавшей выгрузкой .tmp-каталоги.
+    """
+    directory, name = os.path.split(path)
+    current = os.path.basename(os.path.realpath(path))
+    now = time.time()
+    for entry in os.scandir(directory):
+        if entry.name.startswith(f".{name}-") and entry.name != current:
+            threshold = now - REPORTS_VERSION_GRACE
+        elif entry.name.startswith(f".{name}.tmp-"):
+            threshold = now - REPORTS_SNAPSHOT_TTL
+        else:
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime < threshold:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+def load_snapshot(path: str) -> Snapshot:
+    path = os.path.realpath(path)  # Все файлы - из одной версии, даже если symlink переключат
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    load = lambda prefix, name: np.load(os.path.join(path, f"{prefix}.{name}.npy"), mmap_mode="r")
+    return Snapshot(
+        {name: load("orders", name) for name in ORDER_COLUMNS},
+        {name: load("items", name) for name in ITEM_COLUMNS},
+        meta
+    )
+
+
+def _collect(rows, columns: dict, convert):
+    """Потоковая выгрузка строк в массивы кусками по EXPORT_CHUNK"""
+    chunks = {name: [] for name in columns}
+    buffer = []
+
+    def flush():
+        if buffer:
+            for name, values in zip(columns, zip(*buffer)):
+                chunks[name].append(np.array(values, dtype=columns[name]))
+            buffer.clear()
+
+    for row in rows:
+        buffer.append(convert(row))
+        if len(buffer) >= EXPORT_CHUNK:
+            flush()
+    flush()
+    return {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=columns[name])
+        for name, parts in chunks.items()
+    }
+
+
+def export_snapshot(db: Session, restaurant_id: int) -> Snapshot:
+    """Выгрузить факты заведения из БД в колоночный снимок"""
+    tz = restaurant_timezone(db, restaurant_id)
+
+    def order_row(row):
+        order_id, user_id, created_at, status, is_paid, subtotal, total_amount, tips = row
+        local = created_at.replace(tzinfo=timezone.utc).astimezone(tz)
+        local_ts = int(local.replace(tzinfo=timezone.utc).timestamp())
+        return (
+            order_id, user_id if user_id is not None else -1, local_ts,
+            STATUS_CODES.get(status, -1), bool(is_paid), to_tiyn(subtotal or total_amount), to_tiyn(tips)
+        )
+
+    orders = _collect(db.query(
+        Order.id, Order.user_id, Order.created_at, Order.status, Order.is_paid,
+        Order.subtotal, Order.total_amount, Order.tips_amount
+    ).filter(Order.restaurant_id == restaurant_id).order_by(Order.id).yield_per(EXPORT_CHUNK), ORDER_COLUMNS, order_row)
+
+    items = _collect(db.query(OrderItem.order_id, OrderItem.dish_id, OrderItem.quantity).join(
+        Order, Order.id == OrderItem.order_id
+    ).filter(Order.restaurant_id == restaurant_id).order_by(OrderItem.order_id).yield_per(EXPORT_CHUNK),
+        ITEM_COLUMNS, lambda row: (row[0], row[1], row[2] or 0))
+    # order_id -> позиция заказа: отчеты не ищут заказ для каждой позиции
+    items["order_pos"] = np.searchsorted(orders["order_id"], items["order_pos"])
+
+    meta = {"restaurant_id": restaurant_id, "timezone": tz.key, "exported_at": time.time(),
+            "orders": int(len(orders["order_id"])), "items": int(len(items["order_pos"]))}
+    path = snapshot_path(restaurant_id)
+    save_snapshot(path, orders, items, meta)
+    return load_snapshot(path)
+
+
+def get_snapshot(db: Session, restaurant_id: int, refresh: bool = False) -> Snapshot:
+    path = snapshot_path(restaurant_id)
+    meta_file = os.path.join(path, "meta.json")
+    if not refresh and os.path.exists(meta_file) and time.time() - os.path.getmtime(meta_file) < REPORTS_SNAPSHOT_TTL:
+        return load_snapshot(path)
+    return export_snapshot(db, restaurant_id)
+
+
+# =====================================================
+# Отчеты
+# =====================================================
+def hour_of_week_heatmap(snapshot: Snapshot) -> dict:
+    """Оплаченные заказы и выручка по (день недели, час), местное время"""
+    paid = snapshot.paid
+    ts = snapshot.orders["local_ts"][paid]
+    # 1970-01-01 - четверг: сдвиг на 3 дня, чтобы 0 был понедельником
+    slot = ((ts // 86400 + 3) % 7) * 24 + (ts // 3600) % 24
+    revenue = snapshot.orders["subtotal"][paid] + snapshot.orders["tips"][paid]
+    counts = np.bincount(slot, minlength=168).reshape(7, 24)
+    totals = np.bincount(slot, weights=revenue, minlength=168).reshape(7, 24)
+    return {
+        "days": WEEKDAYS,
+        "hours": list(range(24)),
+        "orders": counts.tolist(),
+        "revenue": [[from_tiyn(int(value)) for value in row] for row in totals]
+    }
+
+
+def dish_cooccurrence(snapshot: Snapshot, top: int = 20, min_support: int = 2) -> dict:
+    """Пары блюд в одном оплаченном заказе: count, support, confidence, lift"""
+    keep = snapshot.paid[snapshot.items["order_pos"]]
+    order_pos = snapshot.items["order_pos"][keep]
+    dish_ids = snapshot.items["dish_id"][keep]
+    if len(dish_ids) == 0:
+        return {"orders": 0, "pairs": [], "dish_names": {}}
+
+    # Плотные номера блюд вместо np.unique по всем позициям; ключ (заказ, блюдо)
+    # помещается в int32 почти всегда - сортировка и сравнения вдвое дешевле
+    present = np.flatnonzero(np.bincount(dish_ids))
+    size = len(present)
+    key_type = np.int32 if (len(snapshot.orders["order_id"]) + 1) * size < 2 ** 31 else np.int64
+    dense = np.zeros(present[-1] + 1, dtype=key_type)
+    dense[present] = np.arange(size, dtype=key_type)
+
+    # Уникальные (заказ, блюдо): позиции уже упорядочены по заказу, stable-сортировка почти бесплатна
+    keys = order_pos.astype(key_type) * key_type(size)
+    keys += dense[dish_ids]
+    keys.sort(kind="stable")
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    order_of, dish_of = np.divmod(keys, key_type(size))
+    same = order_of[1:] == order_of[:-1]
+    baskets = len(keys) - int(np.count_nonzero(same))
+    dish_orders = np.bincount(dish_of, minlength=size)
+
+    # Пары внутри заказа: заказы одной длины L - матрица (заказы x L),
+    # все пары столбцов (triu) за одну операцию. Счётчики - плотный bincount,
+    # для очень большого меню - np.unique по ключам пар
+    starts = np.flatnonzero(np.concatenate(([True], ~same)))
+    lengths = np.diff(np.append(starts, len(keys)))
+    dense_counts = size * size <= 16_000_000
+    counts = np.zeros(size * size if dense_counts else 0, dtype=np.int64)
+    pairs = []
+    for length in np.flatnonzero(np.bincount(lengths)[2:]) + 2:
+        rows = starts[lengths == length]
+        basket = dish_of[rows[:, None] + np.arange(length)]
+        if not dense_counts:
+            basket = basket.astype(np.int64)
+        left, right = np.triu_indices(length, 1)
+        length_pairs = (basket[:, left] * size + basket[:, right]).ravel()
+        if dense_counts:
+            counts += np.bincount(length_pairs, minlength=size * size)
+        else:
+            pairs.append(length_pairs)
+    if dense_counts:
+        pair_keys = np.flatnonzero(counts)
+        counts = counts[pair_keys]
+    else:
+        pair_keys, counts = np.unique(np.concatenate(pairs or [np.empty(0, np.int64)]), return_counts=True)
+
+    best = np.argsort(counts, kind="stable")[::-1][:top]
+    best = best[counts[best] >= min_support]
+    return {
+        "orders": baskets,
+        "pairs": [
+            {
+                "dish_a": int(present[a]), "dish_b": int(present[b]),
+                "count": int(count),
+                "support": round(count / baskets, 4),
+                "confidence": round(count / int(dish_orders[a]), 4),
+                "lift": round(count * baskets / (int(dish_orders[a]) * int(dish_orders[b])), 3)
+            }
+            for count, (a, b) in ((int(counts[i]), divmod(int(pair_keys[i]), size)) for i in best)
+        ],
+        "dish_names": {}
+    }
+
+
+def tips_distribution(snapshot: Snapshot) -> dict:
+    """Чаевые в % от суммы оплаченных заказов"""
+    paid = snapshot.paid & (snapshot.orders["subtotal"] > 0)
+    percent = snapshot.orders["tips"][paid] * 100.0 / snapshot.orders["subtotal"][paid]
+    counts, _ = np.histogram(percent, bins=TIPS_BINS)
+    labels = [f"{low:g}-{high:g}%" if np.isfinite(high) else f"{low:g}%+" for low, high in zip(TIPS_BINS, TIPS_BINS[1:])]
+    labels[0] = "0%"
+    if len(percent) == 0:
+        return {"orders": 0, "buckets": [{"range": label, "orders": 0} for label in labels]}
+    p25, p50, p75, p90 = np.percentile(percent, [25, 50, 75, 90])
+    return {
+        "orders": int(len(percent)),
+        "with_tips": round(float(np.mean(percent > 0)), 4),
+        "mean": round(float(np.mean(percent)), 2),
+        "p25": round(float(p25), 2), "p50": round(float(p50), 2),
+        "p75": round(float(p75), 2), "p90": round(float(p90), 2),
+        "buckets": [{"range": label, "orders": int(count)} for label, count in zip(labels, counts)]
+    }
+
+
+def cohort_retention(snapshot: Snapshot, months: int = 12) -> dict:
+    """Доля гостей когорты (месяц первого заказа), вернувшихся через N месяцев"""
+    known = snapshot.orders["user_id"] >= 0
+    users = snapshot.orders["user_id"][known]
+    days = snapshot.orders["local_ts"][known] // 86400
+    dates = days.astype("datetime64[D]")
+    month = dates.astype("datetime64[M]").astype(np.int64)  # месяцев от 1970-01
+    if len(users) == 0:
+        return {"cohorts": []}
+
+    # Активность - уникальные (гость, месяц); после сортировки первая запись гостя - его когорта
+    offset = month.min()
+    active = np.unique(users * 4096 + (month - offset))
+    active_user, active_month = active // 4096, active % 4096 + offset
+    starts = np.concatenate(([True], active_user[1:] != active_user[:-1]))
+    cohort = active_month[starts][np.cumsum(starts) - 1]
+    age = active_month - cohort
+
+    last_cohort = month.max()
+    cohort_ids = np.arange(last_cohort - months + 1, last_cohort + 1)
+    in_range = (cohort >= cohort_ids[0]) & (age < months)
+    cohort_pos = cohort[in_range] - cohort_ids[0]
+    matrix = np.bincount(cohort_pos * months + age[in_range], minlength=months * months).reshape(months, months)
+
+    result = []
+    for pos, cohort_id in enumerate(cohort_ids):
+        size = int(matrix[pos, 0])
+        if not size:
+            continue
+        available = int(last_cohort - cohort_id) + 1
+        result.append({
+            "cohort": str(np.datetime64(int(cohort_id), "M")),
+            "users": size,
+            "retention": [round(int(matrix[pos, i]) / size, 4) for i in range(available)]
+        })
+    return {"cohorts": result}
+
+
+REPORTS = {
+    "heatmap": hour_of_week_heatmap,
+    "basket": dish_cooccurrence,
+    "tips": tips_distribution,
+    "retention": cohort_retention,
+}
+
+
+def build_report(db: Session, restaurant_id: int, name: str, refresh: bool = False) -> dict:
+    if name not in REPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown report. Available: {', '.join(REPORTS)}")
+    snapshot = get_snapshot(db, restaurant_id, refresh)
+    report = REPORTS[name](snapshot)
+    if name == "basket" and report["pairs"]:
+        ids = {pair["dish_a"] for pair in report["pairs"]} | {pair["dish_b"] for pair in report["pairs"]}
+        report["dish_names"] = {dish_id: dish_name for dish_id, dish_name in db.query(Dish.id, Dish.name).filter(Dish.id.in_(ids))}
+    report["snapshot"] = {
+        "exported_at": datetime.fromtimestamp(snapshot.meta["exported_at"], timezone.utc).isoformat(),
+        "orders": snapshot.meta["orders"],
+        "items": snapshot.meta["items"]
+    }
+    return report
@@ -0,0 +1,110 @@
+"""
+Список броней заведения постранично (GET /restaurants/{id}/reservations).
+
+Курсор - пара (reservation_date, id) последней отданной брони: keyset-пагинация
+по индексу idx_reservations_restaurant_date_status, без OFFSET, поэтому
+страница стоит одинаково и на свежем заведении, и на годах истории.
+Фильтры (даты, статусы, зона, стол) сужают тот же диапазон индекса.
+По запросу (embed=tables,zones) первая страница несет снимок столов с залами
+и зон - админке хватает одного запроса.
+"""
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from models import Hall, Reservation, ReservationStatus, Table, Zone
+from order_feed import decode_cursor, encode_cursor
+
+RESERVATION_PAGE_SIZE = int(os.getenv("RESERVATION_PAGE_SIZE", "50"))
+RESERVATION_PAGE_MAX = 500
+EMBEDS = {"tables", "zones"}
+
+
+def parse_statuses(status: str = None):
+    """Фильтр статусов (через запятую), по умолчанию - все"""
+    if not status:
+        return None
+    try:
+        return [ReservationStatus(value.strip().lower()) for value in status.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+
+def parse_embed(embed: str = None) -> set:
+    names = {name.strip() for name in (embed or "").split(",") if name.strip()}
+    if names - EMBEDS:
+        raise HTTPException(status_code=400, detail=f"Unknown embed, allowed: {', '.join(sorted(EMBEDS))}")
+    return names
+
+
+def _parse_day(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+
+
+def get_page(db: Session, restaurant_id: int, date_from: str = None, date_to: str = None, statuses=None,
+             zone_id: int = None, table_id: int = None, cursor: str = None, limit: int = RESERVATION_PAGE_SIZE,
+             descending: bool = True):
+    """
+    Страница броней. Даты - местные (как хранится reservation_date), date_to
+    включительно. Возвращает (reservations, cursor следующей страницы или None).
+    """
+    query = db.query(Reservation).filter(Reservation.restaurant_id == restaurant_id)
+    if date_from:
+        query = query.filter(Reservation.reservation_date >= _parse_day(date_from))
+    if date_to:
+        query = query.filter(Reservation.reservation_date < _parse_day(date_to) + timedelta(days=1))
+    if statuses:
+        query = query.filter(Reservation.status.in_(statuses))
+    if zone_id is not None:
+        query = query.filter(Reservation.zone_id == zone_id)
+    if table_id is not None:
+        query = query.filter(Reservation.table_id == table_id)
+
+    key = tuple_(Reservation.reservation_date, Reservation.id)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.filter(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(Reservation.reservation_date.desc(), Reservation.id.desc())
+    else:
+        query = query.order_by(Reservation.reservation_date, Reservation.id)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].reservation_date, rows[-1].id)
+
+
+def tables_snapshot(db: Session, restaurant_id: int):
+    """Активные столы заведения с названием зала - одним запросом"""
+    rows = db.query(
+        Table.id, Table.table_number, Table.capacity, Table.is_vip, Table.status, Table.zone_id,
+        Table.hall_id, Hall.name
+    ).join(Hall, Hall.id == Table.hall_id).filter(
+        Table.restaurant_id == restaurant_id, Table.is_active == True
+    ).order_by(Hall.id, Table.id).all()
+    return [
+        {
+            "id": table_id, "table_number": number, "capacity": capacity, "is_vip": is_vip,
+            "status": status.value if status else None, "zone_id": zone_id,
+            "hall_id": hall_id, "hall_name": hall_name
+        }
+        for table_id, number, capacity, is_vip, status, zone_id, hall_id, hall_name in rows
+    ]
+
+
+def zones_snapshot(db: Session, restaurant_id: int):
+    rows = db.query(Zone.id, Zone.hall_id, Zone.name, Zone.zone_type, Zone.is_vip).filter(
+        Zone.restaurant_id == restaurant_id, Zone.is_active == True
+    ).order_by(Zone.id).all()
+    return [
+        {"id": zone_id, "hall_id": hall_id, "name": name, "zone_type": zone_type, "is_vip": is_vip}
+        for zone_id, hall_id, name, zone_type, is_vip in rows
+    ]
@@ -0,0 +1,61 @@
+"""
+Имена комнат Socket.IO и выбор комнат для события.
+
+Без зависимости от socketio: outbox.add_event вызывается в HTTP-эндпоинтах,
+и импорт main не должен тянуть сервер Socket.IO (см. websocket.py).
+"""
+from models import UserRole
+
+# Комнаты: каждое событие - один emit в комнаты, которых оно касается
+#   restaurant:{id} - персонал заведения (админы, владельцы, официанты без залов)
+#   hall:{id}       - официанты, закрепленные за залом (User.assigned_halls)
+#   table:{id}      - гости за столом (вход по short_code из QR)
+#   user:{id}       - личная комната пользователя
+STAFF_ROLES = {UserRole.WAITER, UserRole.ADMIN, UserRole.OWNER, UserRole.MODERATOR}
+
+
+def restaurant_room(restaurant_id):
+    return f"restaurant:{restaurant_id}"
+
+
+def hall_room(hall_id):
+    return f"hall:{hall_id}"
+
+
+def table_room(table_id):
+    return f"table:{table_id}"
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+def principal_rooms(principal):
+    """Комнаты пользователя выводятся из его роли и заведения, а не из запроса клиента"""
+    rooms = [user_room(principal.id)]
+    if principal.role in STAFF_ROLES and principal.restaurant_id:
+        if principal.role == UserRole.WAITER and principal.assigned_halls:
+            rooms += [hall_room(hall_id) for hall_id in principal.assigned_halls]
+        else:
+            rooms.append(restaurant_room(principal.restaurant_id))
+    return rooms
+
+
+def staff_rooms(data):
+    """Комнаты персонала для события с ключами restaurant_id / hall_id"""
+    rooms = []
+    if data.get('restaurant_id'):
+        rooms.append(restaurant_room(data['restaurant_id']))
+    if data.get('hall_id'):
+        rooms.append(hall_room(data['hall_id']))
+    return rooms
+
+
+def guest_rooms(data):
+    """Комнаты гостя для события с ключами table_id / user_id"""
+    rooms = []
+    if data.get('table_id'):
+        rooms.append(table_room(data['table_id']))
+    if data.get('user_id'):
+        rooms.append(user_room(data['user_id']))
+    return rooms
@@ -0,0 +1,316 @@
+"""
+Таймеры заведений: снятие hold со стола, NO_SHOW и напоминание по брони.
+
+Задача пишется в scheduled_jobs той же транзакцией, что и изменение (как
+событие outbox), поэтому переживает рестарт. Каждый воркер держит кучу
+ближайших задач (due_at, id) и спит до ее вершины или до wake(): свои новые
+задачи попадают в кучу сразу после commit, чужие и после рестарта -
+периодической выборкой невыполненных задач ближайшего окна
+(SCHEDULER_HORIZON_SECONDS) по индексу (done_at, due_at), без скана таблицы.
+Задачу выполняет тот воркер, чей UPDATE ... WHERE done_at IS NULL прошел
+первым; обработчики проверяют текущее состояние (hold продлен, гость пришел).
+Ближайшее время срабатывания заведения уходит персоналу событием outbox.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event, update
+from sqlalchemy.orm import Session
+
+import analytics
+import availability
+import outbox
+import table_codes
+from database import run_in_session
+from models import Reservation, ReservationStatus, ScheduledJob, Table, TableStatus
+
+HOLD_RELEASE = "hold_release"
+NO_SHOW = "no_show"
+REMINDER = "reminder"
+
+SCHEDULER_SYNC_INTERVAL = float(os.getenv("SCHEDULER_SYNC_INTERVAL", "15"))  # секунды
+SCHEDULER_HORIZON_SECONDS = int(os.getenv("SCHEDULER_HORIZON_SECONDS", "3600"))
+SCHEDULER_RETENTION_HOURS = int(os.getenv("SCHEDULER_RETENTION_HOURS", "24"))
+TABLE_HOLD_MINUTES = int(os.getenv("TABLE_HOLD_MINUTES", "15"))
+TABLE_HOLD_MAX_MINUTES = int(os.getenv("TABLE_HOLD_MAX_MINUTES", "120"))
+RESERVATION_NO_SHOW_GRACE = int(os.getenv("RESERVATION_NO_SHOW_GRACE", "20"))  # минуты после начала
+RESERVATION_REMINDER_MINUTES = int(os.getenv("RESERVATION_REMINDER_MINUTES", "120"))  # минуты до начала
+
+# Брони, которые еще могут стать NO_SHOW / получить напоминание
+WAITING_RESERVATION_STATUSES = [ReservationStatus.PENDING, ReservationStatus.CONFIRMED, ReservationStatus.AWAITING]
+
+logger = logging.getLogger("scheduler")
+
+_lock = threading.Lock()
+_heap = []  # (due_at, job_id, kind, target_id, restaurant_id)
+_queued = set()  # job_id в куче
+_wakeup = None
+_loop = None
+
+
+class SchedulerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.executed = 0
+        self.skipped = 0  # Выполнена другим воркером
+        self.failed = 0
+
+    def count(self, field: str, value: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            next_due = _heap[0][0].isoformat() if _heap else None
+            return {
+                "queued": len(_heap), "next_due_at": next_due, "scheduled": self.scheduled,
+                "executed": self.executed, "skipped": self.skipped, "failed": self.failed
+            }
+
+
+stats = SchedulerStats()
+
+
+def _push(entries):
+    with _lock:
+        for entry in entries:
+            if entry[1] not in _queued:
+                _queued.add(entry[1])
+                heapq.heappush(_heap, entry)
+
+
+def wake():
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+# =====================================================
+# Постановка задач (в транзакции изменения)
+# =====================================================
+def schedule(db: Session, kind: str, target_id: int, due_at: datetime, restaurant_id: int = None) -> ScheduledJob:
+    """
+    Записать задачу (без commit); due_at - UTC. В кучу воркера попадает после
+    commit; персоналу о новом сроке сообщает announce() вызывающего.
+    """
+    job = ScheduledJob(restaurant_id=restaurant_id, kind=kind, target_id=target_id, due_at=due_at)
+    db.add(job)
+    db.flush()
+    db.info.setdefault("scheduled_jobs", []).append((due_at, job.id, kind, target_id, restaurant_id))
+    return job
+
+
+def cancel(db: Session, kind: str, target_id: int):
+    """Отменить невыполненные задачи kind для объекта (без commit)"""
+    db.query(ScheduledJob).filter(
+        ScheduledJob.done_at == None, ScheduledJob.kind == kind, ScheduledJob.target_id == target_id
+    ).update({ScheduledJob.done_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def schedule_reservation(db: Session, reservation: Reservation):
+    """Напоминание и NO_SHOW по брони (время брони - местное время заведения)"""
+    tz = analytics.restaurant_timezone(db, reservation.restaurant_id)
+    starts_at = analytics.to_utc(reservation.reservation_time, tz)
+    remind_at = starts_at - timedelta(minutes=RESERVATION_REMINDER_MINUTES)
+    if remind_at > datetime.utcnow():
+        schedule(db, REMINDER, reservation.id, remind_at, reservation.restaurant_id)
+    schedule(db, NO_SHOW, reservation.id, starts_at + timedelta(minutes=RESERVATION_NO_SHOW_GRACE),
+             reservation.restaurant_id)
+    announce(db, reservation.restaurant_id)
+
+
+def cancel_reservation(db: Session, reservation: Reservation):
+    """Гость пришел или бронь закрыта - напоминание и NO_SHOW больше не нужны"""
+    cancel(db, REMINDER, reservation.id)
+    cancel(db, NO_SHOW, reservation.id)
+    announce(db, reservation.restaurant_id)
+
+
+def next_due(db: Session, restaurant_id: int):
+    """Ближайшая невыполненная задача заведения (по индексу restaurant_id, done_at, due_at)"""
+    return db.query(ScheduledJob.due_at, ScheduledJob.kind, ScheduledJob.target_id).filter(
+        ScheduledJob.restaurant_id == restaurant_id, ScheduledJob.done_at == None
+    ).order_by(ScheduledJob.due_at).first()
+
+
+def announce(db: Session, restaurant_id: int):
+    """Событие timers_updated персоналу заведения: когда и что сработает следующим"""
+    row = next_due(db, restaurant_id)
+    outbox.add_event(db, "timers_updated", {
+        "restaurant_id": restaurant_id,
+        "next_due_at": row.due_at.isoformat() if row else None,
+        "kind": row.kind if row else None,
+        "target_id": row.target_id if row else None
+    })
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _queue_after_commit(session):
+    entries = session.info.pop("scheduled_jobs", None)
+    if entries:
+        _push(entries)
+        stats.count("scheduled", len(entries))
+        wake()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session):
+    session.info.pop("scheduled_jobs", None)
+
+
+# =====================================================
+# Обработчики (возвращают действие после commit или None)
+# =====================================================
+def _release_hold(db: Session, table_id: int, now: datetime):
+    table = db.query(Table).filter(Table.id == table_id).first()
+    if table is None or table.status != TableStatus.HELD:
+        return None
+    if table.held_until and table.held_until > now:
+        return None  # Hold продлили - сработает задача нового срока
+    table.status = TableStatus.AVAILABLE
+    table.held_by_user_id = None
+    table.held_until = None
+    outbox.add_event(db, "table_updated", {
+        "restaurant_id": table.restaurant_id, "hall_id": table.hall_id, "table_id": table.id,
+        "status": TableStatus.AVAILABLE.value, "reason": HOLD_RELEASE
+    })
+    # Ответ /qr содержит статус стола
+    return lambda: table_codes.forget_payloads(table_id=table_id)
+
+
+def _mark_no_show(db: Session, reservation_id: int, now: datetime):
+    reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+    if reservation is None or reservation.status not in WAITING_RESERVATION_STATUSES:
+        return None
+    reservation.status = ReservationStatus.NO_SHOW
+    reservation.updated_at = now
+    outbox.add_event(db, "reservation_updated", {
+        "restaurant_id": reservation.restaurant_id, "reservation_id": reservation.id,
+        "table_id": reservation.table_id, "status": ReservationStatus.NO_SHOW.value
+    })
+    restaurant_id, moment = reservation.restaurant_id, reservation.reservation_time
+    # Стол освободился - индекс доступности дня пересоберется
+    return lambda: availability.forget(restaurant_id, moment)
+
+
+def _send_reminder(db: Session, reservation_id: int, now: datetime):
+    reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+    if reservation is None or reservation.reminder_sent or reservation.status not in WAITING_RESERVATION_STATUSES:
+        return None
+    reservation.reminder_sent = True
+    outbox.add_event(db, "reservation_reminder", {
+        "restaurant_id": reservation.restaurant_id, "reservation_id": reservation.id,
+        "table_id": reservation.table_id, "user_id": reservation.user_id,
+        "guest_name": reservation.guest_name, "guest_count": reservation.guest_count,
+        "reservation_time": reservation.reservation_time.isoformat()
+    }, guests=reservation.user_id is not None)
+    return None
+
+
+HANDLERS = {HOLD_RELEASE: _release_hold, NO_SHOW: _mark_no_show, REMINDER: _send_reminder}
+
+
+# =====================================================
+# Выполнение
+# =====================================================
+def _execute(db: Session, entry) -> bool:
+    """Забрать задачу (UPDATE ... WHERE done_at IS NULL) и выполнить в той же транзакции"""
+    _, job_id, kind, target_id, restaurant_id = entry
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(ScheduledJob).where(ScheduledJob.id == job_id, ScheduledJob.done_at == None).values(done_at=now)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        return False
+    handler = HANDLERS.get(kind)
+    after = handler(db, target_id, now) if handler else None
+    if restaurant_id is not None:
+        announce(db, restaurant_id)
+    db.commit()
+    if after:
+        after()
+    return True
+
+
+def _sync(db: Session):
+    """Невыполненные задачи ближайшего окна (свои после рестарта и чужих воркеров)"""
+    horizon = datetime.utcnow() + timedelta(seconds=SCHEDULER_HORIZON_SECONDS)
+    rows = db.query(
+        ScheduledJob.due_at, ScheduledJob.id, ScheduledJob.kind, ScheduledJob.target_id, ScheduledJob.restaurant_id
+    ).filter(ScheduledJob.done_at == None, ScheduledJob.due_at < horizon).order_by(ScheduledJob.due_at).all()
+    _push([tuple(row) for row in rows])
+
+
+def _purge(db: Session):
+    threshold = datetime.utcnow() - timedelta(hours=SCHEDULER_RETENTION_HOURS)
+    db.query(ScheduledJob).filter(ScheduledJob.done_at < threshold).delete(synchronize_session=False)
+    db.commit()
+
+
+def _pop_due(now: datetime):
+    with _lock:
+        due = []
+        while _heap and _heap[0][0] <= now:
+            entry = heapq.heappop(_heap)
+            _queued.discard(entry[1])
+            due.append(entry)
+        return due
+
+
+async def run_due() -> int:
+    """Выполнить наступившие задачи; возвращает число выполненных этим воркером"""
+    executed = 0
+    for entry in _pop_due(datetime.utcnow()):
+        try:
+            if await run_in_session(_execute, entry):
+                executed += 1
+            else:
+                stats.count("skipped")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Задача осталась невыполненной - вернется со следующей выборкой
+            stats.count("failed")
+            logger.exception("Scheduled job %s (%s) failed", entry[1], entry[2])
+    stats.count("executed", executed)
+    return executed
+
+
+def _seconds_to_next() -> float:
+    with _lock:
+        if not _heap:
+            return SCHEDULER_SYNC_INTERVAL
+        return max(0.0, min(SCHEDULER_SYNC_INTERVAL, (_heap[0][0] - datetime.utcnow()).total_seconds()))
+
+
+async def run_loop():
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    last_sync = last_purge = datetime.min
+
+    while True:
+        try:
+            now = datetime.utcnow()
+            if now - last_sync >= timedelta(seconds=SCHEDULER_SYNC_INTERVAL):
+                await run_in_session(_sync)
+                last_sync = now
+            await run_due()
+            if now - last_purge > timedelta(hours=1):
+                await run_in_session(_purge)
+                last_purge = now
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Scheduler loop failed")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=_seconds_to_next())
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
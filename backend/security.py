@@ -0,0 +1,171 @@
+"""
+JWT-токены и кеш аутентифицированных пользователей (principal).
+
+get_current_user не ходит в БД на каждый запрос: снимок пользователя
+(id, роль, заведение, залы, блокировка) хранится в LRU-кеше с TTL.
+Изменение пользователя в этом процессе сразу сбрасывает запись, в остальных
+воркерах заблокированный пользователь отсекается не позже чем через TTL.
+python-jose загружается при первом выпуске или проверке токена.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import User, UserRole
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))  # секунды
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def token_claims(user) -> dict:
+    """Claims токена: email + id, роль и заведение для сверки с кешем"""
+    role = user.role.value if isinstance(user.role, UserRole) else user.role
+    return {"sub": user.email, "uid": user.id, "role": role, "rid": user.restaurant_id}
+
+
+def decode_token(token: str) -> dict:
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Неизменяемый снимок пользователя для проверки прав"""
+    id: int
+    email: str
+    full_name: Optional[str]
+    role: UserRole
+    restaurant_id: Optional[int]
+    assigned_halls: tuple
+    assigned_zones: tuple
+    is_active: bool
+    is_blocked: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            restaurant_id=user.restaurant_id,
+            assigned_halls=tuple(user.assigned_halls or ()),
+            assigned_zones=tuple(user.assigned_zones or ()),
+            is_active=user.is_active is not False,
+            is_blocked=bool(user.is_blocked),
+        )
+
+
+class PrincipalCache:
+    """LRU-кеш Principal по email с TTL"""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()  # email -> (expires_at, principal)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str) -> Optional[Principal]:
+        with self._lock:
+            item = self._items.get(email)
+            if item is None or item[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._items.move_to_end(email)
+            self.hits += 1
+            return item[1]
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._items[principal.email] = (time.monotonic() + self.ttl, principal)
+            self._items.move_to_end(principal.email)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._items.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def load_principal(db: Session, email: str) -> Principal:
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise credentials_exception
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return principal
+
+
+def check_principal(principal: Principal, payload: dict) -> Principal:
+    """Отсечь заблокированных и токены, выданные до смены роли/заведения"""
+    if principal.is_blocked or not principal.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is blocked")
+    role = principal.role.value if isinstance(principal.role, UserRole) else principal.role
+    if "role" in payload and payload["role"] != role:
+        raise credentials_exception
+    if "rid" in payload and payload["rid"] != principal.restaurant_id:
+        raise credentials_exception
+    return principal
+
+
+# Сброс кеша при изменении/удалении пользователя. Повторно сбрасываем после
+# commit, чтобы не закешировать старые данные, прочитанные до фиксации
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    # Включая старый email, если его поменяли
+    emails = {target.email, *(e for e in inspect(target).attrs.email.history.deleted if e)}
+    for email in emails:
+        principal_cache.invalidate(email)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("invalidated_principals", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for email in session.info.pop("invalidated_principals", ()):
+        principal_cache.invalidate(email)
@@ -0,0 +1,139 @@
+"""
+Выдача коротких кодов (столы, брони) без проверки уникальности по БД.
+
+Код - номер из последовательности, пропущенный через ключевую перестановку
+(сеть Фейстеля на 36 битах с cycle-walking до 32^7) и записанный 7 символами
+алфавита без 0/O/1/I. Перестановка - биекция, поэтому разные номера дают
+разные коды, а соседние номера не дают похожих кодов. Номера процесс берет
+блоками из code_sequences (upsert ... RETURNING в отдельной короткой
+транзакции), так что воркеры не пересекаются и не ждут друг друга.
+Старые 6-символьные коды с новыми не пересекаются по длине.
+"""
+import hashlib
+import os
+import threading
+
+from database import engine
+from models import CodeSequence
+
+ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+CODE_LENGTH = 7
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH  # 2^35
+
+# Ключ перестановки: без него порядок выдачи кодов не восстановить
+SHORT_CODE_KEY = hashlib.sha256(os.getenv("SHORT_CODE_KEY", "thanks-short-codes").encode()).digest()
+SHORT_CODE_BLOCK = int(os.getenv("SHORT_CODE_BLOCK", "100"))
+QR_BASE_URL = os.getenv("QR_BASE_URL", "http://217.11.74.100")
+
+_HALF_BITS = 18
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def _round(value: int, round_no: int, tweak: bytes) -> int:
+    digest = hashlib.blake2b(
+        value.to_bytes(4, "big"), digest_size=4, key=SHORT_CODE_KEY, person=bytes([round_no]) * 16, salt=tweak
+    ).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+
+def permute(number: int, tweak: bytes = b"") -> int:
+    """Ключевая перестановка [0, CODE_SPACE); tweak - своя перестановка для каждого счетчика"""
+    if not 0 <= number < CODE_SPACE:
+        raise ValueError("Short code sequence exhausted")
+    value = number
+    while True:
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_no in range(_ROUNDS):
+            left, right = right, left ^ _round(right, round_no, tweak)
+        value = (left << _HALF_BITS) | right
+        # 2^36 -> 2^35: повторяем, пока не попадем в диапазон (в среднем 2 раза)
+        if value < CODE_SPACE:
+            return value
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return "".join(reversed(chars))
+
+
+def code_for(number: int, tweak: bytes = b"") -> str:
+    return encode(permute(number, tweak))
+
+
+def qr_url(short_code: str) -> str:
+    return f"{QR_BASE_URL}/qr/{short_code}"
+
+
+def table_link(short_code: str) -> str:
+    return f"{QR_BASE_URL}/t/{short_code}"
+
+
+def sequence_insert():
+    """insert() диалекта с on_conflict_do_update - для счетчиков code_sequences"""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Short code sequences are not supported on {dialect}")
+    return insert
+
+
+def reserve_block(name: str, count: int) -> int:
+    """
+    Забрать номера [start, start + count) из code_sequences, вернуть start.
+    Одна команда: INSERT ... ON CONFLICT DO UPDATE ... RETURNING (первая
+    выдача создает счетчик), строка блокируется только на время этой транзакции.
+    """
+    stmt = sequence_insert()(CodeSequence).values(name=name, next_value=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"next_value": CodeSequence.next_value + stmt.excluded.next_value}
+    ).returning(CodeSequence.next_value)
+    with engine.begin() as conn:
+        return conn.execute(stmt).scalar() - count
+
+
+class CodeAllocator:
+    """Коды из заранее взятого блока номеров; новый блок - когда текущий кончился"""
+
+    def __init__(self, name: str, block_size: int = SHORT_CODE_BLOCK, tweak: bytes = b""):
+        self.name = name
+        self.tweak = tweak[:16]
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def allocate(self, count: int = 1) -> list:
+        with self._lock:
+            numbers = []
+            while len(numbers) < count:
+                if self._next == self._end:
+                    size = max(self.block_size, count - len(numbers))
+                    self._next = reserve_block(self.name, size)
+                    self._end = self._next + size
+                take = min(self._end - self._next, count - len(numbers))
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+        return [code_for(number, self.tweak) for number in numbers]
+
+
+_tables = CodeAllocator("tables")
+# У броней своя перестановка: код брони не совпадет с кодом стола с тем же номером
+_reservations = CodeAllocator("reservations", tweak=b"reservations")
+
+
+def allocate_table_codes(count: int = 1) -> list:
+    """count уникальных кодов для столов"""
+    return _tables.allocate(count)
+
+
+def allocate_booking_code() -> str:
+    """Код брони (Reservation.booking_code)"""
+    return _reservations.allocate()[0]
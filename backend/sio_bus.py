@@ -0,0 +1,190 @@
+"""
+Шина сообщений Socket.IO между воркерами и серверами.
+
+SIO_MESSAGE_QUEUE выбирает client manager для websocket.sio:
+  (пусто)          - один процесс, без шины (socketio.AsyncManager)
+  memory://        - шина внутри процесса (тесты: несколько AsyncServer в одном процессе)
+  postgres         - Postgres LISTEN/NOTIFY через DATABASE_URL
+  postgresql://... - Postgres LISTEN/NOTIFY по указанному URL
+  redis://...      - Redis pub/sub (socketio.AsyncRedisManager)
+
+Для всех шин считаются опубликованные/полученные/потерянные сообщения
+и задержка доставки между воркерами.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+SIO_MESSAGE_QUEUE = os.getenv("SIO_MESSAGE_QUEUE", "")
+SIO_CHANNEL = os.getenv("SIO_CHANNEL", "thanks_socketio")
+
+# Предел payload у NOTIFY - 8000 байт
+PG_NOTIFY_MAX_PAYLOAD = 7900
+
+logger = logging.getLogger("sio_bus")
+
+
+class BusStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def inc(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe_latency(self, seconds: float):
+        seconds = max(seconds, 0.0)
+        with self._lock:
+            self.received += 1
+            self.latency_count += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "backend": SIO_MESSAGE_QUEUE.split("://")[0] or "local",
+                "published": self.published,
+                "received": self.received,
+                "dropped": self.dropped,
+                "latency_avg_ms": round(self.latency_total / self.latency_count * 1000, 2) if self.latency_count else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 2)
+            }
+
+
+stats = BusStats()
+
+
+class InstrumentedMixin:
+    """Метки времени на публикацию и учет задержки/потерь для AsyncPubSubManager"""
+
+    async def _publish(self, data):
+        data = dict(data, sent_at=time.time())
+        try:
+            result = await super()._publish(data)
+        except Exception:
+            logger.exception("Socket.IO bus publish failed")
+            result = None
+        # Реализации возвращают None, если сообщение не ушло в шину
+        stats.inc("dropped" if result is None else "published")
+        return result
+
+    async def _handle_emit(self, message):
+        if "sent_at" in message:
+            stats.observe_latency(time.time() - message["sent_at"])
+        await super()._handle_emit(message)
+
+
+class AsyncMemoryManager(AsyncPubSubManager):
+    """Шина в памяти процесса: все менеджеры с одним каналом видят сообщения друг друга"""
+    name = "memory"
+    _channels = {}  # channel -> set(asyncio.Queue)
+
+    def __init__(self, url="memory://", channel=SIO_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = asyncio.Queue()
+        self._channels.setdefault(channel, set()).add(self.queue)
+
+    async def _publish(self, data):
+        for queue in self._channels.get(self.channel, ()):
+            if queue is not self.queue:
+                queue.put_nowait(data)
+        return True
+
+    async def _listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """Шина через Postgres LISTEN/NOTIFY (asyncpg)"""
+    name = "postgres"
+
+    def __init__(self, url, channel=SIO_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.dsn = url.replace("postgresql+asyncpg://", "postgresql://").replace("postgresql+psycopg2://", "postgresql://")
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+
+    async def _connect(self):
+        import asyncpg
+        return await asyncpg.connect(self.dsn)
+
+    async def _publish(self, data):
+        payload = json.dumps(data, default=str, separators=(",", ":"))
+        if len(payload.encode("utf-8")) > PG_NOTIFY_MAX_PAYLOAD:
+            logger.error("Socket.IO message too large for NOTIFY (%d bytes), dropped", len(payload))
+            return None
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.is_closed():
+                        self._publish_conn = await self._connect()
+                    await self._publish_conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                    return True
+                except Exception:
+                    logger.exception("Cannot publish to postgres (attempt %d)", attempt + 1)
+                    self._publish_conn = None
+        return None
+
+    async def _listen(self):
+        queue = asyncio.Queue()
+        while True:
+            conn = None
+            try:
+                conn = await self._connect()
+                await conn.add_listener(self.channel, lambda *args: queue.put_nowait(args[-1]))
+                while not conn.is_closed():
+                    try:
+                        yield await asyncio.wait_for(queue.get(), timeout=5)
+                    except asyncio.TimeoutError:
+                        # Проверка, что соединение живо
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Postgres LISTEN connection lost, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+
+class InstrumentedMemoryManager(InstrumentedMixin, AsyncMemoryManager):
+    pass
+
+
+class InstrumentedPostgresManager(InstrumentedMixin, AsyncPostgresManager):
+    pass
+
+
+class InstrumentedRedisManager(InstrumentedMixin, socketio.AsyncRedisManager):
+    pass
+
+
+def create_client_manager(url: str = SIO_MESSAGE_QUEUE, write_only: bool = False):
+    """Client manager для AsyncServer по SIO_MESSAGE_QUEUE (None - без шины)"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InstrumentedMemoryManager(url, write_only=write_only)
+    if url == "postgres":
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    if url.startswith("postgres"):
+        return InstrumentedPostgresManager(url, write_only=write_only)
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return InstrumentedRedisManager(url, channel=SIO_CHANNEL, write_only=write_only)
+    raise ValueError(f"Unsupported SIO_MESSAGE_QUEUE: {url}")
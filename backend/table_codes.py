@@ -0,0 +1,223 @@
+"""
+Разрешение коротких кодов столов (/qr/{code}, /t/{code}) из памяти процесса.
+
+Карта short_code -> TableLocation (стол, зал, заведение, номер, вместимость)
+загружается при старте пачками и поддерживается create_table,
+generate_table_link и delete_table, поэтому скан QR обычно не ходит в БД.
+Промах (стол создан в другом воркере) - один запрос по индексу short_code,
+результат кладется в карту. Как и в menu_cache, запись живет не дольше TTL:
+это страховка для нескольких воркеров (удаление стола или новая ссылка
+в соседнем процессе).
+"""
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Hall, Restaurant, Table
+
+TABLE_CODES_TTL = int(os.getenv("TABLE_CODES_TTL", "300"))
+TABLE_CODES_WARM_BATCH = int(os.getenv("TABLE_CODES_WARM_BATCH", "5000"))
+
+
+class TableLocation(NamedTuple):
+    table_id: int
+    hall_id: int
+    restaurant_id: int
+    table_number: str
+    capacity: int
+    loaded_at: float
+
+
+class TableCodesStats:
+    """Попадания/промахи карты и число загруженных кодов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_found = 0
+        self.warmed = 0
+
+    def count(self, field: str, value: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(_codes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_found": self.not_found,
+                "warmed": self.warmed,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+stats = TableCodesStats()
+
+_lock = threading.Lock()
+_codes = {}  # short_code -> TableLocation
+_table_codes = {}  # table_id -> short_code
+_payloads = {}  # short_code -> (время сборки, ответ /qr)
+
+
+def _put(short_code: str, location: TableLocation):
+    """Запись в карту (под _lock); старый код стола и его ответ /qr удаляются"""
+    previous = _table_codes.get(location.table_id)
+    if previous and previous != short_code:
+        _codes.pop(previous, None)
+        _payloads.pop(previous, None)
+    _codes[short_code] = location
+    _table_codes[location.table_id] = short_code
+
+
+def location_of(table: Table):
+    """(short_code, TableLocation) из загруженного стола"""
+    return table.short_code, TableLocation(
+        table.id, table.hall_id, table.restaurant_id, table.table_number, table.capacity, time.monotonic()
+    )
+
+
+def remember_all(entries):
+    """Положить в карту пары из location_of (собрать до commit, положить после)"""
+    with _lock:
+        for short_code, location in entries:
+            if short_code:
+                _put(short_code, location)
+
+
+def remember(table: Table):
+    """Положить стол в карту (после commit: нужны id и restaurant_id)"""
+    remember_all([location_of(table)])
+
+
+def forget(table_id: int):
+    """Убрать стол из карты (удаление стола)"""
+    with _lock:
+        short_code = _table_codes.pop(table_id, None)
+        if short_code:
+            _codes.pop(short_code, None)
+            _payloads.pop(short_code, None)
+
+
+def forget_payloads(restaurant_id: int = None, table_id: int = None):
+    """Сбросить готовые ответы /qr (изменились заведение или стол), карта кодов остается"""
+    with _lock:
+        if table_id is not None:
+            short_code = _table_codes.get(table_id)
+            if short_code:
+                _payloads.pop(short_code, None)
+        if restaurant_id is not None:
+            for short_code in [code for code, (_, payload) in _payloads.items()
+                               if payload["restaurant"]["id"] == restaurant_id]:
+                _payloads.pop(short_code, None)
+
+
+def _fresh(location: Optional[TableLocation]) -> bool:
+    return location is not None and time.monotonic() - location.loaded_at < TABLE_CODES_TTL
+
+
+def _lookup(short_code: str) -> Optional[TableLocation]:
+    location = _codes.get(short_code)
+    return location if _fresh(location) else None
+
+
+def lookup(short_code: str) -> Optional[TableLocation]:
+    """Код из памяти без обращения к БД или None (промах считает resolve)"""
+    location = _lookup(short_code)
+    if location:
+        stats.count("hits")
+    return location
+
+
+def resolve(db: Session, short_code: str) -> Optional[TableLocation]:
+    """TableLocation по коду: из карты, при промахе - один запрос по индексу"""
+    location = _lookup(short_code)
+    if location:
+        stats.count("hits")
+        return location
+
+    stats.count("misses")
+    row = db.query(
+        Table.id, Table.hall_id, Table.restaurant_id, Table.table_number, Table.capacity
+    ).filter(Table.short_code == short_code, Table.is_active == True).first()
+    if row is None:
+        stats.count("not_found")
+        with _lock:
+            stale = _codes.pop(short_code, None)
+            if stale and _table_codes.get(stale.table_id) == short_code:
+                _table_codes.pop(stale.table_id, None)
+            _payloads.pop(short_code, None)
+        return None
+
+    location = TableLocation(*row, time.monotonic())
+    with _lock:
+        _put(short_code, location)
+    return location
+
+
+def get_payload(short_code: str):
+    """Готовый ответ /qr из памяти или None"""
+    location = _lookup(short_code)
+    cached = _payloads.get(short_code)
+    if location and cached and time.monotonic() - cached[0] < TABLE_CODES_TTL:
+        stats.count("hits")
+        return cached[1]
+    return None
+
+
+def build_payload(db: Session, short_code: str, table_schema, hall_schema, restaurant_schema):
+    """Ответ /qr (стол, зал, заведение) одним запросом по первичным ключам"""
+    location = resolve(db, short_code)
+    if location is None:
+        return None
+    row = db.query(Table, Hall, Restaurant).join(
+        Hall, Hall.id == Table.hall_id
+    ).join(
+        Restaurant, Restaurant.id == Hall.restaurant_id
+    ).filter(Table.id == location.table_id).first()
+    if row is None:
+        forget(location.table_id)
+        return None
+
+    table, hall, restaurant = row
+    payload = {
+        "table": table_schema.model_validate(table).model_dump(mode="json"),
+        "hall": hall_schema.model_validate(hall).model_dump(mode="json"),
+        "restaurant": restaurant_schema.model_validate(restaurant).model_dump(mode="json")
+    }
+    with _lock:
+        if _table_codes.get(location.table_id) == short_code:
+            _payloads[short_code] = (time.monotonic(), payload)
+    return payload
+
+
+def warm(db: Session, restaurant_id: int = None, batch_size: int = TABLE_CODES_WARM_BATCH) -> int:
+    """
+    Загрузить коды всех активных столов (или одного заведения) пачками
+    по batch_size: keyset по Table.id, только нужные колонки, без ORM-объектов.
+    """
+    loaded = 0
+    last_id = 0
+    while True:
+        query = db.query(
+            Table.id, Table.hall_id, Table.restaurant_id, Table.table_number, Table.capacity, Table.short_code
+        ).filter(Table.id > last_id, Table.is_active == True, Table.short_code.isnot(None))
+        if restaurant_id is not None:
+            query = query.filter(Table.restaurant_id == restaurant_id)
+        rows = query.order_by(Table.id).limit(batch_size).all()
+        if not rows:
+            break
+        now = time.monotonic()
+        with _lock:
+            for *columns, short_code in rows:
+                _put(short_code, TableLocation(*columns, now))
+        loaded += len(rows)
+        last_id = rows[-1][0]
+    stats.count("warmed", loaded)
+    return loaded
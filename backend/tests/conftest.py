@@ -0,0 +1,31 @@
+"""
+Тесты backend: pytest из каталога backend (python -m pytest tests).
+
+Модули backend импортируются как в uvicorn - по имени из каталога backend.
+БД - SQLite в памяти на тест; DATABASE_URL нужен только импорту database.py
+(соединение при импорте не открывается).
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from models import Base  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
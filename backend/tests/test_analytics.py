@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import analytics
+from models import AnalyticsDelta, Order, OrderStatus, Restaurant
+
+
+def _order(db):
+    restaurant = Restaurant(name="R", slug="r")
+    db.add(restaurant)
+    db.flush()
+    order = Order(restaurant_id=restaurant.id, status=OrderStatus.PENDING, total_amount=1000, created_at=datetime.utcnow())
+    db.add(order)
+    analytics.record_order_created(db, restaurant.id)
+    db.commit()
+    return restaurant, order
+
+
+def _set_status(db, order, status):
+    old_status = order.status
+    order.status = status
+    order.updated_at = datetime.utcnow()
+    analytics.record_status_change(db, order, old_status)
+    db.commit()
+
+
+def test_rollups_wait_for_apply_and_apply_once(db):
+    restaurant, order = _order(db)
+    assert analytics.summary(db, restaurant.id)["total_orders"] == 0
+
+    assert analytics.apply_pending(db) == 1
+    assert analytics.apply_pending(db) == 0
+    assert db.query(AnalyticsDelta).count() == 0
+    assert analytics.summary(db, restaurant.id)["total_orders"] == 1
+
+
+def test_paying_completed_order_takes_back_completion(db):
+    restaurant, order = _order(db)
+    _set_status(db, order, OrderStatus.COMPLETED)
+
+    # Как pay_order: оплата возвращает заказ в ACCEPTED
+    old_status = order.status
+    order.is_paid = True
+    order.status = OrderStatus.ACCEPTED
+    order.paid_at = order.updated_at = datetime.utcnow()
+    analytics.record_order_paid(db, order)
+    analytics.record_status_change(db, order, old_status)
+    db.commit()
+    analytics.apply_pending(db)
+
+    totals = analytics.summary(db, restaurant.id)
+    assert totals["paid_orders"] == 1
+    assert totals["orders_by_status"] == {"completed": 0, "cancelled": 0, "pending": 1}
+
+    analytics.rebuild(db, restaurant.id)
+    assert analytics.summary(db, restaurant.id) == totals
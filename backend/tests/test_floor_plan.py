@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import update
+
+import floor_plan
+from models import Hall, Restaurant, Table, TableStatus
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # Кеш и история версий - память процесса, у каждого теста своя
+    monkeypatch.setattr(floor_plan, "_cache", {})
+    monkeypatch.setattr(floor_plan, "_history", {})
+    monkeypatch.setattr(floor_plan, "FLOOR_PLAN_TTL", 0)
+
+
+def _plan(db):
+    restaurant = Restaurant(name="R", slug="r")
+    db.add(restaurant)
+    db.flush()
+    hall = Hall(restaurant_id=restaurant.id, name="Зал")
+    db.add(hall)
+    db.flush()
+    tables = [
+        Table(hall_id=hall.id, restaurant_id=restaurant.id, table_number=str(number), qr_code=f"qr{number}",
+              short_code=f"c{number}")
+        for number in (1, 2)
+    ]
+    db.add_all(tables)
+    db.commit()
+    return restaurant, tables
+
+
+def _change_elsewhere(db, table_id, status):
+    """Изменение мимо слушателей сессии этого процесса - как из другого воркера"""
+    db.execute(update(Table).where(Table.id == table_id).values(status=status))
+    db.commit()
+
+
+def test_version_follows_content_not_local_commits(db):
+    restaurant, tables = _plan(db)
+    version, _, _ = floor_plan.get_snapshot(db, restaurant.id)
+    assert floor_plan.get_snapshot(db, restaurant.id)[0] == version
+
+    _change_elsewhere(db, tables[0].id, TableStatus.OCCUPIED)
+    changed, snapshot, _ = floor_plan.get_snapshot(db, restaurant.id)
+    assert changed != version
+    assert snapshot["version"] == changed
+
+    _change_elsewhere(db, tables[0].id, TableStatus.AVAILABLE)
+    assert floor_plan.get_snapshot(db, restaurant.id)[0] == version
+
+
+def test_delta_after_rebuild_contains_tables_changed_elsewhere(db):
+    restaurant, tables = _plan(db)
+    version, _, _ = floor_plan.get_snapshot(db, restaurant.id)
+
+    _change_elsewhere(db, tables[1].id, TableStatus.OUT_OF_SERVICE)
+    delta = floor_plan.get_delta(db, restaurant.id, version)
+
+    assert delta["version"] != version
+    assert [(table["id"], table["status"]) for table in delta["tables"]] == [(tables[1].id, "out_of_service")]
+    assert floor_plan.get_delta(db, restaurant.id, delta["version"])["tables"] == []
+    assert floor_plan.get_delta(db, restaurant.id, "unknown") is None
+
+
+def test_structure_change_needs_full_snapshot(db):
+    restaurant, tables = _plan(db)
+    version, _, _ = floor_plan.get_snapshot(db, restaurant.id)
+
+    db.execute(update(Table).where(Table.id == tables[0].id).values(capacity=8))
+    db.commit()
+
+    assert floor_plan.get_delta(db, restaurant.id, version) is None
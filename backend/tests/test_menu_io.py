@@ -0,0 +1,65 @@
+import io
+
+import menu_io
+from main import DishImportRow
+from models import Category, Dish, Restaurant
+
+
+def _restaurant(db):
+    restaurant = Restaurant(name="R", slug="r")
+    db.add(restaurant)
+    db.flush()
+    category = Category(
+        restaurant_id=restaurant.id, name="ReviewCat", name_kz="Санат", description="Описание",
+        sort_order=3, is_active=False
+    )
+    db.add(category)
+    db.flush()
+    dish = Dish(
+        category_id=category.id, name="ReviewDish", name_kz="Тағам", description="Блюдо", price=1000,
+        cooking_time=40, image_url="https://example.com/d.png", sort_order=7, is_available=False
+    )
+    db.add(dish)
+    db.commit()
+    return restaurant, category, dish
+
+
+def _import(db, restaurant_id, text, dry_run=False):
+    return menu_io.import_menu(db, restaurant_id, io.BytesIO(text.encode()), "csv", DishImportRow, dry_run)
+
+
+def test_price_only_csv_changes_only_price(db):
+    restaurant, category, dish = _restaurant(db)
+
+    result = _import(db, restaurant.id, "category,name,price\nReviewCat,ReviewDish,1200\n")
+
+    assert result["dishes"] == {"create": 0, "update": 1, "unchanged": 0}
+    assert result["categories"] == {"create": 0, "update": 0, "unchanged": 1}
+    db.expire_all()
+    dish = db.get(Dish, dish.id)
+    assert dish.price == 1200
+    assert (dish.name_kz, dish.description, dish.cooking_time, dish.image_url, dish.sort_order, dish.is_available) == (
+        "Тағам", "Блюдо", 40, "https://example.com/d.png", 7, False
+    )
+    category = db.get(Category, category.id)
+    assert (category.name_kz, category.description, category.sort_order, category.is_active) == (
+        "Санат", "Описание", 3, False
+    )
+
+
+def test_supplied_columns_update_and_new_rows_get_defaults(db):
+    restaurant, category, dish = _restaurant(db)
+
+    _import(db, restaurant.id, (
+        "category,category_description,name,price,cooking_time,is_available\n"
+        "ReviewCat,Новое,ReviewDish,1000,25,true\n"
+        "NewCat,,NewDish,500,,\n"
+    ))
+
+    db.expire_all()
+    dish = db.get(Dish, dish.id)
+    assert (dish.cooking_time, dish.is_available, dish.sort_order, dish.name_kz) == (25, True, 7, "Тағам")
+    assert db.get(Category, category.id).description == "Новое"
+    new_dish = db.query(Dish).filter(Dish.name == "NewDish").one()
+    assert (new_dish.cooking_time, new_dish.is_available, new_dish.sort_order) == (15, True, 0)
+    assert db.query(Category).filter(Category.name == "NewCat").one().is_active is True
@@ -0,0 +1,25 @@
+import outbox
+from models import OutboxEvent, Restaurant
+
+
+def _event(db, restaurant_id, event_id):
+    db.add(OutboxEvent(id=event_id, restaurant_id=restaurant_id, event="order_created", rooms=[], payload={}))
+    db.commit()
+
+
+def test_seq_follows_commit_order_not_insert_id(db):
+    restaurant = Restaurant(name="R", slug="r")
+    db.add(restaurant)
+    db.commit()
+
+    _event(db, restaurant.id, 10)
+    assert outbox.events_since(db, 0, 100, restaurant_id=restaurant.id) == []  # Еще без seq
+    first = outbox._claim_batch(db, 100)
+    cursor = outbox.events_since(db, 0, 100, restaurant_id=restaurant.id)[-1]["seq"]
+
+    # Транзакция, получившая id раньше, зафиксировалась после выдачи seq
+    _event(db, restaurant.id, 5)
+    second = outbox._claim_batch(db, 100)
+
+    assert [(event_id, seq) for event_id, seq, *_ in first + second] == [(10, 1), (5, 2)]
+    assert [event["seq"] for event in outbox.events_since(db, cursor, 100, restaurant_id=restaurant.id)] == [2]
@@ -0,0 +1,18 @@
+import xml.etree.ElementTree as ET
+
+import qr_render
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def test_svg_label_is_inside_viewbox():
+    job = qr_render.QRJob("https://example.com/t/ABCDEFG", "Стол 12", "svg", 300)
+    root = ET.fromstring(qr_render._render_svg(job))
+
+    _, _, width, height = (float(value) for value in root.get("viewBox").split())
+    assert root.get("height") == f"{height:g}mm"
+    text = root.find(f"{SVG}text")
+    assert text.text == "Стол 12"
+    x, y, font_size = (float(text.get(name)) for name in ("x", "y", "font-size"))
+    assert 0 < x < width
+    assert font_size <= y <= height
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from sqlalchemy.exc import OperationalError
+
+import replicas
+
+
+class DriverError(Exception):
+    def __init__(self, message, pgcode=None):
+        super().__init__(message)
+        self.pgcode = pgcode
+
+
+def _fail(replica, pgcode, is_disconnect=False):
+    orig = DriverError("error", pgcode)
+    replica._on_error(SimpleNamespace(
+        is_disconnect=is_disconnect,
+        sqlalchemy_exception=OperationalError("SELECT 1", {}, orig),
+        original_exception=orig
+    ))
+
+
+def test_statement_timeout_keeps_replica_in_rotation():
+    replica = replicas.Replica("replica-test", "sqlite://")
+    _fail(replica, "57014")
+    _fail(replica, "40P01")  # deadlock - ошибка запроса, не соединения
+    assert replica.healthy
+
+
+def test_connection_errors_take_replica_down():
+    for pgcode, is_disconnect in ((None, False), ("08006", False), ("57P01", False), ("57014", True)):
+        replica = replicas.Replica("replica-test", "sqlite://")
+        _fail(replica, pgcode, is_disconnect)
+        assert not replica.healthy, pgcode
@@ -0,0 +1,49 @@
+import os
+import threading
+
+import numpy as np
+
+import reports
+
+
+def _columns(value):
+    orders = {name: np.full(3, value, dtype=np.int64) for name in reports.ORDER_COLUMNS}
+    items = {name: np.full(5, value, dtype=np.int64) for name in reports.ITEM_COLUMNS}
+    return orders, items
+
+
+def test_concurrent_saves_leave_one_whole_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORTS_VERSION_GRACE", 0)
+    path = str(tmp_path / "1")
+    errors = []
+
+    def save(value):
+        try:
+            for _ in range(5):
+                reports.save_snapshot(path, *_columns(value), {"value": value})
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=save, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    snapshot = reports.load_snapshot(path)
+    value = snapshot.meta["value"]
+    assert all((column == value).all() for column in list(snapshot.orders.values()) + list(snapshot.items.values()))
+
+
+def test_old_directory_snapshot_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORTS_VERSION_GRACE", 0)
+    path = tmp_path / "1"
+    path.mkdir()
+    (path / "meta.json").write_text("{}")
+
+    reports.save_snapshot(str(path), *_columns(7), {"value": 7})
+
+    assert os.path.islink(path)
+    assert reports.load_snapshot(str(path)).meta == {"value": 7}
+    assert set(os.listdir(tmp_path)) == {"1", os.readlink(path)}  # Старый каталог удален
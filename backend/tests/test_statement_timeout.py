@@ -0,0 +1,34 @@
+import asyncio
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+from starlette.requests import Request
+
+import main
+
+
+class QueryCanceled(Exception):
+    """Как ошибка asyncpg в адаптере SQLAlchemy: только sqlstate"""
+    sqlstate = "57014"
+
+
+class Psycopg2QueryCanceled(Exception):
+    pgcode = "57014"
+
+
+def _handle(exc):
+    request = Request({"type": "http", "method": "GET", "path": "/menu", "headers": [], "query_string": b""})
+    handler = main.app.exception_handlers[DBAPIError]
+    return asyncio.run(handler(request, exc))
+
+
+def test_statement_timeout_is_503_for_both_drivers():
+    for exc in (
+        DBAPIError("SELECT 1", {}, QueryCanceled("canceling statement due to statement timeout")),
+        OperationalError("SELECT 1", {}, Psycopg2QueryCanceled("canceling statement due to statement timeout")),
+    ):
+        assert _handle(exc).status_code == 503
+
+
+def test_other_database_errors_are_500():
+    response = _handle(OperationalError("SELECT 1", {}, Exception("server closed the connection")))
+    assert response.status_code == 500
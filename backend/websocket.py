@@ -1,69 +1,159 @@
+import time
+
 import socketio
-from typing import Set
+from fastapi import HTTPException
+
+import metrics
+from database import run_in_session
+from models import Table
+from rooms import (  # noqa: F401  (имена комнат - и для импортирующих websocket)
+    STAFF_ROLES, restaurant_room, hall_room, table_room, user_room, principal_rooms, staff_rooms, guest_rooms
+)
+from security import decode_token, principal_cache, load_principal, check_principal
+from sio_bus import create_client_manager
 
-# Создание Socket.IO сервера
+# Создание Socket.IO сервера (шина между воркерами - SIO_MESSAGE_QUEUE, см. sio_bus.py)
 sio = socketio.AsyncServer(
     async_mode='asgi',
-    cors_allowed_origins='*'
+    cors_allowed_origins='*',
+    client_manager=create_client_manager()
 )
 
-# Хранилище подключенных клиентов по ролям
-connected_clients = {
-    'waiters': set(),
-    'admins': set(),
-    'users': set()
-}
+
+async def emit_to_rooms(event, data, rooms):
+    """Один emit на объединение комнат (сокет из нескольких комнат получит событие один раз)"""
+    if rooms:
+        started = time.perf_counter()
+        await sio.emit(event, data, room=rooms)
+        metrics.sio_emit_latency.labels(event).observe(time.perf_counter() - started)
+
+
+def _resolve_table(db, short_code):
+    row = db.query(Table.id, Table.hall_id, Table.restaurant_id).filter(
+        Table.short_code == short_code
+    ).first()
+    if row is None:
+        return None
+    return {'table_id': row[0], 'hall_id': row[1], 'restaurant_id': row[2]}
+
+
+async def authenticate(data):
+    """Principal по JWT (тот же токен, что и для HTTP API) или None"""
+    token = (data or {}).get('token')
+    if not token:
+        return None
+    try:
+        payload = decode_token(token)
+        principal = principal_cache.get(payload['sub'])
+        if principal is None:
+            principal = await run_in_session(load_principal, payload['sub'])
+        return check_principal(principal, payload)
+    except HTTPException:
+        return None
+
+
+async def _join(sid, data):
+    session = await sio.get_session(sid)
+    rooms = []
+
+    principal = await authenticate(data)
+    if principal is not None:
+        session['principal'] = principal
+        rooms += principal_rooms(principal)
+
+    # Гость подтверждает стол кодом из QR
+    short_code = (data or {}).get('short_code')
+    if short_code:
+        table = await run_in_session(_resolve_table, short_code)
+        if table is not None:
+            session['table'] = table
+            rooms.append(table_room(table['table_id']))
+
+    joined = session.setdefault('rooms', [])
+    for room in rooms:
+        await sio.enter_room(sid, room)
+        if room not in joined:
+            joined.append(room)
+            metrics.room_joined(room)
+    await sio.save_session(sid, session)
+    return rooms
+
 
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     print(f"Client connected: {sid}")
+    metrics.sio_clients.inc()
+    # socket.io-client может передать {token, short_code} сразу в auth
+    if auth:
+        await _join(sid, auth)
+
 
 @sio.event
 async def disconnect(sid):
     print(f"Client disconnected: {sid}")
-    # Удалить из всех групп
-    for group in connected_clients.values():
-        group.discard(sid)
+    metrics.sio_clients.dec()
+    # Комнаты сокета Socket.IO очищает сам, метрикам - вычесть
+    for room in (await sio.get_session(sid)).get('rooms', []):
+        metrics.room_left(room)
+
 
 @sio.event
 async def join_room(sid, data):
-    """Клиент присоединяется к комнате по роли"""
-    role = data.get('role', 'users')
-    if role in connected_clients:
-        connected_clients[role].add(sid)
-        await sio.emit('joined', {'role': role}, room=sid)
+    """Клиент присоединяется к своим комнатам по JWT и/или коду стола"""
+    rooms = await _join(sid, data)
+    if not rooms:
+        await sio.emit('join_error', {'detail': 'Could not validate credentials'}, room=sid)
+        return
+    await sio.emit('joined', {'rooms': rooms}, room=sid)
+
+
+async def _staff_principal(sid):
+    principal = (await sio.get_session(sid)).get('principal')
+    if principal is None or principal.role not in STAFF_ROLES or not principal.restaurant_id:
+        return None
+    return principal
+
 
 @sio.event
 async def new_order(sid, data):
-    """Уведомление о новом заказе официантам"""
-    for waiter_sid in connected_clients['waiters']:
-        await sio.emit('order_created', data, room=waiter_sid)
+    """Уведомление о новом заказе официантам (от персонала заведения)"""
+    principal = await _staff_principal(sid)
+    if principal is None:
+        return
+    data = dict(data or {}, restaurant_id=principal.restaurant_id)
+    await emit_to_rooms('order_created', data, staff_rooms(data))
+
 
 @sio.event
 async def order_status_changed(sid, data):
-    """Уведомление об изменении статуса заказа"""
-    # Отправить пользователю
-    for user_sid in connected_clients['users']:
-        await sio.emit('order_updated', data, room=user_sid)
-    
-    # Отправить официантам
-    for waiter_sid in connected_clients['waiters']:
-        await sio.emit('order_updated', data, room=waiter_sid)
+    """Уведомление об изменении статуса заказа (от персонала заведения)"""
+    principal = await _staff_principal(sid)
+    if principal is None:
+        return
+    data = dict(data or {}, restaurant_id=principal.restaurant_id)
+    await emit_to_rooms('order_updated', data, staff_rooms(data) + guest_rooms(data))
+
 
 @sio.event
 async def waiter_called(sid, data):
-    """Уведомление о вызове официанта"""
-    for waiter_sid in connected_clients['waiters']:
-        await sio.emit('call_received', data, room=waiter_sid)
+    """Уведомление о вызове официанта (от гостя, подтвердившего стол)"""
+    table = (await sio.get_session(sid)).get('table')
+    if table is None:
+        return
+    data = dict(data or {}, **table)
+    await emit_to_rooms('call_received', data, staff_rooms(data))
+
 
 async def notify_new_order(order_data):
     """Функция для уведомления о новом заказе"""
-    for waiter_sid in connected_clients['waiters']:
-        await sio.emit('order_created', order_data, room=waiter_sid)
+    await emit_to_rooms('order_created', order_data, staff_rooms(order_data))
+
 
 async def notify_status_change(order_data):
     """Функция для уведомления об изменении статуса"""
-    for user_sid in connected_clients['users']:
-        await sio.emit('order_updated', order_data, room=user_sid)
-    for waiter_sid in connected_clients['waiters']:
-        await sio.emit('order_updated', order_data, room=waiter_sid)
+    await emit_to_rooms('order_updated', order_data, staff_rooms(order_data) + guest_rooms(order_data))
+
+
+async def notify_waiter_called(call_data):
+    """Функция для уведомления о вызове официанта"""
+    await emit_to_rooms('call_received', call_data, staff_rooms(call_data))
@@ -6,7 +6,7 @@ export function useSocket(url = 'http://217.11.74.100:8000') {
   const [connected, setConnected] = useState(false)
 
   useEffect(() => {
-    const user = JSON.parse(localStorage.getItem('user') || '{}')
+    const token = localStorage.getItem('token')
     const newSocket = io(url, {
       transports: ['websocket', 'polling']
     })
@@ -15,8 +15,9 @@ export function useSocket(url = 'http://217.11.74.100:8000') {
       console.log('WebSocket connected')
       setConnected(true)
       
-      if (user.role) {
-        newSocket.emit('join_room', { role: user.role })
+      // Комнаты сервер определяет сам по JWT
+      if (token) {
+        newSocket.emit('join_room', { token })
       }
     })
 
@@ -1,30 +1,55 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useParams } from 'react-router-dom'
 import axios from 'axios'
 import AdminHeader from '../../components/AdminHeader'
 
+const TABLE_STATUSES = {
+  available: 'Свободен',
+  reserved: 'Забронирован',
+  occupied: 'Занят',
+  held: 'Удерживается',
+  out_of_service: 'Не обслуживается'
+}
+
+const PLAN_POLL_MS = 15000
+
 export default function Halls() {
   const { restaurantId } = useParams()
   const [halls, setHalls] = useState([])
-  const [tables, setTables] = useState([])
   const [selectedHall, setSelectedHall] = useState(null)
   const [loading, setLoading] = useState(true)
+  const versionRef = useRef(null)
 
   useEffect(() => {
-    fetchHalls()
+    versionRef.current = null
+    fetchPlan()
+    const timer = setInterval(fetchPlan, PLAN_POLL_MS)
+    return () => clearInterval(timer)
   }, [restaurantId])
 
-  const fetchHalls = async () => {
+  // План заведения одним запросом; при опросе - только изменившиеся столы
+  const fetchPlan = async () => {
     try {
       const token = localStorage.getItem('token')
-      const response = await axios.get(`/api/restaurants/${restaurantId}/halls`, {
+      const response = await axios.get(`/api/restaurants/${restaurantId}/floor-plan`, {
+        params: versionRef.current ? { since: versionRef.current } : {},
         headers: { Authorization: `Bearer ${token}` }
       })
-      setHalls(response.data)
-      if (response.data.length > 0) {
-        setSelectedHall(response.data[0].id)
-        fetchTables(response.data[0].id)
+      const data = response.data
+      versionRef.current = data.version
+      if (data.delta) {
+        if (data.tables.length === 0) return
+        const changed = Object.fromEntries(data.tables.map(t => [t.id, t]))
+        setHalls(prev => prev.map(hall => ({
+          ...hall,
+          tables: hall.tables.map(t => (changed[t.id] ? { ...t, ...changed[t.id] } : t))
+        })))
+        return
       }
+      setHalls(data.halls)
+      setSelectedHall(prev => (
+        prev && data.halls.some(hall => hall.id === prev) ? prev : data.halls[0]?.id ?? null
+      ))
     } catch (err) {
       console.error('Error:', err)
     } finally {
@@ -32,17 +57,7 @@ export default function Halls() {
     }
   }
 
-  const fetchTables = async (hallId) => {
-    try {
-      const token = localStorage.getItem('token')
-      const response = await axios.get(`/api/halls/${hallId}/tables`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-      setTables(response.data)
-    } catch (err) {
-      console.error('Error:', err)
-    }
-  }
+  const tables = halls.find(hall => hall.id === selectedHall)?.tables || []
 
   const copyLink = (shortCode) => {
     const link = `http://217.11.74.100/t/${shortCode}`
@@ -72,9 +87,7 @@ export default function Halls() {
           <select
             value={selectedHall || ''}
             onChange={(e) => {
-              const hallId = Number(e.target.value)
-              setSelectedHall(hallId)
-              fetchTables(hallId)
+              setSelectedHall(Number(e.target.value))
             }}
             className="w-full px-4 py-2 border rounded-lg"
           >
@@ -92,6 +105,16 @@ export default function Halls() {
                 <div>
                   <h3 className="text-xl font-bold">Стол #{table.table_number}</h3>
                   <p className="text-sm text-gray-600">Мест: {table.capacity}</p>
+                  <p className="text-sm text-gray-600">
+                    {TABLE_STATUSES[table.status] || table.status}
+                    {table.active_order_id && ` · заказ #${table.active_order_id}`}
+                  </p>
+                  {table.next_reservation && (
+                    <p className="text-xs text-gray-500">
+                      Бронь {new Date(table.next_reservation.time).toLocaleTimeString('ru-RU', { hour: '2-digit', minute: '2-digit' })}
+                      {' '}· {table.next_reservation.guest_name} ({table.next_reservation.guest_count})
+                    </p>
+                  )}
                 </div>
                 {table.short_code && (
                   <span className="px-2 py-1 bg-green-100 text-green-800 rounded text-xs">
@@ -189,10 +189,31 @@ export default function QRGenerator() {
     showNotification(`Сгенерировано ${selectedTables.length} ссылок`)
   }
 
-  const downloadAllQR = async () => {
-    for (const table of tables.filter(t => t.short_code && selectedTables.includes(t.id))) {
-      await downloadQR(table.short_code, table.table_number)
-      await new Promise(resolve => setTimeout(resolve, 500)) // Задержка между скачиваниями
+  // Все QR зала (или выбранных столов) одним файлом: ZIP с PNG или PDF для печати
+  const downloadAllQR = async (format = 'png', onlySelected = false) => {
+    try {
+      const token = localStorage.getItem('token')
+      const params = { hall_id: selectedHall, format }
+      if (onlySelected) {
+        params.table_ids = selectedTables.join(',')
+      }
+      const response = await axios.get(`/api/restaurants/${restaurantId}/qr-codes`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params,
+        responseType: 'blob'
+      })
+      const url = window.URL.createObjectURL(response.data)
+      const a = document.createElement('a')
+      a.href = url
+      a.download = `QR_hall_${selectedHall}.${format === 'pdf' ? 'pdf' : 'zip'}`
+      document.body.appendChild(a)
+      a.click()
+      window.URL.revokeObjectURL(url)
+      document.body.removeChild(a)
+      showNotification('QR-коды скачаны!')
+    } catch (error) {
+      console.error('Error downloading QR:', error)
+      alert('Ошибка скачивания QR-кодов')
     }
   }
 
@@ -253,13 +274,29 @@ export default function QRGenerator() {
                   Генерировать ({selectedTables.length})
                 </button>
                 <button
-                  onClick={downloadAllQR}
+                  onClick={() => downloadAllQR('png', true)}
                   className="btn-outline-gold"
                 >
                   Скачать QR ({selectedTables.length})
                 </button>
               </>
             )}
+            {tables.some(t => t.short_code) && (
+              <>
+                <button
+                  onClick={() => downloadAllQR('png')}
+                  className="btn-glass"
+                >
+                  ZIP зала
+                </button>
+                <button
+                  onClick={() => downloadAllQR('pdf')}
+                  className="btn-glass"
+                >
+                  PDF для печати
+                </button>
+              </>
+            )}
           </div>
         </div>
 
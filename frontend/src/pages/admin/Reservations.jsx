@@ -23,20 +23,34 @@ export default function Reservations() {
   const [showForm, setShowForm] = useState(false)
   const [loading, setLoading] = useState(true)
   const [filter, setFilter] = useState('all') // all, today, upcoming
+  const [cursor, setCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     fetchReservations()
-    fetchTables()
-    fetchZones()
-  }, [restaurantId])
+  }, [restaurantId, filter])
 
+  // Фильтр - на сервере: today/upcoming - диапазон дат, страницы по курсору
+  const filterParams = () => {
+    const today = new Date()
+    const day = `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, '0')}-${String(today.getDate()).padStart(2, '0')}`
+    if (filter === 'today') return { date_from: day, date_to: day, order: 'asc' }
+    if (filter === 'upcoming') return { date_from: day, order: 'asc' }
+    return {}
+  }
+
+  // Первая страница вместе со столами и зонами - один запрос
   const fetchReservations = async () => {
     try {
       const token = localStorage.getItem('token')
       const response = await axios.get(`/api/restaurants/${restaurantId}/reservations`, {
+        params: { ...filterParams(), embed: 'tables,zones' },
         headers: { Authorization: `Bearer ${token}` }
       })
-      setReservations(response.data)
+      setReservations(response.data.reservations)
+      setCursor(response.data.cursor)
+      setTables(response.data.tables || [])
+      setZones(response.data.zones || [])
     } catch (error) {
       console.error('Error:', error)
     } finally {
@@ -44,35 +58,21 @@ export default function Reservations() {
     }
   }
 
-  const fetchTables = async () => {
-    try {
-      const token = localStorage.getItem('token')
-      const hallsRes = await axios.get(`/api/restaurants/${restaurantId}/halls`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-
-      const allTables = []
-      for (const hall of hallsRes.data) {
-        const tablesRes = await axios.get(`/api/halls/${hall.id}/tables`, {
-          headers: { Authorization: `Bearer ${token}` }
-        })
-        allTables.push(...tablesRes.data.map(t => ({ ...t, hall_name: hall.name })))
-      }
-      setTables(allTables)
-    } catch (error) {
-      console.error('Error:', error)
-    }
-  }
-
-  const fetchZones = async () => {
+  const fetchMore = async () => {
+    if (!cursor) return
+    setLoadingMore(true)
     try {
       const token = localStorage.getItem('token')
-      const response = await axios.get(`/api/restaurants/${restaurantId}/zones`, {
+      const response = await axios.get(`/api/restaurants/${restaurantId}/reservations`, {
+        params: { ...filterParams(), cursor },
         headers: { Authorization: `Bearer ${token}` }
       })
-      setZones(response.data)
+      setReservations(prev => [...prev, ...response.data.reservations])
+      setCursor(response.data.cursor)
     } catch (error) {
       console.error('Error:', error)
+    } finally {
+      setLoadingMore(false)
     }
   }
 
@@ -105,21 +105,6 @@ export default function Reservations() {
     }
   }
 
-  const filteredReservations = reservations.filter(res => {
-    if (filter === 'all') return true
-    const resDate = new Date(res.reservation_date)
-    const today = new Date()
-    today.setHours(0, 0, 0, 0)
-
-    if (filter === 'today') {
-      return resDate.toDateString() === today.toDateString()
-    }
-    if (filter === 'upcoming') {
-      return resDate >= today
-    }
-    return true
-  })
-
   if (loading) {
     return (
       <div className="min-h-screen bg-luxury-pattern flex items-center justify-center">
@@ -212,7 +197,7 @@ export default function Reservations() {
 
         {/* Список бронирований */}
         <div className="space-y-4">
-          {filteredReservations.map(res => (
+          {reservations.map(res => (
             <div key={res.id} className="glass-card p-6 hover:border-luxury-gold/40 transition">
               <div className="flex flex-wrap justify-between items-start gap-4 mb-4">
                 <div className="flex-1 min-w-[250px]">
@@ -347,7 +332,15 @@ export default function Reservations() {
           ))}
         </div>
 
-        {filteredReservations.length === 0 && (
+        {cursor && (
+          <div className="text-center mt-6">
+            <button onClick={fetchMore} disabled={loadingMore} className="btn-outline-gold">
+              {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+            </button>
+          </div>
+        )}
+
+        {reservations.length === 0 && (
           <div className="glass-card p-12 text-center">
             <p className="text-luxury-cream/50 mb-4">
               {filter === 'all' ? 'Нет бронирований' : `Нет бронирований для фильтра "${filter}"`}
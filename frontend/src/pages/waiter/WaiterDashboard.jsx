@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
 import axios from 'axios'
 import io from 'socket.io-client'
@@ -20,6 +20,7 @@ export default function WaiterDashboard() {
   const [filter, setFilter] = useState('active')
   const [socket, setSocket] = useState(null)
   const [notification, setNotification] = useState(null)
+  const ordersCursor = useRef(null)
 
   useEffect(() => {
     fetchUser()
@@ -38,22 +39,25 @@ export default function WaiterDashboard() {
 
       newSocket.on('connect', () => {
         console.log('WebSocket connected')
-        newSocket.emit('join_waiter', { user_id: user.id })
+        newSocket.emit('join_room', { token: localStorage.getItem('token') })
       })
 
-      newSocket.on('waiter_call', (data) => {
+      newSocket.on('call_received', (data) => {
         console.log('Waiter called:', data)
         showNotification(`🔔 Вызов со стола #${data.table_number || data.table_id}`)
         fetchCalls()
         playNotificationSound()
       })
 
-      newSocket.on('new_order', (data) => {
+      newSocket.on('order_created', (data) => {
         console.log('New order:', data)
-        showNotification(`📋 Новый заказ на столе #${data.table_id}`)
+        showNotification(`📋 Новый заказ на столе #${data.table_number || data.table_id}`)
         fetchOrders()
       })
 
+      newSocket.on('order_updated', () => fetchOrders())
+      newSocket.on('call_resolved', () => fetchCalls())
+
       setSocket(newSocket)
 
       return () => {
@@ -78,10 +82,24 @@ export default function WaiterDashboard() {
   const fetchOrders = async () => {
     try {
       const token = localStorage.getItem('token')
-      const response = await axios.get('/api/waiter/orders', {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-      setOrders(response.data)
+      // Дельта-лента: после первой загрузки приходят только изменения с курсора
+      let hasMore = true
+      while (hasMore) {
+        const response = await axios.get('/api/waiter/orders', {
+          headers: { Authorization: `Bearer ${token}` },
+          params: {
+            status: Object.keys(ORDER_STATUSES).join(','),
+            ...(ordersCursor.current ? { since: ordersCursor.current } : {})
+          }
+        })
+        const { orders: changed, tombstones, cursor, has_more } = response.data
+        const removed = new Set(tombstones.map(t => t.id))
+        changed.forEach(o => removed.add(o.id))
+        setOrders(prev => [...changed, ...prev.filter(o => !removed.has(o.id))]
+          .sort((a, b) => new Date(b.created_at) - new Date(a.created_at)))
+        ordersCursor.current = cursor
+        hasMore = has_more
+      }
     } catch (error) {
       console.error('Error:', error)
     }
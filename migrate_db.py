@@ -232,6 +232,156 @@ migrations = [
     CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs(user_id);
     CREATE INDEX IF NOT EXISTS idx_audit_logs_resource ON audit_logs(resource_type, resource_id);
     CREATE INDEX IF NOT EXISTS idx_invites_code ON invites(code);
+    """,
+
+    # 17. Индексы дельта-ленты заказов официантов
+    """
+    CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders(updated_at, id);
+    CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items(order_id);
+    """,
+
+    # 18. Денормализованный restaurant_id в tables, orders, waiter_calls
+    """
+    ALTER TABLE tables ADD COLUMN IF NOT EXISTS restaurant_id INTEGER REFERENCES restaurants(id);
+    ALTER TABLE orders ADD COLUMN IF NOT EXISTS restaurant_id INTEGER REFERENCES restaurants(id);
+    ALTER TABLE waiter_calls ADD COLUMN IF NOT EXISTS restaurant_id INTEGER REFERENCES restaurants(id);
+    """,
+
+    # 19. Заполняем restaurant_id: столы из залов, заказы и вызовы из столов
+    """
+    UPDATE tables t SET restaurant_id = h.restaurant_id
+    FROM halls h
+    WHERE h.id = t.hall_id AND t.restaurant_id IS DISTINCT FROM h.restaurant_id;
+
+    UPDATE orders o SET restaurant_id = t.restaurant_id
+    FROM tables t
+    WHERE t.id = o.table_id AND o.restaurant_id IS NULL;
+
+    UPDATE waiter_calls c SET restaurant_id = t.restaurant_id
+    FROM tables t
+    WHERE t.id = c.table_id AND c.restaurant_id IS NULL;
+    """,
+
+    # 20. Составные индексы по заведению
+    """
+    CREATE INDEX IF NOT EXISTS ix_tables_restaurant_id ON tables(restaurant_id);
+    CREATE INDEX IF NOT EXISTS idx_orders_restaurant_status_created ON orders(restaurant_id, status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_restaurant_paid_created ON orders(restaurant_id, is_paid, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_restaurant_updated ON orders(restaurant_id, updated_at, id);
+    CREATE INDEX IF NOT EXISTS idx_waiter_calls_restaurant_status_created ON waiter_calls(restaurant_id, status, created_at);
+    DROP INDEX IF EXISTS idx_orders_updated;
+    ANALYZE tables;
+    ANALYZE orders;
+    ANALYZE waiter_calls;
+    """,
+
+    # 21. Агрегаты аналитики (после миграции: scripts/rebuild_analytics.py)
+    """
+    CREATE TABLE IF NOT EXISTS analytics_hourly (
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        bucket TIMESTAMP,
+        revenue BIGINT DEFAULT 0,
+        tips BIGINT DEFAULT 0,
+        fees BIGINT DEFAULT 0,
+        orders_count INTEGER DEFAULT 0,
+        paid_count INTEGER DEFAULT 0,
+        completed_count INTEGER DEFAULT 0,
+        cancelled_count INTEGER DEFAULT 0,
+        PRIMARY KEY (restaurant_id, bucket)
+    );
+
+    CREATE TABLE IF NOT EXISTS analytics_daily (
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        day DATE,
+        revenue BIGINT DEFAULT 0,
+        tips BIGINT DEFAULT 0,
+        fees BIGINT DEFAULT 0,
+        orders_count INTEGER DEFAULT 0,
+        paid_count INTEGER DEFAULT 0,
+        completed_count INTEGER DEFAULT 0,
+        cancelled_count INTEGER DEFAULT 0,
+        PRIMARY KEY (restaurant_id, day)
+    );
+
+    CREATE TABLE IF NOT EXISTS analytics_dish_daily (
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        day DATE,
+        dish_id INTEGER REFERENCES dishes(id),
+        quantity INTEGER DEFAULT 0,
+        revenue BIGINT DEFAULT 0,
+        PRIMARY KEY (restaurant_id, day, dish_id)
+    );
+    """,
+
+    # 22. Счетчики коротких кодов (выдача блоками, short_codes.py)
+    """
+    CREATE TABLE IF NOT EXISTS code_sequences (
+        name VARCHAR PRIMARY KEY,
+        next_value BIGINT NOT NULL DEFAULT 0
+    );
+    """,
+
+    # 23. Индексы списка броней (keyset по дате, фильтры статуса и стола)
+    """
+    CREATE INDEX IF NOT EXISTS idx_reservations_restaurant_date_status ON reservations(restaurant_id, reservation_date, status);
+    CREATE INDEX IF NOT EXISTS idx_reservations_table_date ON reservations(table_id, reservation_date);
+    DROP INDEX IF EXISTS idx_reservations_restaurant;
+    """,
+
+    # 24. Отложенные задачи (scheduler.py)
+    """
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        id SERIAL PRIMARY KEY,
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        kind VARCHAR NOT NULL,
+        target_id INTEGER NOT NULL,
+        due_at TIMESTAMP NOT NULL,
+        done_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_pending ON scheduled_jobs(done_at, due_at);
+    CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_restaurant_pending ON scheduled_jobs(restaurant_id, done_at, due_at);
+    """,
+
+    # 25. Transactional outbox real-time событий (outbox.py)
+    """
+    CREATE TABLE IF NOT EXISTS outbox_events (
+        id SERIAL PRIMARY KEY,
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        user_id INTEGER REFERENCES users(id),
+        event VARCHAR NOT NULL,
+        rooms JSON DEFAULT '[]',
+        payload JSON DEFAULT '{}',
+        claimed_until TIMESTAMP,
+        dispatched_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS ix_outbox_events_restaurant_id ON outbox_events(restaurant_id);
+    CREATE INDEX IF NOT EXISTS ix_outbox_events_user_id ON outbox_events(user_id);
+    CREATE INDEX IF NOT EXISTS ix_outbox_events_dispatched_at ON outbox_events(dispatched_at);
+    """,
+
+    # 26. seq событий outbox в порядке фиксации (счетчик продолжает прежние id - курсоры клиентов не сбиваются)
+    """
+    ALTER TABLE outbox_events ADD COLUMN IF NOT EXISTS seq BIGINT;
+    UPDATE outbox_events SET seq = id WHERE seq IS NULL AND dispatched_at IS NOT NULL;
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_outbox_events_seq ON outbox_events(seq);
+    INSERT INTO code_sequences (name, next_value)
+    SELECT 'outbox_events', COALESCE(MAX(id), 0) + 1 FROM outbox_events
+    ON CONFLICT (name) DO NOTHING;
+    """,
+
+    # 27. Журнал изменений аналитики (агрегаты пополняет analytics.apply_loop)
+    """
+    CREATE TABLE IF NOT EXISTS analytics_deltas (
+        id SERIAL PRIMARY KEY,
+        restaurant_id INTEGER NOT NULL REFERENCES restaurants(id),
+        moment TIMESTAMP NOT NULL,
+        counters JSON DEFAULT '{}',
+        order_id INTEGER,
+        dish_sign INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS ix_analytics_deltas_restaurant_id ON analytics_deltas(restaurant_id);
     """
 ]
 
@@ -246,6 +396,8 @@ def run_migrations():
                 conn.commit()
                 print(f"  ✅ Миграция {i} успешна")
             except Exception as e:
+                # Иначе транзакция Postgres остается прерванной и падают все следующие миграции
+                conn.rollback()
                 print(f"  ⚠️  Миграция {i}: {str(e)}")
                 # Продолжаем выполнение (некоторые поля могут уже существовать)
 
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк движка доступности броней: заведение на 100 столов, горизонт 30 дней.
+
+Заполняет БД бронями (по умолчанию ~4 на стол в день) и меряет:
+сборку индекса дня из БД, проверку стола и поиск столов под компанию
+(микросекунды), слоты на день и полное создание брони через эндпоинт.
+
+Пример:
+  ./availability_benchmark.py                      # временная SQLite
+  DATABASE_URL=postgresql://... ./availability_benchmark.py --tables 100 --days 30
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "availability_bench.db")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import websocket  # noqa: F401  (имя модуля совпадает с websocket-client, импортируем первым)
+from sqlalchemy import insert
+
+import availability
+import main
+from database import engine, SessionLocal
+from models import Base, Restaurant, Hall, Zone, Table, Reservation, ReservationStatus
+
+
+def seed(tables_count: int, days: int, per_table: int):
+    db = SessionLocal()
+    restaurant = Restaurant(name="Bench", slug=f"bench-{time.time_ns()}", booking_enabled=True,
+                            booking_horizon_days=days, booking_max_party_size=20)
+    db.add(restaurant)
+    db.flush()
+    hall = Hall(restaurant_id=restaurant.id, name="Bench")
+    db.add(hall)
+    db.flush()
+    zones = [Zone(restaurant_id=restaurant.id, hall_id=hall.id, name=name, zone_type=name)
+             for name in ("main", "vip", "terrace")]
+    db.add_all(zones)
+    db.flush()
+    tables = db.scalars(insert(Table).returning(Table.id), [
+        {"hall_id": hall.id, "restaurant_id": restaurant.id, "table_number": str(i + 1),
+         "capacity": random.choice([2, 2, 4, 4, 6, 8]), "zone_id": zones[i % 3].id,
+         "short_code": f"AV{time.time_ns() % 10**8}{i}", "qr_code": f"bench-{restaurant.id}-{i}"}
+        for i in range(tables_count)
+    ]).all()
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    rows = []
+    for day in range(days):
+        for table_id in tables:
+            # Брони подряд с запасом на буферы: 12:00, 15:00, 18:00, 21:00
+            for slot in random.sample(range(4), per_table):
+                starts_at = today + timedelta(days=day, hours=12 + slot * 3)
+                rows.append({
+                    "restaurant_id": restaurant.id, "table_id": table_id, "guest_name": "Bench",
+                    "guest_phone": "0", "guest_count": 2, "reservation_date": starts_at,
+                    "reservation_time": starts_at, "duration_minutes": 120, "status": ReservationStatus.CONFIRMED
+                })
+    db.execute(insert(Reservation), rows)
+    db.commit()
+    restaurant_id = restaurant.id
+    db.close()
+    return restaurant_id, len(rows)
+
+
+def timed(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30, help="booking_horizon_days")
+    parser.add_argument("--per-table", type=int, default=3, help="броней на стол в день (до 4)")
+    parser.add_argument("--bookings", type=int, default=200, help="созданий брони через эндпоинт")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    restaurant_id, reservations = seed(args.tables, args.days, min(args.per_table, 4))
+    print(f"Заполнение: {args.tables} столов, {reservations} броней за {args.days} дней "
+          f"({time.perf_counter() - started:.1f} с)")
+
+    db = SessionLocal()
+    restaurant = db.get(Restaurant, restaurant_id)
+    today = datetime.now().date()
+    days = [today + timedelta(days=offset) for offset in range(args.days)]
+
+    build, _ = timed(lambda: [availability.build_index(db, restaurant, day) for day in days], 1)
+    indexes = [availability.get_index(db, restaurant, day) for day in days]
+    index = indexes[len(indexes) // 2]
+    table_id = index.tables[0].table_id
+
+    is_free, _ = timed(lambda: index.is_free(table_id, 19 * 60, 21 * 60), 100_000)
+    free_tables, found = timed(lambda: index.free_tables(20 * 60, 120, 4), 10_000)
+    free_zone, _ = timed(lambda: index.free_tables(20 * 60, 120, 4, zone_type="vip"), 10_000)
+    slots, day_slots = timed(lambda: index.slots(4, 120), 100)
+    horizon, _ = timed(lambda: [ix.slots(4, 120) for ix in indexes], 3)
+
+    print(f"{'operation':>34} {'time':>12}")
+    print(f"{'build_index (1 день, из БД)':>34} {build / len(days) * 1000:>9.2f} ms")
+    print(f"{'is_free':>34} {is_free * 1e6:>9.2f} µs")
+    print(f"{'free_tables (4 гостя)':>34} {free_tables * 1e6:>9.2f} µs  ({len(found)} столов)")
+    print(f"{'free_tables (4 гостя, vip)':>34} {free_zone * 1e6:>9.2f} µs")
+    print(f"{'slots (день, шаг 15 мин)':>34} {slots * 1000:>9.2f} ms  ({len(day_slots)} слотов)")
+    print(f"{'slots (весь горизонт)':>34} {horizon * 1000:>9.2f} ms")
+    db.close()
+
+    # Создание брони: блокировка, свежий индекс, выбор стола, вставка
+    created = conflicts = 0
+    started = time.perf_counter()
+    for i in range(args.bookings):
+        day = days[1 + i % (len(days) - 1)]
+        data = main.ReservationCreate(
+            restaurant_id=restaurant_id, guest_name="Bench", guest_phone="0", guest_count=random.choice([2, 4]),
+            reservation_date=day.isoformat(), reservation_time=random.choice(["10:00", "12:30", "15:30", "23:00"])
+        )
+        with SessionLocal() as session:
+            try:
+                main.create_reservation(data, session)
+                created += 1
+            except main.HTTPException as error:
+                if error.status_code != 409:
+                    raise
+                conflicts += 1
+    elapsed = (time.perf_counter() - started) / args.bookings
+    print(f"{'create_reservation':>34} {elapsed * 1000:>9.2f} ms  ({created} создано, {conflicts} без мест)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Время холодного импорта приложения: сколько воркер тратит до первого запроса.
+
+Каждый прогон - новый интерпретатор (как рестарт воркера), импорт --target
+(main:app или main:socket_app). Показывает медиану и максимум, самые долгие
+модули (python -X importtime) и тяжелые модули, загруженные при импорте,
+хотя должны грузиться лениво. Код 1, если медиана больше --budget или
+загружено что-то из --lazy - годится как проверка в CI.
+
+DATABASE_URL по умолчанию указывает на недоступный сервер: импорт не должен
+ходить в БД (схема - manage.py migrate, прогрев - в фоне после старта).
+
+  ./import_benchmark.py
+  ./import_benchmark.py --target main:socket_app --lazy passlib,jose,numpy --budget 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+UNREACHABLE_DB = "postgresql://thanks_user:x@127.0.0.1:9/thanks_db"
+LAZY_MODULES = "socketio,engineio,aiohttp,passlib,jose,numpy,openpyxl,qrcode"
+
+CHILD = """
+import importlib, json, sys, time
+module, _, attribute = sys.argv[1].partition(":")
+started = time.perf_counter()
+loaded = importlib.import_module(module)
+if attribute:
+    getattr(loaded, attribute)
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "loaded": [name for name in sys.argv[2].split(",") if name in sys.modules]}))
+"""
+
+
+def run_once(target: str, lazy: str, env: dict, importtime: bool = False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, target, lazy]
+    result = subprocess.run(command, cwd=BACKEND, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"❌ Импорт {target} упал:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime_log: str, top: int):
+    """[(самостоятельное время мкс, накопленное мкс, модуль)] из вывода -X importtime"""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(own), int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="main:app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.5, help="допустимая медиана, секунды")
+    parser.add_argument("--lazy", default=LAZY_MODULES, help="модули, которые импорт не должен загружать")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", UNREACHABLE_DB)
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    run_once(args.target, args.lazy, env)  # прогрев .pyc, в замеры не входит
+    timings = [run_once(args.target, args.lazy, env)[0]["seconds"] for _ in range(args.runs)]
+    result, importtime_log = run_once(args.target, args.lazy, env, importtime=True)
+
+    median = statistics.median(timings)
+    print(f"Импорт {args.target}: медиана {median * 1000:.0f} мс, максимум {max(timings) * 1000:.0f} мс "
+          f"({args.runs} прогонов, бюджет {args.budget * 1000:.0f} мс)")
+    print("Самые долгие модули (собственное / с зависимостями):")
+    for own, cumulative, name in slowest_modules(importtime_log, args.top):
+        print(f"  {own / 1000:8.1f} мс {cumulative / 1000:8.1f} мс  {name}")
+
+    failed = False
+    if result["loaded"]:
+        print(f"❌ Загружены при импорте: {', '.join(result['loaded'])}")
+        failed = True
+    if median > args.budget:
+        print(f"❌ Медиана {median:.2f} с больше бюджета {args.budget:.2f} с")
+        failed = True
+    if not failed:
+        print("✅ В бюджете")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Шаги деплоя, которые раньше выполнял каждый воркер при старте.
+
+  ./manage.py migrate                   # создать недостающие таблицы
+  ./manage.py migrate --check           # только проверить (код 1, если схема неполная)
+  ./manage.py create-admin              # супер-админ admin@thanks.kz (пароль - SUPER_ADMIN_PASSWORD или запрос)
+  ./manage.py create-admin --email boss@thanks.kz --password ...
+
+migrate создает таблицы по models.py (create_all, существующие не трогает);
+новые колонки в существующих таблицах - migrate_db.py / migrations.sql.
+Запускать один раз перед рестартом воркеров: несколько воркеров больше
+не создают таблицы и админа наперегонки. create-admin повторно ничего не
+меняет (--reset-password - задать пароль заново).
+"""
+import argparse
+import getpass
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+import hashing
+from database import engine, SessionLocal
+from models import Base, User, UserRole
+
+DEFAULT_ADMIN_EMAIL = os.getenv("SUPER_ADMIN_EMAIL", "admin@thanks.kz")
+
+
+def migrate(check: bool = False) -> int:
+    existing = set(inspect(engine).get_table_names())
+    missing = [table.name for table in Base.metadata.sorted_tables if table.name not in existing]
+    if check:
+        print(f"❌ Нет таблиц: {', '.join(missing)}" if missing else "✅ Схема на месте")
+        return 1 if missing else 0
+    Base.metadata.create_all(bind=engine)
+    print(f"✅ Создано таблиц: {len(missing)}" + (f" ({', '.join(missing)})" if missing else ""))
+    return 0
+
+
+def create_admin(email: str, password: str, full_name: str, reset_password: bool = False) -> int:
+    with SessionLocal() as db:
+        admin = db.query(User).filter(User.email == email).first()
+        if admin and not reset_password:
+            print(f"✅ {email} уже есть ({admin.role.value})")
+            return 0
+        password = password or os.getenv("SUPER_ADMIN_PASSWORD") or getpass.getpass(f"Пароль для {email}: ")
+        if not password:
+            print("❌ Пустой пароль")
+            return 1
+        if admin:
+            admin.hashed_password = hashing.get_password_hash(password)
+            db.commit()
+            print(f"✅ Пароль {email} обновлен")
+            return 0
+        db.add(User(
+            email=email,
+            hashed_password=hashing.get_password_hash(password),
+            full_name=full_name,
+            role=UserRole.MODERATOR,
+            is_active=True
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Параллельный запуск успел создать того же пользователя
+            db.rollback()
+            print(f"✅ {email} уже есть")
+            return 0
+    print(f"✅ Супер-админ {email} создан")
+    return 0
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="создать недостающие таблицы")
+    migrate_parser.add_argument("--check", action="store_true", help="только проверить схему")
+
+    admin_parser = commands.add_parser("create-admin", help="создать супер-админа (MODERATOR)")
+    admin_parser.add_argument("--email", default=DEFAULT_ADMIN_EMAIL)
+    admin_parser.add_argument("--password")
+    admin_parser.add_argument("--full-name", default="Super Admin")
+    admin_parser.add_argument("--reset-password", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        sys.exit(migrate(args.check))
+    sys.exit(create_admin(args.email, args.password, args.full_name, args.reset_password))
+
+
+if __name__ == "__main__":
+    run()
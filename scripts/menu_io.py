@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Импорт и экспорт меню заведения из консоли (те же форматы, что у API).
+
+  ./menu_io.py export 3 menu.csv                  # формат по расширению
+  ./menu_io.py import 3 menu.xlsx --dry-run       # только разница
+  ./menu_io.py clone --from 3 --to 7              # меню одного заведения в другое
+"""
+import argparse
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import websocket  # noqa: F401  (имя модуля совпадает с websocket-client, импортируем первым)
+
+from fastapi import HTTPException
+
+import menu_cache
+import menu_io
+from database import SessionLocal
+from main import DishImportRow
+
+
+def export(restaurant_id: int, path: str, fmt: str = None):
+    fmt = menu_io.detect_format(fmt, path)
+    with SessionLocal() as db, open(path, "wb") as file:
+        for chunk in menu_io.export_menu(db, restaurant_id, fmt):
+            file.write(chunk)
+    print(f"✅ Меню заведения {restaurant_id} -> {path}")
+
+
+def load(restaurant_id: int, file, fmt: str, dry_run: bool):
+    with SessionLocal() as db:
+        result = menu_io.import_menu(db, restaurant_id, file, fmt, DishImportRow, dry_run)
+    if not dry_run:
+        menu_cache.bump_menu_version(restaurant_id)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="выгрузить меню в файл")
+    export_parser.add_argument("restaurant_id", type=int)
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=menu_io.FORMATS)
+
+    import_parser = commands.add_parser("import", help="загрузить меню из файла")
+    import_parser.add_argument("restaurant_id", type=int)
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=menu_io.FORMATS)
+    import_parser.add_argument("--dry-run", action="store_true")
+
+    clone_parser = commands.add_parser("clone", help="скопировать меню в другое заведение")
+    clone_parser.add_argument("--from", dest="source", type=int, required=True)
+    clone_parser.add_argument("--to", dest="target", type=int, required=True)
+    clone_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            export(args.restaurant_id, args.path, args.format)
+        elif args.command == "import":
+            fmt = menu_io.detect_format(args.format, args.path)
+            with open(args.path, "rb") as file:
+                load(args.restaurant_id, file, fmt, args.dry_run)
+        else:
+            # NDJSON: без потерь (модификаторы, пустые поля) и без openpyxl
+            with SessionLocal() as db:
+                data = b"".join(menu_io.export_menu(db, args.source, "ndjson"))
+            load(args.target, io.BytesIO(data), "ndjson", args.dry_run)
+    except HTTPException as error:
+        sys.exit(f"❌ {error.detail}")
+
+
+if __name__ == "__main__":
+    run()
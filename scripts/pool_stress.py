@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Стресс пула соединений: что происходит, когда соединений меньше, чем желающих.
+
+Режим pool (по умолчанию) - прямо на движке database.py: --threads потоков
+берут соединение, держат его --hold-ms (на Postgres - pg_sleep) и отдают.
+Показывает ожидание соединения (p50/p95/p99), пропускную способность и
+число таймаутов пула при заданных DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT.
+
+Режим http - нагрузка на запущенный сервер: --concurrency одновременных
+запросов к --path; коды ответов (503 при исчерпании пула), задержки и
+метрики db_pool_* из /metrics.
+
+Пример:
+  ./pool_stress.py --pool-size 2 --overflow 0 --pool-timeout 0.5 --threads 16 --hold-ms 200
+  DATABASE_URL=postgresql://... ./pool_stress.py --threads 64 --hold-ms 50 --duration 20
+  DB_POOL_SIZE=2 DB_MAX_OVERFLOW=0 DB_POOL_TIMEOUT=1 uvicorn main:socket_app --port 8000
+  ./pool_stress.py http --url http://127.0.0.1:8000 --path /qr/ABC123 --concurrency 100 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    values = sorted(values)
+    pick = lambda share: values[min(len(values) - 1, int(len(values) * share))] * 1000
+    return f"p50 {pick(0.5):.1f} мс, p95 {pick(0.95):.1f} мс, p99 {pick(0.99):.1f} мс, max {values[-1] * 1000:.1f} мс"
+
+
+def run_pool(args):
+    # Размеры пула читаются database.py при импорте
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(args.overflow)
+    os.environ["DB_POOL_TIMEOUT"] = str(args.pool_timeout)
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pool_stress.db")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    import database
+
+    engine = database.engine
+    is_postgres = engine.dialect.name == "postgresql"
+    waits, timeout_waits, lock = [], [], threading.Lock()
+    counts = Counter()
+    peak = [0]
+    served = {}  # поток -> полученные соединения: очередность пул не гарантирует
+    deadline = time.perf_counter() + args.duration
+
+    def worker():
+        served[threading.get_ident()] = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    waited = time.perf_counter() - started
+                    with lock:
+                        waits.append(waited)
+                        peak[0] = max(peak[0], engine.pool.checkedout())
+                    if is_postgres:
+                        conn.exec_driver_sql(f"SELECT pg_sleep({args.hold_ms / 1000})")
+                    else:
+                        conn.exec_driver_sql("SELECT 1")
+                        time.sleep(args.hold_ms / 1000)
+                with lock:
+                    counts["ok"] += 1
+                served[threading.get_ident()] += 1
+            except PoolTimeoutError:
+                with lock:
+                    timeout_waits.append(time.perf_counter() - started)
+                    counts["timeout"] += 1
+
+    print(f"Пул {args.pool_size}+{args.overflow}, timeout {args.pool_timeout} с, "
+          f"{args.threads} потоков держат соединение {args.hold_ms} мс, {args.duration} с "
+          f"({engine.dialect.name})")
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    capacity = (args.pool_size + args.overflow) * 1000 / max(args.hold_ms, 1)
+    print(f"  Успешно: {counts['ok']} ({counts['ok'] / elapsed:.0f}/с, потолок пула ~{capacity:.0f}/с)")
+    print(f"  Таймауты пула: {counts['timeout']}")
+    print(f"  Пик выданных соединений: {peak[0]}")
+    print(f"  Ожидание соединения: {percentiles(waits)}")
+    print(f"  Ожидание до таймаута: {percentiles(timeout_waits)}")
+    print(f"  Потоков без единого соединения: {sum(1 for done in served.values() if not done)} из {args.threads}")
+    print(f"  Пул после теста: {database.pool_status()}")
+
+
+async def run_http(args):
+    import httpx
+
+    latencies, codes = [], Counter()
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.get(args.path)
+                codes[response.status_code] += 1
+            except httpx.HTTPError as error:
+                codes[type(error).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        print(f"{args.requests} запросов {args.path}, {args.concurrency} одновременно: {elapsed:.1f} с "
+              f"({args.requests / elapsed:.0f}/с)")
+        print(f"  Коды: {dict(codes)}")
+        print(f"  Задержка: {percentiles(latencies)}")
+        try:
+            metrics = (await client.get("/metrics")).text
+        except httpx.HTTPError:
+            return
+    for line in metrics.splitlines():
+        if line.startswith(("db_pool_size", "db_pool_checked_out", "db_pool_timeouts_total",
+                            "db_pool_wait_seconds_count", "db_pool_wait_seconds_sum", "threadpool_")):
+            print(f"  {line}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", default="pool", choices=["pool", "http"])
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--overflow", type=int, default=0)
+    parser.add_argument("--pool-timeout", type=float, default=1.0)
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--hold-ms", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.mode == "pool":
+        run_pool(args)
+    else:
+        asyncio.run(run_http(args))
+
+
+if __name__ == "__main__":
+    run()
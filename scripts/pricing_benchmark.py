@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк создания заказа: число запросов к БД и время на заказ в зависимости
+от размера корзины. Запросов должно быть одинаково для 1 и 200 позиций.
+
+Пример:
+  ./pricing_benchmark.py                         # временная SQLite
+  DATABASE_URL=postgresql://... ./pricing_benchmark.py --sizes 1,10,50,200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pricing_bench.db")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import websocket  # noqa: F401  (имя модуля совпадает с websocket-client, импортируем первым)
+from sqlalchemy import event
+
+import main
+from database import engine, SessionLocal
+from models import Base, Restaurant, Category, Dish, Modifier, Hall, Table, User, UserRole
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def seed(dishes_count: int):
+    db = SessionLocal()
+    restaurant = Restaurant(name="Bench", slug=f"bench-{time.time_ns()}", service_fee_percent=10.0)
+    db.add(restaurant)
+    db.flush()
+    category = Category(restaurant_id=restaurant.id, name="Bench")
+    db.add(category)
+    db.flush()
+    dishes = [Dish(category_id=category.id, name=f"Dish {i}", price=990.5 + i) for i in range(dishes_count)]
+    db.add_all(dishes)
+    db.flush()
+    modifiers = [Modifier(dish_id=dish.id, name="Extra", price=150) for dish in dishes]
+    db.add_all(modifiers)
+    hall = Hall(restaurant_id=restaurant.id, name="Bench")
+    db.add(hall)
+    db.flush()
+    table = Table(hall_id=hall.id, table_number="1", short_code=f"B{time.time_ns() % 10**8}", qr_code="bench")
+    user = User(email=f"bench{time.time_ns()}@thanks.kz", hashed_password="-", role=UserRole.USER)
+    db.add_all([table, user])
+    db.commit()
+    result = (table.id, SimpleNamespace(id=user.id), [(dish.id, modifier.id) for dish, modifier in zip(dishes, modifiers)])
+    db.close()
+    return result
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,5,20,50,200", help="размеры корзины через запятую")
+    parser.add_argument("--orders", type=int, default=20, help="заказов на каждый размер")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    Base.metadata.create_all(bind=engine)
+    table_id, user, menu = seed(max(sizes))
+
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+
+    print(f"{'items':>6} {'queries/order':>14} {'ms/order':>10}")
+    for size in sizes:
+        items = [
+            main.OrderItemCreate(dish_id=dish_id, quantity=2, modifiers=[modifier_id])
+            for dish_id, modifier_id in menu[:size]
+        ]
+        data = main.OrderCreate(table_id=table_id, items=items, tips_amount=500)
+        counter.count = 0
+        started = time.perf_counter()
+        for _ in range(args.orders):
+            with SessionLocal() as db:
+                main._create_order(db, data, user)
+        elapsed = (time.perf_counter() - started) / args.orders
+        print(f"{size:>6} {counter.count / args.orders:>14.1f} {elapsed * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Пересчет агрегатов аналитики (analytics_hourly/daily/dish_daily) из заказов.
+
+Нужен один раз после миграции 21 и для сверки; дальше агрегаты
+обновляются сами при создании, оплате и отмене заказов.
+
+  ./rebuild_analytics.py              # все заведения
+  ./rebuild_analytics.py 3 7          # выбранные
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import analytics
+from database import SessionLocal
+from models import Restaurant
+
+
+def run():
+    with SessionLocal() as db:
+        ids = [int(arg) for arg in sys.argv[1:]] or [rid for (rid,) in db.query(Restaurant.id).order_by(Restaurant.id)]
+        for restaurant_id in ids:
+            started = time.perf_counter()
+            days = analytics.rebuild(db, restaurant_id)
+            print(f"  Заведение {restaurant_id}: {days} дн. за {time.perf_counter() - started:.1f} с")
+    print("✅ Агрегаты пересчитаны")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк колоночных отчетов (reports.py) на синтетическом снимке.
+
+Генерирует заказы и позиции (по умолчанию 10 000 000 позиций), сохраняет
+снимок в .npy, открывает его через memory map и замеряет каждый отчет.
+
+  ./reports_benchmark.py
+  ./reports_benchmark.py --items 2000000 --dishes 300 --repeat 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import numpy as np
+
+import reports
+from models import OrderStatus
+
+
+def generate(items_count: int, dishes: int, users: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    # В среднем 3 позиции на заказ
+    sizes = rng.integers(1, 6, size=items_count // 3 + 1)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), items_count) + 1]
+    orders_count = len(sizes)
+
+    start = np.datetime64("2024-01-01T00:00", "s").astype(np.int64)
+    local_ts = np.sort(start + rng.integers(0, 2 * 365 * 86400, size=orders_count))
+    subtotal = rng.integers(2_000, 60_000, size=orders_count) * 100
+    tip_percent = np.where(rng.random(orders_count) < 0.4, 0, rng.choice([5, 7, 10, 15, 20], size=orders_count))
+    statuses = rng.choice(
+        [reports.STATUS_CODES[OrderStatus.COMPLETED], reports.STATUS_CODES[OrderStatus.CANCELLED]],
+        p=[0.95, 0.05], size=orders_count
+    ).astype(np.int8)
+    user_id = np.where(rng.random(orders_count) < 0.3, -1, rng.zipf(1.3, size=orders_count) % users)
+
+    orders = {
+        "order_id": np.arange(1, orders_count + 1, dtype=np.int64),
+        "user_id": user_id.astype(np.int64),
+        "local_ts": local_ts.astype(np.int64),
+        "status": statuses,
+        "is_paid": np.ones(orders_count, dtype=np.bool_),
+        "subtotal": subtotal.astype(np.int64),
+        "tips": (subtotal * tip_percent // 100).astype(np.int64),
+    }
+    # Популярность блюд по Ципфу
+    dish_id = (rng.zipf(1.2, size=int(sizes.sum())) % dishes + 1).astype(np.int32)
+    items = {
+        "order_pos": np.repeat(np.arange(orders_count, dtype=np.int64), sizes),
+        "dish_id": dish_id,
+        "quantity": rng.integers(1, 3, size=len(dish_id)).astype(np.int32),
+    }
+    return orders, items
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10_000_000)
+    parser.add_argument("--dishes", type=int, default=400)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    orders, items = generate(args.items, args.dishes, args.users)
+    path = os.path.join(tempfile.mkdtemp(prefix="reports-bench-"), "1")
+    reports.save_snapshot(path, orders, items, {"exported_at": time.time()})
+    print(f"Снимок: {len(orders['order_id'])} заказов, {len(items['dish_id'])} позиций "
+          f"({time.perf_counter() - started:.1f} с)")
+
+    snapshot = reports.load_snapshot(path)
+    print(f"{'report':>10} {'best, ms':>10} {'first, ms':>10}")
+    for name, report in reports.REPORTS.items():
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            report(snapshot)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:>10} {min(timings):>10.0f} {timings[0]:>10.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест рассылки Socket.IO через шину между воркерами.
+
+Поднимает N клиентов (распределяются по адресам воркеров), все входят в комнату
+заведения по JWT сотрудника, затем внешний издатель публикует события в шину
+(SIO_MESSAGE_QUEUE) и клиенты считают доставку и задержку.
+
+Пример (4 воркера, Postgres LISTEN/NOTIFY):
+  SIO_MESSAGE_QUEUE=postgres uvicorn main:socket_app --workers 4 --port 8000
+  ./sio_fanout_loadtest.py --urls http://127.0.0.1:8000 --clients 4000 \
+      --token <JWT официанта без залов> --restaurant-id 1 --bus postgres
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import websocket  # noqa: F401  (имя модуля совпадает с websocket-client, импортируем первым)
+import socketio
+import sio_bus
+
+
+async def run_client(url, token, transport, latencies, joined):
+    client = socketio.AsyncClient(reconnection=False)
+
+    @client.on("loadtest")
+    async def on_event(data):
+        latencies.append(time.time() - data["sent_at"])
+
+    @client.on("joined")
+    async def on_joined(data):
+        joined.append(1)
+
+    await client.connect(url, transports=[transport])
+    await client.emit("join_room", {"token": token})
+    return client
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", required=True, help="адреса воркеров через запятую")
+    parser.add_argument("--clients", type=int, default=4000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5, help="пауза между событиями, с")
+    parser.add_argument("--token", required=True, help="JWT сотрудника заведения")
+    parser.add_argument("--restaurant-id", type=int, required=True)
+    parser.add_argument("--bus", default=sio_bus.SIO_MESSAGE_QUEUE or "postgres")
+    parser.add_argument("--transport", default="websocket", choices=["websocket", "polling"])
+    parser.add_argument("--connect-batch", type=int, default=200)
+    args = parser.parse_args()
+
+    urls = [u.strip() for u in args.urls.split(",") if u.strip()]
+    latencies, joined, clients = [], [], []
+
+    started = time.perf_counter()
+    for offset in range(0, args.clients, args.connect_batch):
+        batch = range(offset, min(offset + args.connect_batch, args.clients))
+        clients += await asyncio.gather(*[
+            run_client(urls[i % len(urls)], args.token, args.transport, latencies, joined) for i in batch
+        ])
+    while len(joined) < args.clients and time.perf_counter() - started < 120:
+        await asyncio.sleep(0.2)
+    print(f"Подключено {len(clients)} клиентов, в комнатах {len(joined)} за {time.perf_counter() - started:.1f} с")
+
+    publisher = sio_bus.create_client_manager(args.bus, write_only=True)
+    room = f"restaurant:{args.restaurant_id}"
+    for seq in range(args.events):
+        await publisher.emit("loadtest", {"seq": seq, "sent_at": time.time()}, room=room)
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(2)
+
+    expected = len(joined) * args.events
+    print(f"Доставлено {len(latencies)} из {expected} ({len(latencies) / max(expected, 1):.2%})")
+    if latencies:
+        ordered = sorted(latencies)
+        pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+        print(f"Задержка, мс: p50={pick(0.5):.1f} p95={pick(0.95):.1f} p99={pick(0.99):.1f} "
+              f"max={ordered[-1] * 1000:.1f} mean={statistics.mean(ordered) * 1000:.1f}")
+    print("Шина (издатель):", sio_bus.stats.snapshot())
+
+    await asyncio.gather(*[c.disconnect() for c in clients], return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())